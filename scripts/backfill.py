@@ -0,0 +1,118 @@
+from __future__ import annotations
+import argparse
+import os
+import sys
+
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.config import load_settings
+from src.extractors.registry import EXTRACTOR_REGISTRY
+from src.pipeline import month_range, publish_snapshot, run_backfill, write_unified
+from src.utils.instrumentation import PROFILE_MODES, RunReport, run_report_path, stage, use_report
+from src.utils.planner import ORDERS, Staging, TimingModel, estimate_makespan, plan_units
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Planeja e executa o processamento mês a mês (backfill) com prioridades")
+    ap.add_argument("--tjs", type=str, default="", help="TJs separados por vírgula (vazio: todos do catálogo)")
+    ap.add_argument("--start", type=str, default="", help="YYYY-MM início (padrão: period.start)")
+    ap.add_argument("--end", type=str, default="", help="YYYY-MM fim (padrão: period.end)")
+    ap.add_argument("--order", choices=ORDERS, default="recent",
+                    help="recent: meses mais novos primeiro (padrão); oldest: ordem cronológica")
+    ap.add_argument("--dry_run", action="store_true", help="Só mostra o plano (unidades, custo estimado, situação)")
+    ap.add_argument("--force", action="store_true", help="Reprocessa também as unidades já prontas na staging")
+    ap.add_argument("--max_workers", type=int, default=None, help="Padrão: backfill.max_workers")
+    ap.add_argument("--max_per_tj", type=int, default=None, help="Padrão: backfill.max_per_tj")
+    ap.add_argument("--retries", type=int, default=None, help="Padrão: backfill.retries")
+    ap.add_argument("--no_identity", action="store_true", help="Mantém o server_id do extrator")
+    ap.add_argument("--raw_labels", action="store_true", help="Mantém cargo, carreira e vínculo como publicados")
+    ap.add_argument("--run_report", type=str, default=run_report_path("backfill"))
+    ap.add_argument("--profile", choices=PROFILE_MODES, default=None)
+    return ap.parse_args()
+
+
+def print_plan(units, workers: int, per_tj: int) -> None:
+    print(f"{'prio':>4}  {'TJ':<6} {'mês':<7} {'arq':>4} {'MB':>9} {'est. s':>8}  situação")
+    for u in units:
+        if u.status == "empty" and not u.url:
+            continue
+        extra = f" ({u.url})" if u.status == "empty" and u.url else ""
+        print(f"{u.priority:>4}  {u.tj_code:<6} {u.year_month:<7} {len(u.files):>4} {u.bytes / 1e6:>9.1f} "
+              f"{u.est_seconds:>8.2f}  {u.status}{extra}")
+    pending = [u for u in units if u.status == "pending"]
+    counts = {s: sum(1 for u in units if u.status == s) for s in ("pending", "done", "empty")}
+    print(f"[INFO] {counts['pending']} pendente(s), {counts['done']} já pronta(s), {counts['empty']} sem arquivos; "
+          f"{sum(u.bytes for u in pending) / 1e6:.1f} MB, ~{sum(u.est_seconds for u in pending):.1f} s de trabalho, "
+          f"~{estimate_makespan(units, workers, per_tj):.1f} s com {workers} worker(s) ({per_tj} por TJ)")
+
+
+def main():
+    args = parse_args()
+    settings = load_settings()
+    start = args.start or settings.start
+    end = args.end or settings.end
+    if args.tjs:
+        tj_codes = [t.strip().upper() for t in args.tjs.split(",") if t.strip()]
+    else:
+        tj_codes = sorted(EXTRACTOR_REGISTRY)
+    for tj in tj_codes:
+        if tj not in EXTRACTOR_REGISTRY:
+            print(f"[WARN] Sem extrator cadastrado para {tj}")
+    workers = args.max_workers or settings.backfill_workers
+    per_tj = args.max_per_tj or settings.backfill_per_tj
+    retries = settings.backfill_retries if args.retries is None else args.retries
+
+    timings = TimingModel(settings.timings_path)
+    if not timings.rates:
+        # primeira vez: aproveita os tempos por arquivo da última execução do pipeline
+        timings.observe_report(run_report_path("pipeline"))
+    staging = Staging(settings.staging_dir)
+    units = plan_units(tj_codes, month_range(start, end), EXTRACTOR_REGISTRY, raw_root=settings.raw_dir,
+                       timings=timings, staging=staging, order=args.order, force=args.force)
+    print_plan(units, workers, per_tj)
+    if args.dry_run:
+        return
+
+    def on_done(u):
+        if u.status == "ok":
+            print(f"[OK] {u.tj_code} {u.year_month}: {u.rows} linhas em {u.seconds:.2f} s "
+                  f"(estimado {u.est_seconds:.2f} s)")
+        else:
+            print(f"[WARN] {u.tj_code} {u.year_month} falhou após {u.attempts} tentativa(s): {u.error}")
+
+    report = RunReport("backfill", profile=args.profile, tjs=tj_codes, start=start, end=end, order=args.order,
+                       source="cli")
+    try:
+        with use_report(report):
+            df = run_backfill(
+                units, staging, dict(max_workers=workers, max_per_tj=per_tj, retries=retries),
+                user_agent=settings.user_agent, timeout=settings.timeout, raw_root=settings.raw_dir,
+                identity_map=None if args.no_identity else settings.identity_map,
+                identity_threshold=settings.identity_threshold,
+                label_dictionary=None if args.raw_labels else settings.label_dictionary,
+                taxonomy=settings.taxonomy, on_done=on_done,
+            )
+            with stage("write_parquet") as st:
+                write_unified(df, settings.unified_parquet)
+                st.rows_in = st.rows_out = len(df)
+            print(f"[OK] Dataset unificado salvo em: {settings.unified_parquet} ({len(df)} linhas)")
+            snap = publish_snapshot(settings.snapshots_dir, settings.unified_parquet, tjs=tj_codes, start=start,
+                                    end=end, engine="backfill", source="cli")
+            if snap:
+                print(f"[OK] Versão publicada: {snap['version']} ({snap['new_partitions']} partição(ões) nova(s), "
+                      f"{snap['reused_partitions']} reaproveitada(s))")
+    finally:
+        path = report.save(args.run_report)
+        timings.observe(report.to_dict()["files"])
+        timings.save()
+    failed = [u for u in units if u.status == "failed"]
+    if failed:
+        print(f"[WARN] {len(failed)} unidade(s) com falha; rode novamente para tentar só as pendentes")
+    print(f"[OK] Relatório de execução salvo em: {path}")
+
+
+if __name__ == "__main__":
+    main()
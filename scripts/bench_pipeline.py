@@ -0,0 +1,312 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from argparse import Namespace
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+import pandas as pd
+
+from synth_payroll import GENERATOR_VERSION, TJ_LAYOUTS, generate
+
+# Linhas por mês (somando os TJs) em cada escala
+SCALES: Dict[str, int] = {
+    "small": 30_000,
+    "medium": 300_000,
+    "large": 3_000_000,
+}
+MONTHS = ["2024-01", "2024-02"]
+RESULTS_DIR = os.path.join("reports", "bench")
+WORK_ROOT = os.path.join("data", "bench")
+
+SETTINGS_YAML = """data:
+  raw_dir: data/raw
+  processed_dir: data/processed
+  unified_parquet: data/processed/remuneracao_unificada.parquet
+
+period:
+  start: {start}
+  end: {end}
+
+defaults:
+  timeout: 60
+  user_agent: bench
+  retries: 0
+  backoff_factor: 0
+
+fetch:
+  cache_dir: ""
+"""
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Benchmark de ingestão, pipeline, métricas, API e painel com dados sintéticos")
+    ap.add_argument("--scales", default="small", help=f"Escalas separadas por vírgula ({', '.join(SCALES)})")
+    ap.add_argument("--repeat", type=int, default=3, help="Execuções por cenário")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workdir", default=WORK_ROOT, help="Onde os dados sintéticos de cada escala são preparados")
+    ap.add_argument("--results_dir", default=RESULTS_DIR, help="Onde os resultados por commit são guardados")
+    ap.add_argument("--compare", default="", help="Commit (ou arquivo JSON) de referência para comparação")
+    ap.add_argument("--threshold", type=float, default=20.0, help="Piora percentual sinalizada como regressão")
+    return ap.parse_args()
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{rev}-dirty" if dirty else rev
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_workdir(workdir: str, rows: int, seed: int) -> str:
+    """Diretório com config/ e data/raw sintéticos; regenera só quando escala/semente/gerador mudam."""
+    manifest_path = os.path.join(workdir, "manifest.json")
+    manifest = {"generator": GENERATOR_VERSION, "rows_per_month": rows, "seed": seed, "months": MONTHS}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            if json.load(f) == manifest:
+                return workdir
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(os.path.join(workdir, "config"))
+    with open(os.path.join(workdir, "config", "settings.yaml"), "w", encoding="utf-8") as f:
+        f.write(SETTINGS_YAML.format(start=MONTHS[0], end=MONTHS[-1]))
+    catalog = os.path.join(ROOT, "config", "tj_catalog.csv")
+    shutil.copy(catalog, os.path.join(workdir, "config", "tj_catalog.csv"))
+    print(f"[INFO] Gerando {rows:,} linhas/mês em {workdir} ...")
+    generate(os.path.join(workdir, "data", "raw"), rows, MONTHS, seed=seed)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return workdir
+
+
+def scenarios() -> Dict[str, Callable[[], object]]:
+    """Cenários executados dentro do diretório de trabalho (caminhos relativos de config/)."""
+    import compute_metrics
+    from src import api
+    from src.config import load_settings
+    from src.pipeline import run_pipeline, run_pipeline_arrow
+    from src.utils.dashboard import dashboard_aggregations, informative_rows
+    from src.utils.ingest_local import load_month_data
+
+    settings = load_settings()
+    tjs = sorted(TJ_LAYOUTS)
+    metrics_dir = os.path.join("reports", "output")
+
+    def pipeline():
+        df = run_pipeline(tjs, MONTHS[0], MONTHS[-1], raw_root=settings.raw_dir, read_cache=False)
+        os.makedirs(os.path.dirname(settings.unified_parquet), exist_ok=True)
+        df.to_parquet(settings.unified_parquet, index=False)
+        return df
+
+    # caches de leitura desligados: cada repetição (e cada cenário) lê os arquivos brutos de novo
+    out: Dict[str, Callable[[], object]] = {}
+    for tj, layout in TJ_LAYOUTS.items():
+        out[f"load_month_data[{tj}:{layout}]"] = (
+            lambda tj=tj: load_month_data(tj, MONTHS[0], raw_root=settings.raw_dir, archive_cache_dir=None,
+                                          parse_cache_dir=None))
+    out["run_pipeline"] = pipeline
+    out["run_pipeline[arrow]"] = lambda: run_pipeline_arrow(tjs, MONTHS[0], MONTHS[-1], settings.unified_parquet,
+                                                            raw_root=settings.raw_dir, read_cache=False)
+    out["compute_metrics"] = lambda: compute_metrics.compute(
+        Namespace(input=settings.unified_parquet, outdir=metrics_dir, teto=41_650.92, version="", snapshots_dir=""))
+    out["api /metrics"] = api.metrics
+    # mesmo código de scripts/dash_app.py (sem a camada Streamlit/Plotly)
+    out["dashboard_aggregations"] = lambda: dashboard_aggregations(
+        informative_rows(pd.read_parquet(settings.unified_parquet)), teto=41_650.92)
+    return out
+
+
+def boundary_mismatches() -> List[str]:
+    """CSVs UTF-8 maiores que a amostra de detecção do leitor Arrow (`SNIFF_BYTES`), com
+    caracteres multibyte cortados em cada posição possível do fim da amostra: leitura
+    Arrow e pandas têm de dar os mesmos nomes, cargos e valores."""
+    import tempfile
+
+    from src.utils.arrow_ingest import SNIFF_BYTES, load_month_arrow
+    from src.utils.ingest_local import load_month_data
+
+    line = "José Conceição Simões;Técnico Judiciário;1.234,56\n".encode("utf-8")
+    out = []
+    with tempfile.TemporaryDirectory() as raw_root:
+        for pad in range(8):
+            month_dir = os.path.join(raw_root, "TJXX", f"2024-{pad + 1:02d}")
+            os.makedirs(month_dir)
+            body = "Nome;Cargo;Remuneração Bruta\n".encode("utf-8") + ("Ã" * pad + ";x;0\n").encode("utf-8")
+            body += line * (SNIFF_BYTES // len(line) + 2)
+            with open(os.path.join(month_dir, "folha.csv"), "wb") as f:
+                f.write(body)
+            opts = dict(raw_root=raw_root, archive_cache_dir=None, parse_cache_dir=None)
+            a = load_month_data("TJXX", f"2024-{pad + 1:02d}", **opts)
+            b = load_month_arrow("TJXX", f"2024-{pad + 1:02d}", **opts).to_pandas()
+            cols = ["server_name", "role", "gross_pay"]
+            if len(a) != len(b) or not a[cols].reset_index(drop=True).equals(b[cols]):
+                out.append(f"utf8_cut(pad={pad})")
+    return out
+
+
+def engine_mismatches() -> List[str]:
+    """Colunas em que o `--engine arrow` diverge do caminho pandas nos mesmos dados brutos.
+
+    Linhas são comparadas sem ordem, valores com 2 casas; inclui `boundary_mismatches`.
+    """
+    from src.config import load_settings
+    from src.pipeline import run_pipeline, run_pipeline_arrow
+    from src.schemas import UNIFIED_COLUMNS
+    from src.utils.arrow_ingest import PAY_COLUMNS
+
+    settings = load_settings()
+    tjs = sorted(TJ_LAYOUTS)
+    arrow_path = os.path.join(os.path.dirname(settings.unified_parquet), "engine_check_arrow.parquet")
+    expected = run_pipeline(tjs, MONTHS[0], MONTHS[-1], raw_root=settings.raw_dir, read_cache=False)
+    run_pipeline_arrow(tjs, MONTHS[0], MONTHS[-1], arrow_path, raw_root=settings.raw_dir, read_cache=False)
+    got = pd.read_parquet(arrow_path)
+    os.remove(arrow_path)
+    if len(expected) != len(got):
+        return ["rows"] + boundary_mismatches()
+
+    def normalized(df: pd.DataFrame) -> pd.DataFrame:
+        df = df[UNIFIED_COLUMNS].copy()
+        for c in UNIFIED_COLUMNS:
+            df[c] = df[c].astype(float).round(2) if c in PAY_COLUMNS else df[c].astype(object).where(df[c].notna(), "")
+        return df.sort_values(UNIFIED_COLUMNS, ignore_index=True)
+
+    a, b = normalized(expected), normalized(got)
+    return [c for c in UNIFIED_COLUMNS if not a[c].equals(b[c])] + boundary_mismatches()
+
+
+def run_scale(workdir: str, repeat: int) -> tuple[Dict[str, Dict], List[str]]:
+    from src.extractors.registry import EXTRACTOR_REGISTRY
+    from src.utils.instrumentation import peak_rss_mb
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # o catálogo é lido relativo ao diretório atual
+        EXTRACTOR_REGISTRY.reload()
+        results: Dict[str, Dict] = {}
+        for name, fn in scenarios().items():
+            times: List[float] = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                res = fn()
+                times.append(time.perf_counter() - t0)
+            # run_pipeline_arrow devolve só a contagem de linhas gravadas
+            rows = len(res) if isinstance(res, pd.DataFrame) else (res if isinstance(res, int) else None)
+            results[name] = {
+                "median_s": round(statistics.median(times), 4),
+                "min_s": round(min(times), 4),
+                "max_s": round(max(times), 4),
+                "rows": rows,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            print(f"  {name:<40} mediana {results[name]['median_s']:9.3f} s  (min {results[name]['min_s']:.3f} s)")
+        # fora da medição: a saída dos dois motores tem de ser a mesma
+        mismatches = engine_mismatches()
+        if mismatches:
+            print(f"[WARN] --engine arrow diverge do pandas em: {', '.join(mismatches)}")
+        else:
+            print("[OK] --engine arrow e pandas produzem o mesmo dataset")
+        return results, mismatches
+    finally:
+        os.chdir(cwd)
+        EXTRACTOR_REGISTRY.reload()
+
+
+def load_results(ref: str, results_dir: str) -> Dict:
+    path = ref if ref.endswith(".json") else os.path.join(results_dir, f"{ref}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Diferença percentual da mediana por cenário; devolve as regressões acima de `threshold`."""
+    regressions = []
+    print(f"\nComparação com {baseline.get('commit', '?')}:")
+    for scale, scen in current["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale)
+        if not base_scale:
+            continue
+        for name, r in scen.items():
+            b = base_scale.get(name)
+            if not b or not b["median_s"]:
+                continue
+            delta = (r["median_s"] - b["median_s"]) / b["median_s"] * 100
+            flag = "  <-- regressão" if delta > threshold else ""
+            print(f"  [{scale}] {name:<40} {b['median_s']:9.3f} s -> {r['median_s']:9.3f} s ({delta:+6.1f}%){flag}")
+            if flag:
+                regressions.append(f"{scale}/{name}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        raise SystemExit(f"Escalas desconhecidas: {', '.join(unknown)}")
+
+    # referência lida antes de gravar: pode ser o próprio commit (ex.: antes/depois de uma mudança local)
+    baseline = load_results(args.compare, args.results_dir) if args.compare else None
+
+    current = {
+        "commit": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "scales": {},
+        "engine_mismatches": {},
+    }
+    for scale in scales:
+        workdir = os.path.abspath(os.path.join(args.workdir, scale))
+        prepare_workdir(workdir, SCALES[scale], args.seed)
+        print(f"[INFO] Escala {scale} ({SCALES[scale]:,} linhas/mês, {len(MONTHS)} meses)")
+        current["scales"][scale], current["engine_mismatches"][scale] = run_scale(workdir, args.repeat)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    out_path = os.path.join(args.results_dir, f"{current['commit']}.json")
+    # resultados de outras escalas do mesmo commit são preservados
+    if os.path.exists(out_path):
+        previous = load_results(out_path, args.results_dir)
+        current["scales"] = {**previous.get("scales", {}), **current["scales"]}
+        current["engine_mismatches"] = {**previous.get("engine_mismatches", {}), **current["engine_mismatches"]}
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+    print(f"[OK] Resultados salvos em: {out_path}")
+
+    failed = False
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"[WARN] {len(regressions)} cenário(s) acima de {args.threshold:.0f}% de piora")
+            failed = True
+    if any(current["engine_mismatches"].get(s) for s in scales):
+        print("[WARN] Saída do --engine arrow diferente da do caminho pandas (ver acima)")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Módulos cuja importação indica custo de cold start evitável
+HEAVY_MODULES = ["bs4", "lxml", "requests", "openpyxl", "src.extractors.generic", "src.utils.ingest_local"]
+
+# Cada cenário roda em um interpretador novo (cold start real)
+SCENARIOS: Dict[str, str] = {
+    "cli (import src.main)": "import src.main",
+    "api (import src.api)": "import src.api",
+    "api GET /tjs": "import src.api; src.api.list_tjs()",
+}
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Mede o tempo de cold start da CLI e da API")
+    ap.add_argument("--repeat", type=int, default=5, help="Execuções por cenário")
+    ap.add_argument("--output", default="", help="Arquivo JSON opcional com os resultados")
+    return ap.parse_args()
+
+
+def run_scenario(code: str, repeat: int) -> Dict:
+    times: List[float] = []
+    heavy: List[str] = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD.format(code=code, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(res["seconds"])
+        heavy = res["heavy"]
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "max_s": max(times),
+        "heavy_modules_loaded": heavy,
+    }
+
+
+def main():
+    args = parse_args()
+    results = {name: run_scenario(code, args.repeat) for name, code in SCENARIOS.items()}
+    for name, r in results.items():
+        heavy = ", ".join(r["heavy_modules_loaded"]) or "-"
+        print(f"{name:<24} mediana {r['median_s'] * 1000:8.1f} ms  (min {r['min_s'] * 1000:.1f} ms)  pesados: {heavy}")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[OK] Resultados salvos em: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
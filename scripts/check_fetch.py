@@ -0,0 +1,231 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.utils.fetch import DownloadTask, Fetcher
+from src.utils.raw_cache import RawCache
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class StubPortal:
+    """Portal de transparência local (`http.server`) com ETag/Last-Modified, 304 e Range/If-Range.
+
+    `files` mapeia caminho da URL -> corpo; `hits` conta requisições, `sent` bytes de corpo
+    enviados e `peak` o máximo de requisições simultâneas por TJ (primeiro segmento do caminho),
+    cada uma segurada por `delay` segundos.
+    """
+
+    def __init__(self, files: Dict[str, bytes]):
+        self.files = files
+        self.hits = 0
+        self.sent = 0
+        self.delay = 0.0
+        self.peak: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                tj = self.path.split("/")[1]
+                with portal._lock:
+                    portal.hits += 1
+                    portal._active[tj] = portal._active.get(tj, 0) + 1
+                    portal.peak[tj] = max(portal.peak.get(tj, 0), portal._active[tj])
+                try:
+                    time.sleep(portal.delay)
+                    self.serve()
+                finally:
+                    with portal._lock:
+                        portal._active[tj] -= 1
+
+            def serve(self):
+                body = portal.files.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                start = 0
+                rng = self.headers.get("Range", "")
+                if rng.startswith("bytes=") and self.headers.get("If-Range") in (etag, LAST_MODIFIED):
+                    start = int(rng[len("bytes="):].split("-")[0])
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(len(body) - start))
+                self.end_headers()
+                self.wfile.write(body[start:])
+                with portal._lock:
+                    portal.sent += len(body) - start
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def check_cache(portal: StubPortal, workdir: str) -> List[str]:
+    """Downloads condicionais, retomada com Range, `.part` completo/desatualizado e deduplicação."""
+    failures: List[str] = []
+    body = portal.files["/TJXX/2024_01.csv"]
+    url = portal.url("/TJXX/2024_01.csv")
+    cache = RawCache(os.path.join(workdir, "http"))
+    fetcher = Fetcher(raw_root=os.path.join(workdir, "raw"), rate_per_host=1000, cache=cache)
+    task = DownloadTask("TJXX", "2024-01", url)
+    part, part_meta = cache._partial_paths(url)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def run(label: str, status: str, transferred: int) -> None:
+        hits, sent = portal.hits, portal.sent
+        r = fetcher.fetch_all([task])[0]
+        ok = r.ok and r.status == status and r.bytes == transferred and portal.hits - hits == 1
+        if ok:
+            with open(r.path, "rb") as f:
+                ok = f.read() == body
+        ok = ok and portal.sent - sent == transferred and not os.path.exists(part)
+        print(f"[{'OK' if ok else 'WARN'}] {label}: {r.status} ({r.bytes} bytes, "
+              f"{portal.hits - hits} requisição(ões)){'' if r.ok else ' ' + str(r.error)}")
+        if not ok:
+            failures.append(label)
+
+    def interrupted(content: bytes) -> None:
+        with open(part, "wb") as f:
+            f.write(content)
+        with open(part_meta, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": LAST_MODIFIED}, f)
+
+    try:
+        run("primeiro download", "downloaded", len(body))
+        run("mês sem alteração (304)", "not_modified", 0)
+
+        cache._index.clear()
+        interrupted(body[: len(body) // 3])
+        run("download interrompido retomado com Range", "resumed", len(body) - len(body) // 3)
+
+        cache._index.clear()
+        interrupted(body)
+        run("`.part` completo não renomeado (416)", "resumed", 0)
+
+        cache._index.clear()
+        hits = portal.hits
+        interrupted(body + b"versao anterior maior")
+        r = fetcher.fetch_all([task])[0]
+        ok = r.ok and r.status == "downloaded" and portal.hits - hits == 2 and not os.path.exists(part)
+        print(f"[{'OK' if ok else 'WARN'}] `.part` de outra versão (416) descartado e rebaixado: {r.status}")
+        if not ok:
+            failures.append("416 com .part desatualizado")
+
+        twin = fetcher.fetch_all([DownloadTask("TJYY", "2024-01", portal.url("/TJYY/2024_01.csv"))])[0]
+        objects = [n for _, _, names in os.walk(os.path.join(cache.root, "objects")) for n in names]
+        ok = twin.ok and len(objects) == 1
+        print(f"[{'OK' if ok else 'WARN'}] Corpo idêntico em outra URL deduplicado: {len(objects)} objeto(s)")
+        if not ok:
+            failures.append("deduplicação")
+    finally:
+        fetcher.close()
+    return failures
+
+
+def check_concurrency(portal: StubPortal, workdir: str, max_per_tj: int = 2) -> List[str]:
+    """`fetch_all` e chamadas avulsas de `download` dividem as vagas por TJ; 404 vira erro sem `.part`."""
+    failures: List[str] = []
+    fetcher = Fetcher(raw_root=os.path.join(workdir, "raw"), rate_per_host=1000, max_workers=8,
+                      max_per_tj=max_per_tj)
+    tasks = [DownloadTask(tj, f"2024-{m:02d}", portal.url(f"/{tj}/2024_01.csv"), filename=f"{m}.csv")
+             for m in range(1, 5) for tj in ("TJXX", "TJYY")]
+    portal.delay, portal.peak = 0.2, {}
+    try:
+        # downloads avulsos do mesmo TJ em paralelo a `fetch_all`
+        extra = [threading.Thread(target=fetcher.download, args=(DownloadTask(
+            "TJXX", "2024-12", portal.url("/TJXX/2024_01.csv"), filename=f"avulso{i}.csv"),)) for i in range(2)]
+        for t in extra:
+            t.start()
+        results = fetcher.fetch_all(tasks)
+        for t in extra:
+            t.join()
+        ok = all(r.ok for r in results) and max(portal.peak.values()) <= max_per_tj
+        print(f"[{'OK' if ok else 'WARN'}] Pico de downloads simultâneos por TJ: {portal.peak} (limite {max_per_tj})")
+        if not ok:
+            failures.append("limite por TJ")
+
+        portal.delay = 0.0
+        missing = DownloadTask("TJXX", "2025-01", portal.url("/TJXX/ausente.csv"))
+        r = fetcher.download(missing)
+        ok = not r.ok and "404" in (r.error or "") and not os.path.exists(fetcher.destination(missing) + ".part")
+        print(f"[{'OK' if ok else 'WARN'}] URL inexistente: {r.error}")
+        if not ok:
+            failures.append("404")
+    finally:
+        fetcher.close()
+    return failures
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Verifica o Fetcher e o RawCache contra um portal HTTP local")
+    ap.add_argument("--size_kb", type=int, default=512, help="Tamanho dos arquivos servidos")
+    ap.add_argument("--keep", action="store_true", help="Mantém o diretório de trabalho temporário")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    body = os.urandom(args.size_kb * 1024)
+    portal = StubPortal({"/TJXX/2024_01.csv": body, "/TJYY/2024_01.csv": body})
+    workdir = tempfile.mkdtemp(prefix="check_fetch_")
+    try:
+        failures = check_cache(portal, os.path.join(workdir, "cache"))
+        failures += check_concurrency(portal, os.path.join(workdir, "pool"))
+    finally:
+        portal.close()
+        if args.keep:
+            print(f"[INFO] Diretório de trabalho: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        print(f"[WARN] {len(failures)} verificação(ões) falharam: {', '.join(failures)}")
+        sys.exit(1)
+    print("[OK] Fetcher e RawCache conferidos contra o portal local")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,89 @@
 from __future__ import annotations
 import argparse
 import os
+import sys
 import pandas as pd
 
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.utils.instrumentation import PROFILE_MODES, RunReport, run_report_path, stage, use_report
+
 
 def parse_args():
     ap = argparse.ArgumentParser(description="Computa métricas agregadas para relatório")
-    ap.add_argument("--input", required=True, help="Arquivo Parquet unificado")
+    ap.add_argument("--input", default="", help="Arquivo Parquet unificado")
     ap.add_argument("--outdir", required=True, help="Diretório de saída para métricas")
     ap.add_argument("--teto", type=float, default=None, help="Valor do teto constitucional (opcional)")
-    return ap.parse_args()
-
-
-def main():
-    args = parse_args()
+    ap.add_argument("--run_report", default=run_report_path("metrics"),
+                    help="JSON com tempo, linhas e memória de cada etapa")
+    ap.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                    help="Perfila as etapas (cProfile ou amostragem); saída em profiles/ ao lado do relatório")
+    ap.add_argument("--snapshots_dir", default="",
+                    help="Repositório de versões (data.snapshots_dir); as métricas geradas são publicadas nele")
+    ap.add_argument("--version", default="",
+                    help="Calcula sobre uma versão fixada do dataset (requer --snapshots_dir; não publica)")
+    args = ap.parse_args()
+    if not args.input and not args.version:
+        ap.error("informe --input ou --version")
+    if args.version and not args.snapshots_dir:
+        ap.error("--version requer --snapshots_dir")
+    return args
+
+
+def compute(args):
     os.makedirs(args.outdir, exist_ok=True)
-    df = pd.read_parquet(args.input)
-    # Filtra linhas informativas: mantém quando alguma rubrica financeira é > 0
-    informative_mask = (
-        (df.get("gross_pay", 0) > 0)
-        | (df.get("net_pay", 0) > 0)
-        | (df.get("benefits", 0) > 0)
-        | (df.get("base_pay", 0) > 0)
-    )
-    df_f = df[informative_mask].copy()
-
-    # Tamanho total e por função/carreira
-    by_role = df_f.groupby(["year_month", "role"], dropna=False).agg(
-        servidores=("server_id", "nunique"),
-        media_bruta=("gross_pay", "mean"),
-        mediana_bruta=("gross_pay", "median"),
-    ).reset_index()
-    by_role.to_parquet(os.path.join(args.outdir, "by_role.parquet"), index=False)
-
-    # Por função e por TJ (comparativo entre estados por função)
-    if "tj_code" in df_f.columns:
-        by_role_tj = df_f.groupby(["year_month", "tj_code", "role"], dropna=False).agg(
+    with stage("read_input") as st:
+        if args.version:
+            from src.utils.snapshots import SnapshotStore
+
+            df = SnapshotStore(args.snapshots_dir).read_unified(args.version)
+        else:
+            df = pd.read_parquet(args.input)
+        st.rows_out = len(df)
+
+    with stage("filter") as st:
+        # Filtra linhas informativas: mantém quando alguma rubrica financeira é > 0
+        informative_mask = (
+            (df.get("gross_pay", 0) > 0)
+            | (df.get("net_pay", 0) > 0)
+            | (df.get("benefits", 0) > 0)
+            | (df.get("base_pay", 0) > 0)
+        )
+        df_f = df[informative_mask].copy()
+        st.rows_in, st.rows_out = len(df), len(df_f)
+
+    with stage("by_role"):
+        # Tamanho total e por função/carreira
+        by_role = df_f.groupby(["year_month", "role"], dropna=False).agg(
             servidores=("server_id", "nunique"),
             media_bruta=("gross_pay", "mean"),
             mediana_bruta=("gross_pay", "median"),
         ).reset_index()
-        by_role_tj.to_parquet(os.path.join(args.outdir, "by_role_tj.parquet"), index=False)
+        by_role.to_parquet(os.path.join(args.outdir, "by_role.parquet"), index=False)
 
-        # Versão líquida por função
-        by_role_tj_net = df_f.groupby(["year_month", "tj_code", "role"], dropna=False).agg(
-            servidores=("server_id", "nunique"),
-            media_liquida=("net_pay", "mean"),
-            mediana_liquida=("net_pay", "median"),
-        ).reset_index()
-        by_role_tj_net.to_parquet(os.path.join(args.outdir, "by_role_tj_net.parquet"), index=False)
-
-    # Distribuição global por mês
-    by_month = df_f.groupby(["year_month"]).agg(
-        servidores=("server_id", "nunique"),
-        media_bruta=("gross_pay", "mean"),
-        mediana_bruta=("gross_pay", "median"),
-        p90_bruta=("gross_pay", lambda x: x.quantile(0.9)),
-        p99_bruta=("gross_pay", lambda x: x.quantile(0.99)),
-        max_bruta=("gross_pay", "max"),
-    ).reset_index()
-    by_month.to_parquet(os.path.join(args.outdir, "by_month.parquet"), index=False)
-
-    # Distribuição por mês e por TJ (comparativo entre estados)
-    if "tj_code" in df_f.columns:
-        by_month_tj = df_f.groupby(["year_month", "tj_code"]).agg(
+        # Por função e por TJ (comparativo entre estados por função)
+        if "tj_code" in df_f.columns:
+            by_role_tj = df_f.groupby(["year_month", "tj_code", "role"], dropna=False).agg(
+                servidores=("server_id", "nunique"),
+                media_bruta=("gross_pay", "mean"),
+                mediana_bruta=("gross_pay", "median"),
+            ).reset_index()
+            by_role_tj.to_parquet(os.path.join(args.outdir, "by_role_tj.parquet"), index=False)
+
+            # Versão líquida por função
+            by_role_tj_net = df_f.groupby(["year_month", "tj_code", "role"], dropna=False).agg(
+                servidores=("server_id", "nunique"),
+                media_liquida=("net_pay", "mean"),
+                mediana_liquida=("net_pay", "median"),
+            ).reset_index()
+            by_role_tj_net.to_parquet(os.path.join(args.outdir, "by_role_tj_net.parquet"), index=False)
+
+    with stage("by_month"):
+        # Distribuição global por mês
+        by_month = df_f.groupby(["year_month"]).agg(
             servidores=("server_id", "nunique"),
             media_bruta=("gross_pay", "mean"),
             mediana_bruta=("gross_pay", "median"),
@@ -71,89 +91,112 @@ def main():
             p99_bruta=("gross_pay", lambda x: x.quantile(0.99)),
             max_bruta=("gross_pay", "max"),
         ).reset_index()
-        by_month_tj.to_parquet(os.path.join(args.outdir, "by_month_tj.parquet"), index=False)
+        by_month.to_parquet(os.path.join(args.outdir, "by_month.parquet"), index=False)
 
-        # Versão líquida (net_pay)
-        by_month_tj_net = df_f.groupby(["year_month", "tj_code"]).agg(
-            servidores=("server_id", "nunique"),
-            media_liquida=("net_pay", "mean"),
-            mediana_liquida=("net_pay", "median"),
-            p90_liquida=("net_pay", lambda x: x.quantile(0.9)),
-            p99_liquida=("net_pay", lambda x: x.quantile(0.99)),
-            max_liquida=("net_pay", "max"),
-        ).reset_index()
-        by_month_tj_net.to_parquet(os.path.join(args.outdir, "by_month_tj_net.parquet"), index=False)
-
-    # Maior remuneração por mês (quem é)
-    base_for_top = df_f if not df_f.empty else df
-    if not base_for_top.empty:
-        idx = base_for_top.groupby("year_month")["gross_pay"].idxmax()
-        top_by_month = base_for_top.loc[idx, ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
-    else:
-        top_by_month = pd.DataFrame(columns=["year_month", "tj_code", "server_name", "role", "gross_pay"])
-    top_by_month.to_parquet(os.path.join(args.outdir, "top_by_month.parquet"), index=False)
-
-    # Top do ano (global)
-    try:
-      base_for_year = df_f if not df_f.empty else df
-      top_idx = base_for_year["gross_pay"].idxmax()
-      top_of_year = base_for_year.loc[[top_idx], ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
-      top_of_year.to_parquet(os.path.join(args.outdir, "top_of_year.parquet"), index=False)
-    except Exception:
-      pass
-
-    # Contagem total de servidores e por função
-    try:
-      total_count = pd.DataFrame({"servidores_total": [int(df_f["server_id"].nunique())]})
-      total_count.to_parquet(os.path.join(args.outdir, "counts_total.parquet"), index=False)
-
-      by_role_count = df_f.groupby(["role"], dropna=False)["server_id"].nunique().reset_index(name="servidores")
-      by_role_count.to_parquet(os.path.join(args.outdir, "counts_by_role.parquet"), index=False)
-    except Exception:
-      pass
-
-    # Métricas de teto constitucional (opcional)
-    if args.teto is not None:
-        try:
-            df_ex = df_f.copy() if not df_f.empty else df.copy()
-            df_ex["excedente"] = (df_ex["gross_pay"] - float(args.teto)).clip(lower=0)
-            exceeders = df_ex[df_ex["excedente"] > 0]
-
-            exceeders_by_month = exceeders.groupby(["year_month"]).agg(
-                servidores_acima=("server_id", "nunique"),
-                excedente_total=("excedente", "sum"),
+        # Distribuição por mês e por TJ (comparativo entre estados)
+        if "tj_code" in df_f.columns:
+            by_month_tj = df_f.groupby(["year_month", "tj_code"]).agg(
+                servidores=("server_id", "nunique"),
+                media_bruta=("gross_pay", "mean"),
+                mediana_bruta=("gross_pay", "median"),
+                p90_bruta=("gross_pay", lambda x: x.quantile(0.9)),
+                p99_bruta=("gross_pay", lambda x: x.quantile(0.99)),
+                max_bruta=("gross_pay", "max"),
             ).reset_index()
-            exceeders_by_month.to_parquet(os.path.join(args.outdir, "exceeders_by_month.parquet"), index=False)
+            by_month_tj.to_parquet(os.path.join(args.outdir, "by_month_tj.parquet"), index=False)
 
-            exceeders_by_career = exceeders.groupby(["career"], dropna=False).agg(
+            # Versão líquida (net_pay)
+            by_month_tj_net = df_f.groupby(["year_month", "tj_code"]).agg(
                 servidores=("server_id", "nunique"),
-                excedente_total=("excedente", "sum"),
+                media_liquida=("net_pay", "mean"),
+                mediana_liquida=("net_pay", "median"),
+                p90_liquida=("net_pay", lambda x: x.quantile(0.9)),
+                p99_liquida=("net_pay", lambda x: x.quantile(0.99)),
+                max_liquida=("net_pay", "max"),
             ).reset_index()
-            if not exceeders_by_career.empty:
-                exceeders_by_career["excedente_per_capita"] = (
-                    exceeders_by_career["excedente_total"] / exceeders_by_career["servidores"].replace({0: float("nan")})
-                )
-            exceeders_by_career.to_parquet(os.path.join(args.outdir, "exceeders_by_career.parquet"), index=False)
+            by_month_tj_net.to_parquet(os.path.join(args.outdir, "by_month_tj_net.parquet"), index=False)
+
+    with stage("top"):
+        # Maior remuneração por mês (quem é)
+        base_for_top = df_f if not df_f.empty else df
+        if not base_for_top.empty:
+            idx = base_for_top.groupby("year_month")["gross_pay"].idxmax()
+            top_by_month = base_for_top.loc[idx, ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
+        else:
+            top_by_month = pd.DataFrame(columns=["year_month", "tj_code", "server_name", "role", "gross_pay"])
+        top_by_month.to_parquet(os.path.join(args.outdir, "top_by_month.parquet"), index=False)
+
+        # Top do ano (global)
+        try:
+          base_for_year = df_f if not df_f.empty else df
+          top_idx = base_for_year["gross_pay"].idxmax()
+          top_of_year = base_for_year.loc[[top_idx], ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
+          top_of_year.to_parquet(os.path.join(args.outdir, "top_of_year.parquet"), index=False)
         except Exception:
-            # Mantém compatibilidade mesmo se não for possível calcular excedentes
-            pass
+          pass
 
-    # Relatório de cobertura (por mês)
-    try:
-        coverage = (
-            df.groupby("year_month")
-              .apply(lambda g: pd.Series({
-                  "gross_pay_nonzero_rate": float((g.get("gross_pay", 0) > 0).mean()),
-                  "net_pay_nonzero_rate": float((g.get("net_pay", 0) > 0).mean()),
-                  "benefits_nonzero_rate": float((g.get("benefits", 0) > 0).mean()),
-                  "base_pay_nonzero_rate": float((g.get("base_pay", 0) > 0).mean()),
-              }))
-              .reset_index()
-        )
-        coverage.to_json(os.path.join(args.outdir, "coverage_by_month.json"), orient="records", force_ascii=False)
-        if "tj_code" in df.columns:
-            coverage_tj = (
-                df.groupby(["year_month", "tj_code"]) 
+    with stage("topk") as st:
+        # Top-K por (TJ, mês, cargo) pré-calculado; só partições novas/alteradas são refeitas
+        from src.utils.topk import TOPK_FILE, update_topk
+
+        if "server_id" in df_f.columns:
+            res = update_topk(df_f, os.path.join(args.outdir, TOPK_FILE))
+            st.rows_in, st.rows_out = len(df_f), res["rows"]
+            print(f"[INFO] Top-K: {res['changed']} partição(ões) recalculada(s), {res['reused']} reaproveitada(s), "
+                  f"{res['removed']} removida(s)")
+
+    with stage("ecdf") as st:
+        # ECDF por (TJ, mês, cargo) para consultas de percentil (GET /percentile), idem incremental
+        from src.utils.ecdf import ECDF_FILE, update_ecdf
+
+        res = update_ecdf(df_f, os.path.join(args.outdir, ECDF_FILE))
+        st.rows_in, st.rows_out = len(df_f), res["rows"]
+        print(f"[INFO] ECDF: {res['changed']} partição(ões) recalculada(s), {res['reused']} reaproveitada(s), "
+              f"{res['removed']} removida(s)")
+
+    with stage("counts"):
+        # Contagem total de servidores e por função
+        try:
+          total_count = pd.DataFrame({"servidores_total": [int(df_f["server_id"].nunique())]})
+          total_count.to_parquet(os.path.join(args.outdir, "counts_total.parquet"), index=False)
+
+          by_role_count = df_f.groupby(["role"], dropna=False)["server_id"].nunique().reset_index(name="servidores")
+          by_role_count.to_parquet(os.path.join(args.outdir, "counts_by_role.parquet"), index=False)
+        except Exception:
+          pass
+
+    with stage("teto"):
+        # Métricas de teto constitucional (opcional)
+        if args.teto is not None:
+            try:
+                df_ex = df_f.copy() if not df_f.empty else df.copy()
+                df_ex["excedente"] = (df_ex["gross_pay"] - float(args.teto)).clip(lower=0)
+                exceeders = df_ex[df_ex["excedente"] > 0]
+
+                exceeders_by_month = exceeders.groupby(["year_month"]).agg(
+                    servidores_acima=("server_id", "nunique"),
+                    excedente_total=("excedente", "sum"),
+                ).reset_index()
+                exceeders_by_month.to_parquet(os.path.join(args.outdir, "exceeders_by_month.parquet"), index=False)
+
+                exceeders_by_career = exceeders.groupby(["career"], dropna=False).agg(
+                    servidores=("server_id", "nunique"),
+                    excedente_total=("excedente", "sum"),
+                ).reset_index()
+                if not exceeders_by_career.empty:
+                    exceeders_by_career["excedente_per_capita"] = (
+                        exceeders_by_career["excedente_total"] / exceeders_by_career["servidores"].replace({0: float("nan")})
+                    )
+                exceeders_by_career.to_parquet(os.path.join(args.outdir, "exceeders_by_career.parquet"), index=False)
+            except Exception:
+                # Mantém compatibilidade mesmo se não for possível calcular excedentes
+                pass
+
+    with stage("coverage"):
+        # Relatório de cobertura (por mês)
+        try:
+            coverage = (
+                df.groupby("year_month")
                   .apply(lambda g: pd.Series({
                       "gross_pay_nonzero_rate": float((g.get("gross_pay", 0) > 0).mean()),
                       "net_pay_nonzero_rate": float((g.get("net_pay", 0) > 0).mean()),
@@ -162,11 +205,47 @@ def main():
                   }))
                   .reset_index()
             )
-            coverage_tj.to_json(os.path.join(args.outdir, "coverage_by_month_tj.json"), orient="records", force_ascii=False)
-    except Exception:
-        pass
+            coverage.to_json(os.path.join(args.outdir, "coverage_by_month.json"), orient="records", force_ascii=False)
+            if "tj_code" in df.columns:
+                coverage_tj = (
+                    df.groupby(["year_month", "tj_code"]) 
+                      .apply(lambda g: pd.Series({
+                          "gross_pay_nonzero_rate": float((g.get("gross_pay", 0) > 0).mean()),
+                          "net_pay_nonzero_rate": float((g.get("net_pay", 0) > 0).mean()),
+                          "benefits_nonzero_rate": float((g.get("benefits", 0) > 0).mean()),
+                          "base_pay_nonzero_rate": float((g.get("base_pay", 0) > 0).mean()),
+                      }))
+                      .reset_index()
+                )
+                coverage_tj.to_json(os.path.join(args.outdir, "coverage_by_month_tj.json"), orient="records", force_ascii=False)
+        except Exception:
+            pass
+
 
+def main():
+    args = parse_args()
+    report = RunReport("metrics", profile=args.profile, input=args.input, version=args.version or None,
+                       outdir=args.outdir)
+    snap = None
+    try:
+        with use_report(report):
+            compute(args)
+            if args.snapshots_dir and not args.version:
+                from src.utils.snapshots import SnapshotStore, snapshot_metrics
+
+                with stage("snapshot"):
+                    store = SnapshotStore(args.snapshots_dir)
+                    snap = store.publish(metrics=snapshot_metrics(store, args.outdir), source="metrics")
+    finally:
+        path = report.save(args.run_report or None)
     print("[OK] Métricas geradas em:", args.outdir)
+    if snap:
+        print(f"[OK] Versão publicada: {snap['version']} (dataset de {snap['parent'] or 'nenhuma versão'})")
+    elif args.version:
+        print(f"[INFO] Métricas da versão {args.version} não são publicadas (versão fixada)")
+    print(f"[OK] Relatório de execução salvo em: {path}")
+    if report.profile_files:
+        print(f"[OK] Perfis salvos em: {os.path.dirname(report.profile_files[0])}")
 
 
 if __name__ == "__main__":
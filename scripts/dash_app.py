@@ -1,15 +1,25 @@
 from __future__ import annotations
 import os
+import sys
 import json
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.utils.dashboard import dashboard_aggregations, informative_rows
+
 DATA_DIR = os.path.join("reports", "output")
 BY_MONTH_TJ_PATH = os.path.join(DATA_DIR, "by_month_tj.parquet")
 BY_ROLE_TJ_PATH = os.path.join(DATA_DIR, "by_role_tj.parquet")
 COVERAGE_MONTH_PATH = os.path.join(DATA_DIR, "coverage_by_month.json")
 COVERAGE_MONTH_TJ_PATH = os.path.join(DATA_DIR, "coverage_by_month_tj.json")
+TOPK_PATH = os.path.join(DATA_DIR, "topk.parquet")
+ECDF_PATH = os.path.join(DATA_DIR, "ecdf.parquet")
 
 st.set_page_config(page_title="Dashboard Remuneração TJs", layout="wide")
 st.title("Dashboard – Remuneração nos TJs Estaduais")
@@ -115,6 +125,17 @@ if coverage_month_tj:
 else:
     st.info("Arquivo coverage_by_month_tj.json não encontrado – gere novamente as métricas.")
 
+# Percentil de um valor em cada TJ (ECDFs pré-calculadas pelas métricas)
+if os.path.exists(ECDF_PATH):
+    from src.utils.ecdf import load_index
+
+    st.markdown("### Onde fica uma remuneração bruta em cada TJ")
+    valor = st.number_input("Remuneração bruta (R$)", min_value=0.0, value=20000.0, step=1000.0, format="%.2f")
+    cmp_df = load_index(ECDF_PATH).compare([valor], "tj_code", "gross_pay", year_month=month_sel,
+                                           role=roles_sel or None, cohorts=tjs_sel)
+    if not cmp_df.empty:
+        st.dataframe(cmp_df.rename(columns={f"pct_{valor:g}": "percentil"}), use_container_width=True)
+
 # ========================= Seções adicionais =========================
 # Carregar dataset unificado para análises detalhadas (se existir)
 UNIFIED_PATH = os.path.join("data", "processed", "remuneracao_unificada.parquet")
@@ -144,14 +165,9 @@ if has_unified:
         df_uf = df_uf[df_uf["year_month"].isin(month_sel)]
     if "tj_code" in df_uf.columns:
         df_uf = df_uf[df_uf["tj_code"].isin(tjs_sel)]
-    # Máscara informativa (coerente com compute_metrics)
-    informative_mask = (
-        (df_uf.get("gross_pay", 0) > 0)
-        | (df_uf.get("net_pay", 0) > 0)
-        | (df_uf.get("benefits", 0) > 0)
-        | (df_uf.get("base_pay", 0) > 0)
-    )
-    df_inf = df_uf[informative_mask].copy()
+    # Linhas informativas (coerente com compute_metrics) e agregações das seções abaixo
+    df_inf = informative_rows(df_uf)
+    aggs = dashboard_aggregations(df_inf, teto=teto_val)
 
     st.markdown("## Perguntas e respostas")
 
@@ -160,9 +176,7 @@ if has_unified:
     if not df_inf.empty:
         total_serv = int(df_inf.get("server_id", pd.Series(dtype=object)).nunique())
         st.metric("Servidores únicos (período filtrado)", f"{total_serv:,}".replace(",", "."))
-        by_role_cnt = (
-            df_inf.groupby(["role"], dropna=False)["server_id"].nunique().reset_index(name="servidores")
-            if "role" in df_inf.columns else pd.DataFrame(columns=["role", "servidores"]))
+        by_role_cnt = aggs.get("by_role_cnt", pd.DataFrame(columns=["role", "servidores"]))
         if not by_role_cnt.empty:
             st.dataframe(by_role_cnt.sort_values("servidores", ascending=False), use_container_width=True)
     else:
@@ -171,10 +185,7 @@ if has_unified:
     # 2) Remuneração média mensal e distribuição (global e por função)
     st.markdown("### Remuneração – média e distribuição")
     if not df_inf.empty and {"year_month", "gross_pay"}.issubset(df_inf.columns):
-        bym = df_inf.groupby(["year_month"]).agg(
-            media_bruta=("gross_pay", "mean"), mediana_bruta=("gross_pay", "median")
-        ).reset_index()
-        fig = px.line(bym, x="year_month", y=["media_bruta", "mediana_bruta"], markers=True,
+        fig = px.line(aggs["bym"], x="year_month", y=["media_bruta", "mediana_bruta"], markers=True,
                       labels={"value":"R$", "variable":"Métrica"})
         st.plotly_chart(fig, use_container_width=True)
 
@@ -193,49 +204,38 @@ if has_unified:
 
     # 3) Servidor com maior remuneração bruta no período
     st.markdown("### Maior remuneração bruta do período")
-    if not df_inf.empty and {"year_month", "server_name", "gross_pay"}.issubset(df_inf.columns):
-        idxmax = df_inf["gross_pay"].idxmax()
-        rec = df_inf.loc[idxmax, ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
+    topk = load_parquet(TOPK_PATH)
+    if not topk.empty:
+        # top-K pré-calculado (compute_metrics): não varre o dataset
+        tk = topk[(topk["measure"] == "gross_pay") & topk["year_month"].isin(month_sel) & topk["tj_code"].isin(tjs_sel)]
+        if roles_sel:
+            tk = tk[tk["role"].isin(roles_sel)]
+        tk = tk.sort_values("value", ascending=False).head(10)
+        st.dataframe(tk[["year_month", "tj_code", "server_name", "role", "value"]]
+                     .rename(columns={"value": "gross_pay"}), use_container_width=True)
+    elif "top" in aggs:
+        rec = aggs["top"].iloc[0]
         st.write({k: rec[k] for k in rec.index})
 
     # 4) Excedentes ao teto constitucional
     st.markdown("### Excedentes ao teto constitucional")
-    if teto_val and teto_val > 0 and not df_inf.empty and "gross_pay" in df_inf.columns:
-        df_ex = df_inf.copy()
-        df_ex["excedente"] = (df_ex["gross_pay"] - float(teto_val)).clip(lower=0)
-        exceeders = df_ex[df_ex["excedente"] > 0]
+    if "exceeders" in aggs:
+        exceeders = aggs["exceeders"]
         st.metric("Servidores acima do teto (únicos)", f"{exceeders['server_id'].nunique():,}".replace(",", "."))
         st.metric("Excedente total (período)", f"R$ {exceeders['excedente'].sum():,.2f}".replace(",","X").replace(".",",").replace("X","."))
-        if "career" in exceeders.columns:
-            by_career = exceeders.groupby(["career"], dropna=False).agg(
-                servidores=("server_id", "nunique"),
-                excedente_total=("excedente", "sum"),
-            ).reset_index()
-            if not by_career.empty:
-                by_career["excedente_per_capita"] = (
-                    by_career["excedente_total"] / by_career["servidores"].replace({0: float("nan")})
-                )
-                st.dataframe(by_career.sort_values("excedente_total", ascending=False), use_container_width=True)
+        by_career = aggs.get("exceeders_by_career", pd.DataFrame())
+        if not by_career.empty:
+            st.dataframe(by_career.sort_values("excedente_total", ascending=False), use_container_width=True)
 
     # 5) Maior variação remuneratória ao longo do período (global e por função)
     st.markdown("### Maior variação remuneratória no período")
-    if not df_inf.empty and {"server_id", "gross_pay", "year_month"}.issubset(df_inf.columns):
+    if "var_by_srv" in aggs:
         # Medida: amplitude (max - min) por servidor
-        var_by_srv = df_inf.groupby(["server_id", "server_name"], dropna=False).agg(
-            var_amplitude=("gross_pay", lambda s: float(s.max() - s.min())),
-            media=("gross_pay", "mean"),
-            observacoes=("gross_pay", "count"),
-        ).reset_index()
-        top_var = var_by_srv.sort_values("var_amplitude", ascending=False).head(15)
+        top_var = aggs["var_by_srv"].sort_values("var_amplitude", ascending=False).head(15)
         st.dataframe(top_var, use_container_width=True)
 
-        if "role" in df_inf.columns:
-            var_by_role = df_inf.groupby(["role"], dropna=False).agg(
-                var_median=("gross_pay", lambda s: float(s.max() - s.min())),
-                media=("gross_pay", "mean"),
-                servidores=("server_id", "nunique"),
-            ).reset_index()
-            st.dataframe(var_by_role.sort_values("var_median", ascending=False), use_container_width=True)
+        if "var_by_role" in aggs:
+            st.dataframe(aggs["var_by_role"].sort_values("var_median", ascending=False), use_container_width=True)
 
     # 6) Trajetória remuneratória por servidor (busca por nome)
     st.markdown("### Trajetória por servidor (busca por nome)")
@@ -0,0 +1,226 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+from profile_columns import CACHE_PATH, _list_files, read_columns_many
+from src.extractors.generic import parse_column_overrides
+from src.extractors.registry import read_catalog
+from src.schemas import Columns
+from src.utils.ingest_local import (
+    COLUMN_CANDIDATES,
+    _field_candidates,
+    _matching_columns,
+    _normalize_header_names,
+    _resolve_columns,
+)
+
+NUMERIC_FIELDS = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+TEXT_FIELDS = [Columns.server_name, Columns.role, Columns.career, Columns.bond_type]
+STATE_PATH = os.path.join("reports", "output", ".drift_state.json")
+STATE_VERSION = "2"
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Detecta mudanças de esquema (drift) entre meses a partir dos cabeçalhos brutos")
+    ap.add_argument("--raw_root", default=os.path.join("data", "raw"), help="Raiz dos arquivos brutos")
+    ap.add_argument("--unified", default=os.path.join("data", "processed", "remuneracao_unificada.parquet"),
+                    help="Dataset unificado (opcional) para checar campos zerados/nulos")
+    ap.add_argument("--output", default=os.path.join("reports", "output", "schema_drift.json"), help="JSON de saída")
+    ap.add_argument("--workers", type=int, default=None, help="Processos paralelos para leitura de cabeçalhos")
+    ap.add_argument("--full", action="store_true", help="Ignora o estado salvo e reprocessa todos os arquivos")
+    return ap.parse_args()
+
+
+def file_signature(columns: List[str], overrides: Dict[str, List[str]]) -> Dict:
+    """Cabeçalho normalizado e resolução de `_map_columns` para um arquivo."""
+    cols = _normalize_header_names(columns)
+    resolved = _resolve_columns(cols, overrides)
+    matches = {}
+    for field in COLUMN_CANDIDATES:
+        found = set()
+        for candidates in _field_candidates(field, overrides):
+            found.update(_matching_columns(cols, candidates))
+        matches[field] = sorted(found)
+    return {"columns": cols, "resolved": resolved, "matches": matches}
+
+
+def overrides_hash(overrides: Dict[str, List[str]]) -> str:
+    """Hash dos `column_overrides` do TJ: mudar o catálogo muda a resolução das colunas."""
+    return hashlib.sha1(json.dumps(overrides, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _month_summary(file_sigs: List[Dict]) -> Dict:
+    # agrega os arquivos do mês: colunas presentes e resolução por campo
+    columns = sorted({c for s in file_sigs for c in s["columns"]})
+    resolved = {f: sorted({s["resolved"][f] for s in file_sigs if s["resolved"][f]}) for f in COLUMN_CANDIDATES}
+    ambiguous = {f: max((len(s["matches"][f]) for s in file_sigs), default=0) > 1 for f in COLUMN_CANDIDATES}
+    return {"columns": columns, "resolved": resolved, "ambiguous": ambiguous}
+
+
+def compare_months(prev: Optional[Dict], cur: Dict) -> List[Dict]:
+    issues: List[Dict] = []
+    for field in COLUMN_CANDIDATES:
+        now = cur["resolved"][field]
+        if prev is None:
+            # primeiro mês do TJ: sem base de comparação, aponta apenas os campos sem origem
+            if not now:
+                issues.append({"type": "fallback_null", "field": field,
+                               "detail": "nenhuma coluna de origem; campo ficará nulo/zerado"})
+            continue
+        before = prev["resolved"][field]
+        if before and not now:
+            issues.append({"type": "missing", "field": field, "before": before})
+        elif before and now and before != now:
+            issues.append({"type": "renamed", "field": field, "before": before, "after": now})
+        if cur["ambiguous"][field] and not prev["ambiguous"][field]:
+            issues.append({"type": "ambiguous", "field": field, "resolved": now})
+    if prev is not None:
+        added = sorted(set(cur["columns"]) - set(prev["columns"]))
+        removed = sorted(set(prev["columns"]) - set(cur["columns"]))
+        if added or removed:
+            issues.append({"type": "header_changed", "added": added, "removed": removed})
+    return issues
+
+
+def _unified_fallbacks(path: str, months: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict]]:
+    # Campos totalmente zerados (numéricos) ou nulos (texto) no dataset unificado
+    if not months or not os.path.exists(path):
+        return {}
+    import pandas as pd
+
+    wanted = sorted({ym for _, ym in months})
+    df = pd.read_parquet(path, columns=[Columns.tj_code, Columns.year_month] + NUMERIC_FIELDS + TEXT_FIELDS,
+                         filters=[(Columns.year_month, "in", wanted)])
+    out: Dict[Tuple[str, str], List[Dict]] = {}
+    if df.empty:
+        return out
+    grp = df.groupby([Columns.tj_code, Columns.year_month], sort=False)
+    zero = grp[NUMERIC_FIELDS].agg(lambda s: bool((s.fillna(0) == 0).all()))
+    null = grp[TEXT_FIELDS].agg(lambda s: bool(s.isna().all()))
+    flags = pd.concat([zero, null], axis=1)
+    for key, row in flags.iterrows():
+        if key not in months:
+            continue
+        for field, flagged in row.items():
+            if flagged:
+                kind = "all_zero" if field in NUMERIC_FIELDS else "all_null"
+                out.setdefault(key, []).append({"type": kind, "field": field, "source": "unified"})
+    return out
+
+
+def _load_state(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if data.get("version") == STATE_VERSION else {}
+    except Exception:
+        return {}
+
+
+def detect_drift(raw_root: str = "data/raw", unified: str | None = None, workers: int | None = None,
+                 state_path: str | None = STATE_PATH, full: bool = False) -> Dict:
+    """Compara cada mês com o mês anterior do mesmo TJ.
+
+    Só os arquivos novos ou alterados (tamanho/mtime, ou `column_overrides` do TJ no
+    catálogo) têm o cabeçalho lido; a assinatura dos demais vem de `state_path`. Os alertas
+    de campos zerados/nulos do `unified` são refeitos para todos os meses quando o Parquet
+    muda (tamanho/mtime), senão só para os meses com arquivos novos.
+    """
+    overrides = {r["tj_code"]: parse_column_overrides(r.get("column_overrides", "")) for r in read_catalog()}
+    override_hashes = {tj: overrides_hash(o) for tj, o in overrides.items()}
+    state = _load_state(state_path) if state_path and not full else {}
+    known: Dict[str, Dict] = state.get("files", {})
+    unified_flags: Dict[str, List[Dict]] = state.get("unified", {})
+
+    files = _list_files(raw_root)
+    fresh: List[Tuple[str, str, str]] = []
+    stats: Dict[str, List[int]] = {}
+    for tj, ym, path in files:
+        st = os.stat(path)
+        stats[path] = [int(st.st_size), int(st.st_mtime_ns)]
+        entry = known.get(path)
+        if entry is None or entry.get("stat") != stats[path] or entry.get("tj") != tj or entry.get("ym") != ym \
+                or entry.get("overrides") != override_hashes.get(tj, overrides_hash({})):
+            fresh.append((tj, ym, path))
+
+    columns = read_columns_many([p for _, _, p in fresh], workers=workers, cache_path=CACHE_PATH) if fresh else {}
+    files_state: Dict[str, Dict] = {}
+    for tj, ym, path in files:
+        if path in columns:
+            sig = file_signature(columns[path], overrides.get(tj, {}))
+            files_state[path] = {"tj": tj, "ym": ym, "stat": stats[path],
+                                 "overrides": override_hashes.get(tj, overrides_hash({})), "signature": sig}
+        else:
+            files_state[path] = known[path]
+
+    by_month: Dict[Tuple[str, str], List[Dict]] = {}
+    for entry in files_state.values():
+        if entry["signature"]["columns"]:
+            by_month.setdefault((entry["tj"], entry["ym"]), []).append(entry["signature"])
+
+    touched = {(tj, ym) for tj, ym, _ in fresh}
+    unified_stat = None
+    if unified:
+        if os.path.exists(unified):
+            st = os.stat(unified)
+            unified_stat = [os.path.abspath(unified), int(st.st_size), int(st.st_mtime_ns)]
+        # Parquet regravado (ou outro arquivo): os alertas salvos de todos os meses estão vencidos
+        stale = set(by_month) if state.get("unified_stat") != unified_stat else touched
+        found = _unified_fallbacks(unified, sorted(stale))
+        for tj, ym in stale:
+            unified_flags[f"{tj}|{ym}"] = found.get((tj, ym), [])
+    unified_flags = {k: v for k, v in unified_flags.items() if tuple(k.split("|", 1)) in by_month}
+
+    report: Dict[str, Dict] = {}
+    prev_by_tj: Dict[str, Dict] = {}
+    for tj, ym in sorted(by_month):
+        summary = _month_summary(by_month[(tj, ym)])
+        issues = compare_months(prev_by_tj.get(tj), summary) + unified_flags.get(f"{tj}|{ym}", [])
+        prev_by_tj[tj] = summary
+        if issues:
+            report.setdefault(tj, {})[ym] = issues
+
+    if state_path:
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        tmp = state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "files": files_state, "unified": unified_flags,
+                       "unified_stat": unified_stat}, f, ensure_ascii=False)
+        os.replace(tmp, state_path)
+
+    return {
+        "new_or_changed_files": sorted(p for _, _, p in fresh),
+        "issues": report,
+    }
+
+
+def main():
+    args = parse_args()
+    result = detect_drift(
+        raw_root=args.raw_root, unified=args.unified, workers=args.workers,
+        full=args.full,
+    )
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    n_issues = sum(len(v) for months in result["issues"].values() for v in months.values())
+    print(f"[INFO] Arquivos novos/alterados: {len(result['new_or_changed_files'])}; alertas: {n_issues}")
+    print(f"[OK] Relatório de drift salvo em: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import io
 import os
 import sys
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 
 # Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
@@ -10,11 +15,27 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 import pandas as pd
-from src.utils.ingest_local import _read_excel_robust
+from src.utils.ingest_local import (
+    _build_headers_from_rows,
+    _combine_two_header_rows,
+    _count_significant_headers,
+    _detect_header_row,
+    _normalize_headers,
+    _should_use_two_line_header,
+)
+from src.utils.parse_cache import CACHEABLE_EXTS, CACHE_DIR as PARSE_CACHE_DIR, ParseCache
 
 SUPPORTED_EXTS = {".csv", ".txt", ".xlsx", ".json", ".html", ".htm"}
 TARGET_TJS = {"TJRS", "TJPI", "TJTO"}
 
+# Quantidade lida do início de cada arquivo
+HEAD_BYTES = 64 * 1024
+HTML_HEAD_BYTES = 256 * 1024
+XLSX_HEAD_ROWS = 200
+# Mudanças na lógica de leitura de cabeçalhos invalidam o cache
+PROFILER_VERSION = "3"
+CACHE_PATH = os.path.join("reports", "output", ".profile_cache.json")
+
 PT_MONTHS = {
     "janeiro": "01",
     "fevereiro": "02",
@@ -32,61 +53,221 @@ PT_MONTHS = {
 }
 
 
+def _read_head(path: str, nbytes: int) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(nbytes)
+
+
+def _decode(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # corte no meio de um caractere multibyte no fim do bloco
+        if e.start >= len(raw) - 3:
+            return raw[:e.start].decode("utf-8")
+        return raw.decode("latin-1")
+
+
+def _headers_from_preview(preview: pd.DataFrame) -> List[str]:
+    """Aplica as mesmas heurísticas de `_read_excel_robust` sobre as primeiras linhas."""
+    if preview.empty:
+        return []
+    hdr = _detect_header_row(preview)
+    if hdr is not None:
+        headers = _build_headers_from_rows(preview, hdr, levels=3)
+        body = preview.iloc[hdr + 1:]
+        # descarta colunas vazias na prévia (equivalente ao dropna do leitor completo)
+        keep = [h for i, h in enumerate(headers[:preview.shape[1]]) if body.empty or body.iloc[:, i].notna().any()]
+        if _count_significant_headers(keep) >= 3 and len(keep) > 3:
+            return list(_normalize_headers(pd.DataFrame(columns=keep)).columns)
+        return [str(v) for v in preview.iloc[hdr].to_list()]
+    return [str(v) for v in preview.iloc[0].to_list()]
+
+
+def _xlsx_columns(path: str) -> List[str]:
+    # Leitor em streaming (read_only): lê só as primeiras linhas de cada aba
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        fallback: List[str] = []
+        for ws in wb.worksheets:
+            rows = list(ws.iter_rows(max_row=XLSX_HEAD_ROWS, values_only=True))
+            if not rows:
+                continue
+            preview = pd.DataFrame(rows)
+            cols = _headers_from_preview(preview)
+            if cols and _count_significant_headers(cols) >= 3:
+                return cols
+            fallback = fallback or cols
+        return fallback
+    finally:
+        wb.close()
+
+
+def _csv_columns(path: str) -> List[str]:
+    text = _decode(_read_head(path, HEAD_BYTES))
+    lines = text.splitlines()
+    if len(text) >= HEAD_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # última linha provavelmente truncada
+    if not lines:
+        return []
+    try:
+        delim = csv.Sniffer().sniff("\n".join(lines[:20]), delimiters=";,\t|").delimiter
+    except csv.Error:
+        delim = ";" if lines[0].count(";") >= lines[0].count(",") else ","
+    rows = list(csv.reader(io.StringIO("\n".join(lines[:2])), delimiter=delim))
+    row1 = rows[0] if rows else []
+    # mesmos nomes que o pandas daria às colunas sem cabeçalho
+    named = [c.strip() if c.strip() else f"Unnamed: {i}" for i, c in enumerate(row1)]
+    if len(rows) > 1 and _should_use_two_line_header(pd.DataFrame(columns=named)):
+        return _combine_two_header_rows(row1, rows[1])
+    return named
+
+
+def _json_columns(path: str) -> List[str]:
+    # primeiro registro (array, envelope ou NDJSON) achatado como na ingestão
+    from src.utils.json_stream import flatten_record, iter_json_records
+
+    try:
+        rec = next(iter_json_records(path), None)
+    except ValueError:
+        return []
+    return list(flatten_record(rec).keys()) if rec else []
+
+
+def _html_columns(path: str) -> List[str]:
+    import lxml.html
+
+    text = _decode(_read_head(path, HTML_HEAD_BYTES))
+    try:
+        doc = lxml.html.fromstring(text)
+    except Exception:
+        return []
+    for table in doc.iter("table"):
+        rows = []
+        for tr in table.iter("tr"):
+            rows.append([" ".join(td.text_content().split()) for td in tr if td.tag in ("td", "th")])
+            if len(rows) >= 20:
+                break
+        if rows:
+            width = max(len(r) for r in rows)
+            preview = pd.DataFrame([r + [None] * (width - len(r)) for r in rows])
+            return _headers_from_preview(preview)
+    return []
+
+
 def _safe_read_columns(path: str) -> List[str]:
-    """Best effort to extract column names from a file without loading everything.
-    Returns an empty list if not identifiable.
+    """Extrai os nomes de colunas lendo apenas a região de cabeçalho do arquivo.
+
+    XLSX: primeiras linhas de cada aba (openpyxl read-only); CSV/TXT e JSON: primeiros KB;
+    HTML: primeira tabela do início do documento. Retorna lista vazia se não identificável.
     """
     _, ext = os.path.splitext(path)
     ext = ext.lower()
     try:
         if ext in {".csv", ".txt"}:
-            df = pd.read_csv(path, nrows=0)
-            return list(df.columns)
+            return _csv_columns(path)
         if ext == ".xlsx":
-            # usar leitor robusto compartilhado com o pipeline
-            try:
-                df = _read_excel_robust(path)
-                if isinstance(df, pd.DataFrame) and not df.empty:
-                    return list(df.columns)
-            except Exception:
-                pass
-            # fallback simples
-            try:
-                df = pd.read_excel(path, nrows=5)
-                return list(df.columns)
-            except Exception:
-                return []
+            return _xlsx_columns(path)
         if ext == ".json":
-            # Try pandas first
-            try:
-                df = pd.read_json(path, lines=True, nrows=5)
-                return list(df.columns)
-            except Exception:
-                # Fallback: attempt to read as array of objects
-                import json as _json
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read(200000)  # read first ~200KB
-                try:
-                    data = _json.loads(text)
-                    if isinstance(data, list) and data:
-                        if isinstance(data[0], dict):
-                            return list(data[0].keys())
-                except Exception:
-                    pass
-                return []
+            return _json_columns(path)
         if ext in {".html", ".htm"}:
-            try:
-                tables = pd.read_html(path)
-                if tables:
-                    return list(tables[0].columns)
-            except Exception:
-                pass
-            return []
+            return _html_columns(path)
     except Exception:
         return []
     return []
 
 
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_cache(path: str | None) -> Tuple[Dict[str, List[str]], Dict[str, Dict]]:
+    """(colunas por hash do conteúdo, {caminho: {"stat": [tamanho, mtime_ns], "sha256": ...}})."""
+    if not path or not os.path.exists(path):
+        return {}, {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != PROFILER_VERSION:
+            return {}, {}
+        return data.get("entries", {}), data.get("files", {})
+    except Exception:
+        return {}, {}
+
+
+def _save_cache(path: str | None, entries: Dict[str, List[str]], files: Dict[str, Dict]) -> None:
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": PROFILER_VERSION, "entries": entries, "files": files}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _stat_key(path: str) -> List[int]:
+    st = os.stat(path)
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _parsed_columns(paths: List[str], parse_cache: ParseCache | None) -> Dict[str, List[str]]:
+    # arquivos já lidos pelo pipeline: colunas do DataFrame em cache (só metadados do Parquet)
+    if parse_cache is None:
+        return {}
+    out = {}
+    for p in paths:
+        if os.path.splitext(p)[1].lower() in CACHEABLE_EXTS:
+            cols = parse_cache.columns(parse_cache.key(p))
+            if cols:
+                out[p] = cols
+    return out
+
+
+def read_columns_many(paths: List[str], workers: int | None = None,
+                      cache_path: str | None = CACHE_PATH,
+                      parse_cache: ParseCache | None = None) -> Dict[str, List[str]]:
+    """Colunas de vários arquivos em paralelo, com cache pelo hash do conteúdo.
+
+    O hash de cada arquivo é reaproveitado enquanto (tamanho, mtime) não mudar, como em
+    `src.utils.archives.indexed_sha256`: só arquivos novos ou alterados são lidos por inteiro.
+    Com `parse_cache`, arquivos que o pipeline já leu usam as colunas do cache de leitura.
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    parsed = _parsed_columns(paths, parse_cache)
+    paths = [p for p in paths if p not in parsed]
+    cache, files = _load_cache(cache_path)
+    stats = {p: _stat_key(p) for p in paths}
+    hashes: Dict[str, str] = {}
+    for p in paths:
+        entry = files.get(os.path.abspath(p))
+        if entry and entry.get("stat") == stats[p]:
+            hashes[p] = entry["sha256"]
+    changed = [p for p in paths if p not in hashes]
+    if changed:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes.update(zip(changed, pool.map(_file_sha256, changed)))
+        for p in changed:
+            files[os.path.abspath(p)] = {"stat": stats[p], "sha256": hashes[p]}
+    missing = sorted({p for p in paths if hashes[p] not in cache}, key=lambda p: hashes[p])
+    if missing:
+        if workers > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_safe_read_columns, missing))
+        else:
+            results = [_safe_read_columns(p) for p in missing]
+        for p, cols in zip(missing, results):
+            cache[hashes[p]] = cols
+    if changed or missing:
+        _save_cache(cache_path, cache, files)
+    return {p: cache[hashes[p]] for p in paths} | parsed
+
+
 def _infer_year_month_from_name(name: str) -> Optional[str]:
     """Try to infer YYYY-MM from a filename containing Portuguese month names and a year.
     Examples: 'janeiro2025.csv' -> '2025-01', 'Maio2025_Piaui.csv' -> '2025-05'.
@@ -114,13 +295,9 @@ def _infer_year_month_from_name(name: str) -> Optional[str]:
     return f"{year}-{month_num}"
 
 
-def profile_columns(raw_root: str = "data/raw") -> Dict:
-    summary: Dict[str, Dict[str, Dict[str, int]]] = {}
-    # structure: {TJ: {year_month: {column_name: frequency_across_files}}}
-
-    if not os.path.isdir(raw_root):
-        return {"error": f"raw_root not found: {raw_root}"}
-
+def _list_files(raw_root: str) -> List[Tuple[str, str, str]]:
+    """(TJ, YYYY-MM, caminho) de todos os arquivos suportados sob raw_root."""
+    files: List[Tuple[str, str, str]] = []
     for tj in sorted(os.listdir(raw_root)):
         tj_path = os.path.join(raw_root, tj)
         if tj not in TARGET_TJS:
@@ -133,53 +310,68 @@ def profile_columns(raw_root: str = "data/raw") -> Dict:
         if subdirs:
             for ym in subdirs:
                 ym_path = os.path.join(tj_path, ym)
-                col_counts: Dict[str, int] = {}
                 for fname in os.listdir(ym_path):
                     fpath = os.path.join(ym_path, fname)
-                    if not os.path.isfile(fpath):
-                        continue
-                    _, ext = os.path.splitext(fpath)
-                    if ext.lower() not in SUPPORTED_EXTS:
-                        continue
-                    cols = _safe_read_columns(fpath)
-                    if not cols:
-                        continue
-                    for c in cols:
-                        col_counts[c] = col_counts.get(c, 0) + 1
-                if col_counts:
-                    summary.setdefault(tj, {})[ym] = dict(sorted(col_counts.items(), key=lambda kv: (-kv[1], kv[0].lower())))
+                    if os.path.isfile(fpath) and os.path.splitext(fpath)[1].lower() in SUPPORTED_EXTS:
+                        files.append((tj, ym, fpath))
         else:
             # Case B: layout plano (arquivos diretamente dentro do TJ)
             # Agrupar por ano-mês inferido do nome do arquivo
-            grouped: Dict[str, Dict[str, int]] = {}
             for fname in os.listdir(tj_path):
                 fpath = os.path.join(tj_path, fname)
-                if not os.path.isfile(fpath):
-                    continue
-                _, ext = os.path.splitext(fpath)
-                if ext.lower() not in SUPPORTED_EXTS:
+                if not os.path.isfile(fpath) or os.path.splitext(fpath)[1].lower() not in SUPPORTED_EXTS:
                     continue
                 ym = _infer_year_month_from_name(fname)
                 if ym is None:
                     # se não conseguir inferir, pule
                     continue
-                cols = _safe_read_columns(fpath)
-                if not cols:
-                    continue
-                bucket = grouped.setdefault(ym, {})
-                for c in cols:
-                    bucket[c] = bucket.get(c, 0) + 1
-            for ym, col_counts in grouped.items():
-                summary.setdefault(tj, {})[ym] = dict(sorted(col_counts.items(), key=lambda kv: (-kv[1], kv[0].lower())))
+                files.append((tj, ym, fpath))
+    return files
+
+
+def profile_columns(raw_root: str = "data/raw", workers: int | None = None,
+                    cache_path: str | None = CACHE_PATH, parse_cache_dir: str | None = PARSE_CACHE_DIR) -> Dict:
+    summary: Dict[str, Dict[str, Dict[str, int]]] = {}
+    # structure: {TJ: {year_month: {column_name: frequency_across_files}}}
+
+    if not os.path.isdir(raw_root):
+        return {"error": f"raw_root not found: {raw_root}"}
+
+    files = _list_files(raw_root)
+    columns = read_columns_many([p for _, _, p in files], workers=workers, cache_path=cache_path,
+                                parse_cache=ParseCache(parse_cache_dir) if parse_cache_dir else None)
+
+    grouped: Dict[Tuple[str, str], Dict[str, int]] = {}
+    for tj, ym, fpath in files:
+        cols = columns.get(fpath) or []
+        if not cols:
+            continue
+        bucket = grouped.setdefault((tj, ym), {})
+        for c in cols:
+            bucket[c] = bucket.get(c, 0) + 1
+    for (tj, ym), col_counts in sorted(grouped.items()):
+        summary.setdefault(tj, {})[ym] = dict(sorted(col_counts.items(), key=lambda kv: (-kv[1], kv[0].lower())))
 
     return summary
 
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="Perfil de colunas (somente cabeçalhos) dos arquivos brutos")
+    ap.add_argument("--raw_root", default=os.path.join("data", "raw"), help="Raiz dos arquivos brutos")
+    ap.add_argument("--output", default=os.path.join("reports", "output", "columns_profile.json"), help="JSON de saída")
+    ap.add_argument("--workers", type=int, default=None, help="Processos paralelos (padrão: até 8)")
+    ap.add_argument("--no_cache", action="store_true",
+                    help="Ignora o cache por hash de arquivo e o cache de leitura do pipeline")
+    return ap.parse_args()
+
+
 def main():
-    outdir = os.path.join("reports", "output")
-    os.makedirs(outdir, exist_ok=True)
-    prof = profile_columns(raw_root=os.path.join("data", "raw"))
-    outpath = os.path.join(outdir, "columns_profile.json")
+    args = parse_args()
+    outpath = args.output
+    os.makedirs(os.path.dirname(outpath) or ".", exist_ok=True)
+    prof = profile_columns(raw_root=args.raw_root, workers=args.workers,
+                           cache_path=None if args.no_cache else CACHE_PATH,
+                           parse_cache_dir=None if args.no_cache else PARSE_CACHE_DIR)
     with open(outpath, "w", encoding="utf-8") as f:
         json.dump(prof, f, ensure_ascii=False, indent=2)
     print(f"[OK] Perfil de colunas salvo em: {outpath}")
@@ -1,8 +1,22 @@
 from __future__ import annotations
 import argparse
+import hashlib
+import json
 import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
 import pandas as pd
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+# Cada bloco ({% block %}) do template depende apenas destes arquivos de métricas
+SECTIONS: Dict[str, List[str]] = {
+    "by_month": ["by_month.parquet"],
+    "by_role": ["by_role.parquet"],
+    "top_by_month": ["top_by_month.parquet"],
+}
+
+STATE_FILE = "render_state.json"
 
 
 def parse_args():
@@ -10,30 +24,143 @@ def parse_args():
     ap.add_argument("--metrics_dir", required=True, help="Diretório com parquet de métricas")
     ap.add_argument("--template", required=True, help="Template Markdown (.md)")
     ap.add_argument("--output", required=True, help="Arquivo HTML de saída")
+    ap.add_argument("--incremental", action="store_true", help="Re-renderiza apenas seções cujas métricas mudaram")
+    ap.add_argument("--cache_dir", default=None, help="Cache de template compilado e seções (padrão: <output_dir>/.render_cache)")
     return ap.parse_args()
 
 
-def main():
-    args = parse_args()
+@lru_cache(maxsize=None)
+def get_environment(template_dir: str, cache_dir: str) -> Environment:
+    # Ambiente único por processo; o bytecode compilado fica em disco entre execuções
+    os.makedirs(cache_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        auto_reload=True,
+    )
 
-    by_role = pd.read_parquet(os.path.join(args.metrics_dir, "by_role.parquet"))
-    by_month = pd.read_parquet(os.path.join(args.metrics_dir, "by_month.parquet"))
-    top_by_month = pd.read_parquet(os.path.join(args.metrics_dir, "top_by_month.parquet"))
 
-    with open(args.template, "r", encoding="utf-8") as f:
-        md_template = f.read()
+def _file_signature(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _template_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_state(cache_dir: str) -> Dict:
+    path = os.path.join(cache_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_state(cache_dir: str, state: Dict) -> None:
+    path = os.path.join(cache_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_records(metrics_dir: str, fname: str) -> list:
+    return pd.read_parquet(os.path.join(metrics_dir, fname)).to_dict(orient="records")
 
-    template = Template(md_template)
-    html = template.render(
-        by_role=by_role.to_dict(orient="records"),
-        by_month=by_month.to_dict(orient="records"),
-        top_by_month=top_by_month.to_dict(orient="records"),
-    )
 
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    with open(args.output, "w", encoding="utf-8") as f:
-        f.write(html)
+def _cached_block(text: str):
+    def render(context):
+        yield text
+    return render
 
+
+def _capturing_block(func, name: str, fragments: Dict[str, str]):
+    # Repassa a saída do bloco para o arquivo e guarda uma cópia para o cache de seções
+    def render(context):
+        buf = []
+        for chunk in func(context):
+            buf.append(chunk)
+            yield chunk
+        fragments[name] = "".join(buf)
+    return render
+
+
+def render_report(metrics_dir: str, template_path: str, output: str,
+                  incremental: bool = False, cache_dir: str | None = None) -> List[str]:
+    """Renderiza o relatório em streaming para `output`.
+
+    Com `incremental=True`, seções cujos Parquets de entrada (e o template) não mudaram
+    desde a última execução são reaproveitadas do cache em vez de re-renderizadas.
+    Retorna a lista de seções efetivamente renderizadas.
+    """
+    out_dir = os.path.dirname(output) or "."
+    cache_dir = cache_dir or os.path.join(out_dir, ".render_cache")
+    env = get_environment(os.path.dirname(os.path.abspath(template_path)), os.path.abspath(cache_dir))
+    template = env.get_template(os.path.basename(template_path))
+
+    tpl_hash = _template_hash(template_path)
+    state = _load_state(cache_dir) if incremental else {}
+    prev_sections = state.get("sections", {}) if state.get("template") == tpl_hash else {}
+
+    signatures: Dict[str, Dict[str, Optional[List[int]]]] = {}
+    stale: List[str] = []
+    cached: Dict[str, str] = {}
+    for name, files in SECTIONS.items():
+        signatures[name] = {f: _file_signature(os.path.join(metrics_dir, f)) for f in files}
+        fragment_path = os.path.join(cache_dir, f"{name}.html")
+        if incremental and prev_sections.get(name) == signatures[name] and os.path.exists(fragment_path):
+            with open(fragment_path, "r", encoding="utf-8") as f:
+                cached[name] = f.read()
+        else:
+            stale.append(name)
+
+    # Só lê os Parquets das seções que serão re-renderizadas
+    variables = {name: [] for name in SECTIONS}
+    for name in stale:
+        for fname in SECTIONS[name]:
+            variables[os.path.splitext(fname)[0]] = _read_records(metrics_dir, fname)
+
+    ctx = template.new_context(variables)
+    fragments: Dict[str, str] = {}
+    for name in SECTIONS:
+        if name not in ctx.blocks:
+            continue
+        if name in cached:
+            ctx.blocks[name] = [_cached_block(cached[name])]
+        elif incremental:
+            ctx.blocks[name] = [_capturing_block(ctx.blocks[name][0], name, fragments)]
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = output + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for chunk in template.root_render_func(ctx):
+            f.write(chunk)
+    os.replace(tmp, output)
+
+    if incremental:
+        for name, text in fragments.items():
+            with open(os.path.join(cache_dir, f"{name}.html"), "w", encoding="utf-8") as f:
+                f.write(text)
+        _save_state(cache_dir, {"template": tpl_hash, "sections": signatures})
+    return stale
+
+
+def main():
+    args = parse_args()
+    rendered = render_report(
+        args.metrics_dir, args.template, args.output,
+        incremental=args.incremental, cache_dir=args.cache_dir,
+    )
+    if args.incremental:
+        print(f"[INFO] Seções re-renderizadas: {', '.join(rendered) if rendered else 'nenhuma'}")
     print(f"[OK] Relatório gerado em: {args.output}")
 
 
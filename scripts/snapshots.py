@@ -0,0 +1,69 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+
+# Garantir que o diretório raiz (que contém 'src/') esteja no sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.config import load_settings
+from src.utils.snapshots import SNAPSHOT_ROOT, SnapshotStore, copy_metrics, materialize_unified, metrics_status
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Versões do dataset unificado e das métricas")
+    ap.add_argument("--root", default="", help="Repositório de versões (padrão: data.snapshots_dir do settings.yaml)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="Lista as versões (a publicada marcada com *)")
+    p = sub.add_parser("diff", help="Partições e métricas alteradas entre duas versões")
+    p.add_argument("old")
+    p.add_argument("new", nargs="?", default=None, help="Padrão: a versão publicada")
+    p = sub.add_parser("rollback", help="Publica novamente uma versão anterior (só troca o ponteiro)")
+    p.add_argument("version")
+    p.add_argument("--materialize", action="store_true",
+                   help="Também regrava o Parquet unificado e reports/output com a versão escolhida")
+    p.add_argument("--metrics_dir", default=os.path.join("reports", "output"))
+    p = sub.add_parser("gc", help="Remove versões antigas e objetos sem referência")
+    p.add_argument("--keep", type=int, default=10, help="Versões mais recentes mantidas")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    settings = load_settings()
+    store = SnapshotStore(args.root or settings.snapshots_dir or SNAPSHOT_ROOT)
+    try:
+        if args.cmd == "list":
+            current = store.current_version()
+            for v in store.versions():
+                m = store.manifest(v)
+                rows = sum(p["rows"] for p in m["unified"])
+                mark = "*" if v == current else " "
+                status = metrics_status(m)
+                stale = f" (de {status['metrics_dataset']}, defasadas)" if status["metrics_stale"] else ""
+                print(f"{mark} {v}  {m['created_at']}  {len(m['unified'])} partições  {rows} linhas  "
+                      f"{len(m['metrics'])} métricas{stale}  {json.dumps(m['meta'], ensure_ascii=False)}")
+        elif args.cmd == "diff":
+            print(json.dumps(store.diff(args.old, args.new), indent=2, ensure_ascii=False))
+        elif args.cmd == "rollback":
+            store.checkout(args.version)
+            print(f"[OK] Versão publicada: {args.version}")
+            if args.materialize:
+                rows = materialize_unified(store, settings.unified_parquet, args.version)
+                n = copy_metrics(store, args.metrics_dir, args.version)
+                print(f"[OK] {settings.unified_parquet} regravado ({rows} linhas); {n} arquivo(s) de métricas "
+                      f"restaurado(s) em {args.metrics_dir}")
+        elif args.cmd == "gc":
+            res = store.gc(keep=args.keep)
+            print(f"[OK] {res['manifests_removed']} versão(ões) e {res['objects_removed']} objeto(s) removidos "
+                  f"({res['bytes_freed'] / 1e6:.1f} MB)")
+    except KeyError as e:
+        print(f"[WARN] {e.args[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+# Mudanças no formato gerado invalidam diretórios de benchmark já preparados
+GENERATOR_VERSION = "1"
+
+# XLSX com milhões de linhas é impraticável de gerar/ler; o TJ em XLSX fica limitado a isto por mês
+XLSX_MAX_ROWS = 100_000
+
+FIRST_NAMES = ["Ana", "João", "Maria", "José", "Antônio", "Francisca", "Carlos", "Paulo", "Lúcia", "Márcia",
+               "Luiz", "Fernanda", "Rafael", "Juliana", "Sérgio", "Cláudia", "André", "Patrícia", "Rodrigo", "Vânia"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+              "Conceição", "Araújo", "Ribeiro", "Carvalho", "Simões", "Magalhães", "Assunção", "Brandão"]
+ROLES = [
+    ("Técnico Judiciário", "Servidor", 0.40, 9_000),
+    ("Analista Judiciário", "Servidor", 0.30, 15_000),
+    ("Oficial de Justiça", "Servidor", 0.10, 13_000),
+    ("Assessor de Juiz", "Comissionado", 0.08, 11_000),
+    ("Juiz de Direito", "Magistratura", 0.10, 35_000),
+    ("Desembargador", "Magistratura", 0.02, 41_000),
+]
+BONDS = ["Estatutário", "Comissionado", "Cedido", "Aposentado"]
+
+# Layout de cada TJ: formato e particularidades que a ingestão precisa tratar
+TJ_LAYOUTS = {
+    "TJRS": "csv_two_line",     # UTF-8, ';', cabeçalho em duas linhas (Rendimentos/Descontos)
+    "TJPI": "xlsx_multi_sheet",  # capa + aba de folha com linhas de título acima do cabeçalho
+    "TJTO": "csv_latin1",        # latin-1, ';', valores "R$ 1.234,56"
+}
+
+
+def brl(values: np.ndarray, prefix: str = "") -> List[str]:
+    """Formata valores como moeda PT-BR: 1234.5 -> "1.234,50"."""
+    swap = str.maketrans(",.", ".,")
+    return [prefix + f"{v:,.2f}".translate(swap) for v in values.tolist()]
+
+
+def synth_people(n: int, seed: int) -> Dict[str, np.ndarray]:
+    """Servidores com remuneração coerente (bruto = soma das rubricas; líquido = bruto - descontos)."""
+    rng = np.random.default_rng(seed)
+    first = rng.choice(FIRST_NAMES, n)
+    mid = rng.choice(LAST_NAMES, n)
+    last = rng.choice(LAST_NAMES, n)
+    names = np.char.add(np.char.add(np.char.add(np.char.add(first, " "), mid), " "), last)
+    # sufixo numérico evita homônimos em massa (ids derivados do nome)
+    names = np.char.add(np.char.add(names, " "), np.arange(n).astype(str))
+    role_idx = rng.choice(len(ROLES), n, p=[r[2] for r in ROLES])
+    roles = np.array([r[0] for r in ROLES])[role_idx]
+    careers = np.array([r[1] for r in ROLES])[role_idx]
+    base = np.array([r[3] for r in ROLES], dtype=float)[role_idx] * rng.lognormal(0.0, 0.15, n)
+    benefits = np.round(base * rng.uniform(0.0, 0.6, n), 2)
+    # cauda longa: pagamentos retroativos/indenizações eventuais
+    extra = np.where(rng.random(n) < 0.02, np.round(rng.pareto(1.5, n) * 10_000, 2), 0.0)
+    base = np.round(base, 2)
+    gross = np.round(base + benefits + extra, 2)
+    deductions = np.round(gross * rng.uniform(0.11, 0.30, n), 2)
+    return {
+        "name": names, "role": roles, "career": careers, "bond": rng.choice(BONDS, n),
+        "matricula": rng.integers(10_000, 9_999_999, n), "base": base, "benefits": benefits, "extra": extra,
+        "gross": gross, "deductions": deductions, "net": np.round(gross - deductions, 2),
+    }
+
+
+def write_csv_two_line(path: str, p: Dict[str, np.ndarray]) -> None:
+    row1 = ["Nome", "Cargo", "Vínculo", "Rendimentos", "", "", "Descontos", "", "Líquido"]
+    row2 = ["", "", "", "Subsídio", "Vantagens e Indenizações", "Total de Créditos", "Previdência", "Total de Descontos", ""]
+    cols = [p["name"], p["role"], p["bond"], brl(p["base"]), brl(p["benefits"] + p["extra"]), brl(p["gross"]),
+            brl(p["deductions"] * 0.7), brl(p["deductions"]), brl(p["net"])]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(row1)
+        w.writerow(row2)
+        w.writerows(zip(*cols))
+
+
+def write_csv_latin1(path: str, p: Dict[str, np.ndarray]) -> None:
+    header = ["Matrícula", "Nome do Servidor", "Cargo", "Carreira", "Vínculo", "Vencimento Básico", "Benefícios",
+              "Remuneração Bruta", "Total de Descontos", "Remuneração Líquida"]
+    cols = [p["matricula"], p["name"], p["role"], p["career"], p["bond"], brl(p["base"], "R$ "),
+            brl(p["benefits"] + p["extra"], "R$ "), brl(p["gross"], "R$ "), brl(p["deductions"], "R$ "),
+            brl(p["net"], "R$ ")]
+    with open(path, "w", encoding="latin-1", errors="replace", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(header)
+        w.writerows(zip(*cols))
+
+
+def write_xlsx_multi_sheet(path: str, p: Dict[str, np.ndarray], year_month: str) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    capa = wb.create_sheet("Capa")
+    capa.append(["Tribunal de Justiça - Portal da Transparência"])
+    capa.append([f"Folha de pagamento {year_month}"])
+    folha = wb.create_sheet("Folha")
+    folha.append(["ANEXO VIII - Remuneração de magistrados e servidores"])
+    folha.append([f"Referência: {year_month}"])
+    folha.append([])
+    folha.append(["Nome", "Cargo", "Lotação", "Vínculo", "Remuneração Básica", "Benefícios",
+                  "Total de Créditos", "Descontos", "Líquido"])
+    # metade das colunas monetárias como número, metade como texto PT-BR (como nos portais)
+    for row in zip(p["name"].tolist(), p["role"].tolist(), p["career"].tolist(), p["bond"].tolist(),
+                   p["base"].tolist(), brl(p["benefits"] + p["extra"]), p["gross"].tolist(),
+                   brl(p["deductions"]), p["net"].tolist()):
+        folha.append(list(row))
+    wb.save(path)
+
+
+def generate(raw_root: str, rows_per_month: int, months: List[str], seed: int = 42) -> Dict[str, Dict[str, int]]:
+    """Gera data/raw/<TJ>/<YYYY-MM>/ sintético para os layouts de `TJ_LAYOUTS`.
+
+    `rows_per_month` é dividido entre os TJs; o TJ em XLSX é limitado a `XLSX_MAX_ROWS`.
+    Devolve as linhas geradas por TJ e mês.
+    """
+    per_tj = max(1, rows_per_month // len(TJ_LAYOUTS))
+    counts: Dict[str, Dict[str, int]] = {}
+    for t, (tj, layout) in enumerate(TJ_LAYOUTS.items()):
+        for m, ym in enumerate(months):
+            n = min(per_tj, XLSX_MAX_ROWS) if layout == "xlsx_multi_sheet" else per_tj
+            people = synth_people(n, seed + 1000 * t + m)
+            month_dir = os.path.join(raw_root, tj, ym)
+            os.makedirs(month_dir, exist_ok=True)
+            if layout == "csv_two_line":
+                write_csv_two_line(os.path.join(month_dir, f"folha_{ym}.csv"), people)
+            elif layout == "csv_latin1":
+                write_csv_latin1(os.path.join(month_dir, f"remuneracao_{ym}.csv"), people)
+            else:
+                write_xlsx_multi_sheet(os.path.join(month_dir, f"anexo_viii_{ym}.xlsx"), people, ym)
+            counts.setdefault(tj, {})[ym] = n
+    return counts
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Gera folhas de pagamento sintéticas no layout de data/raw")
+    ap.add_argument("--raw_root", default=os.path.join("data", "bench", "raw"), help="Raiz de saída")
+    ap.add_argument("--rows", type=int, default=30_000, help="Linhas por mês (somando os TJs)")
+    ap.add_argument("--months", default="2024-01,2024-02", help="Meses YYYY-MM separados por vírgula")
+    ap.add_argument("--seed", type=int, default=42)
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    months = [m.strip() for m in args.months.split(",") if m.strip()]
+    counts = generate(args.raw_root, args.rows, months, seed=args.seed)
+    print(json.dumps(counts, indent=2))
+    print(f"[OK] Dados sintéticos gerados em: {args.raw_root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,45 @@
 from __future__ import annotations
+import json
 import os
-from typing import List, Optional
+import re
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 import pandas as pd
 
 from src.config import load_settings
-from src.pipeline import run_pipeline, EXTRACTOR_REGISTRY
+from src.pipeline import EXTRACTOR_REGISTRY, publish_snapshot, run_pipeline, run_pipeline_arrow, write_unified
+from src.utils.instrumentation import PROFILE_MODES, RunReport, run_report_path, stage, use_report
+from src.utils.sql_engine import DEFAULT_ROW_LIMIT, DEFAULT_TIMEOUT, QueryError, QueryTimeout, get_engine
 
 app = FastAPI(title="API Remuneração TJs", version="0.1.0")
 
+REPORT_NAMES = ("pipeline", "metrics", "metrics_api", "backfill")
+
+
+def _check_profile(profile: Optional[str]) -> None:
+    if profile and profile not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"profile deve ser um de: {', '.join(PROFILE_MODES)}")
+
 
 class ExtractRequest(BaseModel):
     tjs: Optional[List[str]] = None  # ex.: ["TJRS", "TJPI", "TJTO"]
     start: Optional[str] = None      # YYYY-MM
     end: Optional[str] = None        # YYYY-MM
+    profile: Optional[str] = None    # "cprofile" ou "sample"
+    engine: str = "pandas"           # "pandas" ou "arrow" (ver --engine em src.main)
+    identity: bool = True            # unifica variações de grafia do nome (ver identity em settings.yaml)
+    canonical: bool = True           # cargo/carreira/vínculo na taxonomia harmonizada (ver canonical)
+    rubrics: bool = True             # grava as rubricas individuais (data.rubrics_dir; só engine pandas)
+
+
+class QueryRequest(BaseModel):
+    sql: str                                  # um SELECT sobre a tabela `remuneracao`
+    params: Optional[Dict[str, Any]] = None   # valores para `$nome` na consulta
+    limit: int = DEFAULT_ROW_LIMIT
+    timeout: float = DEFAULT_TIMEOUT          # segundos
+    version: Optional[str] = None             # versão fixada (ver GET /versions); padrão: a publicada
 
 
 @app.get("/health")
@@ -39,48 +63,317 @@ def extract(req: ExtractRequest):
     else:
         tjs = sorted(list(EXTRACTOR_REGISTRY.keys()))
 
-    df = run_pipeline(tjs, start, end, user_agent=settings.user_agent, timeout=settings.timeout)
+    _check_profile(req.profile)
+    if req.engine not in ("pandas", "arrow"):
+        raise HTTPException(status_code=400, detail="engine deve ser 'pandas' ou 'arrow'")
+    report = RunReport("pipeline", profile=req.profile, tjs=tjs, start=start, end=end, engine=req.engine,
+                       source="api")
+    options = dict(identity_map=settings.identity_map if req.identity else None,
+                    identity_threshold=settings.identity_threshold,
+                    label_dictionary=settings.label_dictionary if req.canonical else None,
+                    taxonomy=settings.taxonomy)
+    try:
+        with use_report(report):
+            if req.engine == "arrow":
+                rows = run_pipeline_arrow(tjs, start, end, settings.unified_parquet, user_agent=settings.user_agent,
+                                          timeout=settings.timeout, raw_root=settings.raw_dir, **options)
+            else:
+                df = run_pipeline(tjs, start, end, user_agent=settings.user_agent, timeout=settings.timeout,
+                                  raw_root=settings.raw_dir,
+                                  rubrics_dir=settings.rubrics_dir if req.rubrics else None, **options)
 
-    os.makedirs(os.path.dirname(settings.unified_parquet), exist_ok=True)
-    df.to_parquet(settings.unified_parquet, index=False)
+                with stage("write_parquet") as st:
+                    write_unified(df, settings.unified_parquet)
+                    st.rows_in = st.rows_out = len(df)
+                rows = int(df.shape[0])
+            snap = publish_snapshot(settings.snapshots_dir, settings.unified_parquet, tjs=tjs, start=start, end=end,
+                                    engine=req.engine, source="api")
+    finally:
+        report_path = report.save(per_run=True)
 
     return {
         "message": "dataset unificado gerado",
-        "rows": int(df.shape[0]),
+        "rows": rows,
         "tjs": tjs,
         "period": {"start": start, "end": end},
         "output": settings.unified_parquet,
+        "version": snap["version"] if snap else None,
+        "metrics_stale": snap["metrics_stale"] if snap else None,
+        "run_id": report.run_id,
+        "run_report": report_path,
+        "file_errors": report.to_dict()["file_errors"],
+        "quality_issues": report.to_dict()["quality_issues"],
+        "profile_files": report.profile_files,
     }
 
 
-@app.get("/unified")
-def unified_info():
+@app.get("/plan")
+def plan(tjs: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, order: str = "recent"):
+    """Plano do backfill (unidades TJ/mês, custo estimado e situação) sem executar nada."""
+    from src.pipeline import month_range
+    from src.utils.planner import ORDERS, Staging, TimingModel, estimate_makespan, plan_units
+
+    if order not in ORDERS:
+        raise HTTPException(status_code=400, detail=f"order deve ser um de: {', '.join(ORDERS)}")
+    settings = load_settings()
+    tj_codes = [t.strip().upper() for t in tjs.split(",") if t.strip()] if tjs else sorted(EXTRACTOR_REGISTRY)
+    units = plan_units(tj_codes, month_range(start or settings.start, end or settings.end), EXTRACTOR_REGISTRY,
+                       raw_root=settings.raw_dir, timings=TimingModel(settings.timings_path),
+                       staging=Staging(settings.staging_dir), order=order)
+    pending = [u for u in units if u.status == "pending"]
+    return {
+        "units": [{"tj_code": u.tj_code, "year_month": u.year_month, "priority": u.priority, "status": u.status,
+                   "files": len(u.files), "bytes": u.bytes, "est_seconds": u.est_seconds, "url": u.url}
+                  for u in units],
+        "pending": len(pending),
+        "est_seconds": round(sum(u.est_seconds for u in pending), 3),
+        "est_wall_seconds": round(estimate_makespan(units, settings.backfill_workers, settings.backfill_per_tj), 3),
+    }
+
+
+@app.get("/run-report")
+def run_report(name: str = "pipeline", run_id: Optional[str] = None):
+    """Último relatório de execução salvo (`pipeline`, `metrics`, `metrics_api` ou `backfill`),
+    ou o de uma execução da API (`run_id` devolvido por /extract e /metrics?profile=)."""
+    if name not in REPORT_NAMES:
+        raise HTTPException(status_code=400, detail=f"name deve ser um de: {', '.join(REPORT_NAMES)}")
+    if run_id is not None and not re.fullmatch(r"\d{8}T\d{6}-[0-9a-f]{8}", run_id):
+        raise HTTPException(status_code=400, detail="run_id inválido")
+    path = run_report_path(name, run_id=run_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Relatório de execução não encontrado. Execute o pipeline primeiro.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _snapshots():
     settings = load_settings()
-    path = settings.unified_parquet
+    if not settings.snapshots_dir:
+        return None
+    from src.utils.snapshots import SnapshotStore
+
+    return SnapshotStore(settings.snapshots_dir)
+
+
+def _unified_files(version: Optional[str] = None) -> tuple[list[str], Optional[str]]:
+    """Arquivos do dataset unificado e a versão lida: a fixada, a publicada ou o Parquet único."""
+    store = _snapshots()
+    if store is not None and (version or store.current_version()):
+        try:
+            manifest = store.manifest(version)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        return [store.object_path(p["object"]) for p in manifest["unified"]], manifest["version"]
+    if version:
+        raise HTTPException(status_code=404, detail="Versões desativadas (data.snapshots_dir em settings.yaml)")
+    path = load_settings().unified_parquet
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Dataset unificado não encontrado. Execute /extract primeiro.")
+    return [path], None
+
+
+def _read_unified(version: Optional[str] = None) -> tuple[pd.DataFrame, Optional[str]]:
+    files, resolved = _unified_files(version)
+    if resolved is None:
+        return pd.read_parquet(files[0]), None
+    return _snapshots().read_unified(resolved), resolved
+
+
+@app.get("/versions")
+def versions():
+    """Versões do dataset unificado e das métricas (mais recente por último)."""
+    from src.utils.snapshots import metrics_status
+
+    store = _snapshots()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Versões desativadas (data.snapshots_dir em settings.yaml)")
+    out = []
+    for v in store.versions():
+        m = store.manifest(v)
+        out.append({"version": v, "parent": m["parent"], "created_at": m["created_at"], "meta": m["meta"],
+                    "partitions": len(m["unified"]), "rows": sum(p["rows"] for p in m["unified"]),
+                    "metrics": len(m["metrics"]), **metrics_status(m)})
+    return {"current": store.current_version(), "versions": out}
+
+
+@app.get("/versions/diff")
+def versions_diff(old: str, new: Optional[str] = None):
+    """Partições e métricas que mudaram de `old` para `new` (padrão: a versão publicada)."""
+    store = _snapshots()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Versões desativadas (data.snapshots_dir em settings.yaml)")
+    try:
+        return store.diff(old, new)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
+@app.get("/unified")
+def unified_info(version: Optional[str] = None):
     try:
-        df = pd.read_parquet(path)
+        df, resolved = _read_unified(version)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao ler parquet: {e}")
 
     # retorno resumido
     sample = df.head(20).to_dict(orient="records")
     return {
-        "path": path,
+        "path": load_settings().unified_parquet if resolved is None else None,
+        "version": resolved,
         "rows": int(df.shape[0]),
         "cols": list(df.columns),
         "sample": sample,
     }
 
 
-@app.get("/metrics")
-def metrics():
-    settings = load_settings()
-    path = settings.unified_parquet
+@app.post("/query")
+def query(req: QueryRequest):
+    """SQL somente leitura sobre o dataset unificado (DuckDB em processo, tabela `remuneracao`)."""
+    files, resolved = _unified_files(req.version)
+    try:
+        out = get_engine(files).query(req.sql, req.params, limit=req.limit, timeout=req.timeout)
+        return {**out, "version": resolved}
+    except ImportError:
+        raise HTTPException(status_code=503, detail="duckdb não instalado (pip install duckdb)")
+    except QueryTimeout as e:
+        raise HTTPException(status_code=408, detail=str(e))
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _metrics_file(name: str, version: Optional[str] = None) -> tuple[str, dict]:
+    """Arquivo de métricas da versão fixada ou publicada (ou de reports/output) e a versão lida.
+
+    Com versões, informa também de qual dataset as métricas vieram e se estão defasadas
+    (`metrics_stale`: o pipeline publicou um dataset novo depois do último compute_metrics).
+    """
+    from src.utils.snapshots import metrics_status
+
+    store = _snapshots()
+    path, info = os.path.join("reports", "output", name), {"version": None}
+    if store is not None and (version or store.current_version()):
+        try:
+            manifest = store.manifest(version)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        info = {"version": manifest["version"], **metrics_status(manifest)}
+        path = store.metrics_file(name, manifest["version"]) or path
+    elif version:
+        raise HTTPException(status_code=404, detail="Versões desativadas (data.snapshots_dir em settings.yaml)")
     if not os.path.exists(path):
-        raise HTTPException(status_code=404, detail="Dataset unificado não encontrado. Execute /extract primeiro.")
-    df = pd.read_parquet(path)
+        raise HTTPException(status_code=404, detail=f"{name} não encontrado. Execute scripts/compute_metrics.py primeiro.")
+    return path, info
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    """Linhas para JSON, com NaN (ex.: cargo ausente) como null."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _check_measure(measure: str) -> None:
+    from src.utils.topk import TOPK_MEASURES
+
+    if measure not in TOPK_MEASURES:
+        raise HTTPException(status_code=400, detail=f"measure deve ser um de: {', '.join(TOPK_MEASURES)}")
+
+
+@app.get("/topk")
+def topk(tj: Optional[str] = None, year_month: Optional[str] = None, role: Optional[str] = None,
+         measure: str = "gross_pay", k: int = 10, version: Optional[str] = None):
+    """Maiores valores de `measure` por (TJ, mês, cargo), do top-K pré-calculado por compute_metrics."""
+    from src.utils.topk import TOPK_FILE, query_topk, read_topk_meta
+
+    _check_measure(measure)
+    path, info = _metrics_file(TOPK_FILE, version)
+    limit = int((read_topk_meta(path) or {}).get("limit", 0))
+    if not 1 <= k <= limit:
+        raise HTTPException(status_code=400, detail=f"k deve estar entre 1 e {limit}")
+    df = query_topk(path, k, measure, tj, year_month, role)
+    return {**info, "limit": limit, "rows": _records(df)}
+
+
+@app.get("/percentile")
+def percentile(value: List[float] = Query(...), tj: Optional[str] = None, year_month: Optional[str] = None,
+               role: Optional[str] = None, measure: str = "gross_pay", version: Optional[str] = None):
+    """Percentual da coorte (TJ, mês, cargo; filtros omitidos = todos) com `measure` <= cada `value`."""
+    from src.utils.ecdf import ECDF_FILE, load_index
+
+    _check_measure(measure)
+    path, info = _metrics_file(ECDF_FILE, version)
+    ecdf = load_index(path).cohort(measure, tj, year_month, role)
+    if ecdf.n == 0:
+        raise HTTPException(status_code=404, detail="Coorte sem registros")
+    return {**info, "n": ecdf.n, "exact": ecdf.exact,
+            "results": [{"value": v, "percentile": float(p)} for v, p in zip(value, ecdf.percentile(value))]}
+
+
+@app.get("/percentile/compare")
+def percentile_compare(value: List[float] = Query(...), by: str = "tj_code", cohorts: Optional[str] = None,
+                       tj: Optional[str] = None, year_month: Optional[str] = None, role: Optional[str] = None,
+                       measure: str = "gross_pay", version: Optional[str] = None):
+    """Percentil de cada `value` e quantis em cada coorte de `by` (ex.: o mesmo cargo em cada TJ)."""
+    from src.utils.ecdf import ECDF_FILE, load_index
+    from src.utils.topk import GROUP_COLUMNS
+
+    _check_measure(measure)
+    if by not in GROUP_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"by deve ser um de: {', '.join(GROUP_COLUMNS)}")
+    path, info = _metrics_file(ECDF_FILE, version)
+    only = [c.strip() for c in cohorts.split(",") if c.strip()] if cohorts else None
+    df = load_index(path).compare(value, by, measure, tj, year_month, role, cohorts=only)
+    return {**info, "by": by, "cohorts": _records(df)}
+
+
+def _rubric_store():
+    settings = load_settings()
+    if not settings.rubrics_dir or not os.path.isdir(settings.rubrics_dir):
+        raise HTTPException(status_code=404, detail="Rubricas não encontradas (data.rubrics_dir em settings.yaml; "
+                                                    "execute /extract com o motor pandas)")
+    from src.utils.canonical import load_taxonomy
+    from src.utils.rubrics import RubricStore
+
+    return RubricStore(settings.rubrics_dir, taxonomy=load_taxonomy(settings.taxonomy))
+
+
+@app.get("/rubrics")
+def rubrics(tj: Optional[str] = None, year_month: Optional[str] = None):
+    """Rubricas individuais (tabela de fatos): servidores, valor total e médio e o total em que se consolidam."""
+    df = _rubric_store().summary(tj, year_month)
+    return {"rubrics": df.to_dict(orient="records")}
+
+
+@app.get("/rubrics/server")
+def rubrics_server(server_id: str, tj: Optional[str] = None, year_month: Optional[str] = None):
+    """Rubricas de um servidor por mês e a consolidação delas nos cinco totais."""
+    store = _rubric_store()
+    facts = store.read(tj, year_month, server_id=server_id)
+    if facts.empty:
+        raise HTTPException(status_code=404, detail="Servidor sem rubricas no período")
+    labeled = store.decode(facts)
+    items = labeled.astype({"label": object, "total": object}).drop(columns=["rubric"])
+    return {"rubrics": items.to_dict(orient="records"), "rollup": store.rollup(facts).to_dict(orient="records")}
+
+
+@app.get("/metrics")
+def metrics(profile: Optional[str] = None, version: Optional[str] = None):
+    """Métricas agregadas (da versão publicada ou de `?version=`); com `?profile=cprofile|sample`,
+    salva relatório e perfis (`metrics_api`)."""
+    if not profile:
+        return _metrics(version)
+    _check_profile(profile)
+    report = RunReport("metrics_api", profile=profile, source="api")
+    try:
+        with use_report(report), stage("metrics"):
+            out = _metrics(version)
+    finally:
+        report_path = report.save(per_run=True)
+    return {**out, "run_id": report.run_id, "run_report": report_path, "profile_files": report.profile_files}
+
+
+def _metrics(version: Optional[str] = None):
+    df, resolved = _read_unified(version)
 
     by_role = df.groupby(["year_month", "role"], dropna=False).agg(
         servidores=("server_id", "nunique"),
@@ -102,6 +395,7 @@ def metrics():
     top_by_month = df.loc[idx, ["year_month", "tj_code", "server_name", "role", "gross_pay"]]
 
     return {
+        "version": resolved,
         "by_role": by_role.to_dict(orient="records"),
         "by_month": by_month.to_dict(orient="records"),
         "top_by_month": top_by_month.to_dict(orient="records"),
@@ -16,6 +16,22 @@ class Settings:
     user_agent: str
     retries: int
     backoff_factor: float
+    rate_per_host: float = 2.0
+    burst: float = 4.0
+    max_workers: int = 8
+    max_per_tj: int = 2
+    http_cache_dir: str = "data/cache/http"
+    snapshots_dir: str = ""
+    rubrics_dir: str = ""
+    identity_map: str = ""
+    identity_threshold: float = 0.8
+    taxonomy: str = "config/taxonomy.yaml"
+    label_dictionary: str = ""
+    staging_dir: str = "data/processed/units"
+    timings_path: str = "reports/output/timings.json"
+    backfill_workers: int = 4
+    backfill_per_tj: int = 2
+    backfill_retries: int = 2
 
 
 def load_settings(path: str = os.path.join("config", "settings.yaml")) -> Settings:
@@ -24,6 +40,10 @@ def load_settings(path: str = os.path.join("config", "settings.yaml")) -> Settin
     data = y["data"]
     period = y["period"]
     defaults = y.get("defaults", {})
+    fetch = y.get("fetch", {}) or {}
+    identity = y.get("identity", {}) or {}
+    canonical = y.get("canonical", {}) or {}
+    backfill = y.get("backfill", {}) or {}
     return Settings(
         raw_dir=data["raw_dir"],
         processed_dir=data["processed_dir"],
@@ -34,4 +54,20 @@ def load_settings(path: str = os.path.join("config", "settings.yaml")) -> Settin
         user_agent=str(defaults.get("user_agent", "Mozilla/5.0")),
         retries=int(defaults.get("retries", 3)),
         backoff_factor=float(defaults.get("backoff_factor", 0.5)),
+        rate_per_host=float(fetch.get("rate_per_host", 2.0)),
+        burst=float(fetch.get("burst", 4.0)),
+        max_workers=int(fetch.get("max_workers", 8)),
+        max_per_tj=int(fetch.get("max_per_tj", 2)),
+        http_cache_dir=str(fetch.get("cache_dir") or ""),
+        snapshots_dir=str(data.get("snapshots_dir") or ""),
+        rubrics_dir=str(data.get("rubrics_dir") or ""),
+        identity_map=str(identity.get("map_path") or ""),
+        identity_threshold=float(identity.get("threshold", 0.8)),
+        taxonomy=str(canonical.get("taxonomy") or os.path.join("config", "taxonomy.yaml")),
+        label_dictionary=str(canonical.get("dictionary") or ""),
+        staging_dir=str(backfill.get("staging_dir") or os.path.join("data", "processed", "units")),
+        timings_path=str(backfill.get("timings") or os.path.join("reports", "output", "timings.json")),
+        backfill_workers=int(backfill.get("max_workers", 4)),
+        backfill_per_tj=int(backfill.get("max_per_tj", 2)),
+        backfill_retries=int(backfill.get("retries", 2)),
     )
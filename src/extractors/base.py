@@ -1,13 +1,18 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import Iterable, Optional, Tuple
 import pandas as pd
 
 from src.schemas import UNIFIED_COLUMNS
+from src.utils.validation import validate_unified
 
 
 class BaseExtractor(ABC):
     tj_code: str
+    # ids derivados só do nome: passam pela resolução de identidade (`src.utils.identity`)
+    name_based_ids: bool = True
+    # caches de leitura (arquivos compactados e brutos já parseados); o benchmark desliga
+    read_cache: bool = True
 
     @abstractmethod
     def fetch_month(self, year_month: str) -> pd.DataFrame:
@@ -17,11 +22,42 @@ class BaseExtractor(ABC):
         """
         raise NotImplementedError
 
+    def month_url(self, year_month: str) -> Optional[str]:
+        """URL do arquivo de remuneração do mês, quando houver download automático."""
+        return None
+
+    def fetch_month_arrow(self, year_month: str):
+        """Mês como tabela Arrow já validada (pipeline `--engine arrow`).
+
+        Padrão: converte `fetch_month`; extratores podem ler direto para Arrow.
+        """
+        from src.utils.arrow_ingest import frame_to_arrow
+
+        return frame_to_arrow(self.validate_columns(self.fetch_month(year_month)))
+
     def validate_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        missing = [c for c in UNIFIED_COLUMNS if c not in df.columns]
-        if missing:
-            raise ValueError(f"Colunas faltando no extrator {self.tj_code}: {missing}")
-        return df[UNIFIED_COLUMNS].copy()
+        """Esquema, tipos e anomalias por mês (ver `src.utils.validation.validate_unified`)."""
+        return validate_unified(df, source=self.tj_code)
+
+    def fetch_month_rubrics(self, year_month: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Mês no esquema unificado + rubricas individuais em formato longo (`src.utils.rubrics`).
+
+        Padrão: extratores sem rubricas devolvem os fatos vazios.
+        """
+        from src.utils.rubrics import empty_facts
+
+        return self.fetch_month(year_month), empty_facts()
+
+    def fetch_many_rubrics(self, months: Iterable[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        from src.utils.rubrics import concat_facts
+
+        frames, facts = [], []
+        for ym in months:
+            mdf, mfacts = self.fetch_month_rubrics(ym)
+            frames.append(self.validate_columns(mdf))
+            facts.append(mfacts)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=UNIFIED_COLUMNS)
+        return df, concat_facts(facts)
 
     def fetch_many(self, months: Iterable[str]) -> pd.DataFrame:
         frames = []
@@ -0,0 +1,182 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.extractors.base import BaseExtractor
+from src.schemas import Columns, UNIFIED_COLUMNS
+from src.utils.dedup import DEDUP_RULES, DEFAULT_DEDUP_RULE, SOURCE_RANK_COLUMN, dedupe
+from src.utils.ingest_local import ARCHIVE_CACHE_DIR, MATRICULA_COLUMN, PARSE_CACHE_DIR, load_month_data
+from src.utils.instrumentation import profile_scope, stage, warn
+from src.utils.parsing import make_server_ids
+from src.utils.rubrics import split_rubrics
+
+SOURCE_FORMATS = ("auto", "csv", "xlsx", "json", "html")
+HEADER_STRATEGIES = ("auto", "two_line", "single")
+ID_STRATEGIES = ("name", "name_matricula", "matricula")
+
+
+def parse_column_overrides(text: str) -> Dict[str, List[str]]:
+    """Converte "gross_pay=total de créditos|bruto;net_pay=líquido" em {campo: [colunas]}."""
+    out: Dict[str, List[str]] = {}
+    for part in (text or "").split(";"):
+        if "=" not in part:
+            continue
+        key, _, names = part.partition("=")
+        key = key.strip()
+        if key not in UNIFIED_COLUMNS and key != MATRICULA_COLUMN:
+            raise ValueError(f"Campo desconhecido em column_overrides: {key}")
+        out[key] = [n.strip() for n in names.split("|") if n.strip()]
+    return out
+
+
+@dataclass
+class ExtractorSpec:
+    """Configuração de ingestão de um TJ, lida de `config/tj_catalog.csv`."""
+    tj_code: str
+    source_format: str = "auto"        # restringe as extensões lidas na pasta do mês
+    header_strategy: str = "auto"      # "auto" | "two_line" | "single" (CSV)
+    id_strategy: str = "name"          # "name" | "name_matricula" | "matricula"
+    column_overrides: Dict[str, List[str]] = field(default_factory=dict)
+    url_template: str = ""             # ex.: https://.../folha_{year}_{month}.csv (download automático)
+    dedup_rule: str = DEFAULT_DEDUP_RULE  # servidor em mais de um arquivo do mês: "sum" | "latest" | "flag" | "none"
+
+    @classmethod
+    def from_catalog_row(cls, row: Dict[str, str]) -> "ExtractorSpec":
+        spec = cls(
+            tj_code=row["tj_code"],
+            source_format=(row.get("source_format") or "auto").lower(),
+            header_strategy=(row.get("header_strategy") or "auto").lower(),
+            id_strategy=(row.get("id_strategy") or "name").lower(),
+            column_overrides=parse_column_overrides(row.get("column_overrides", "")),
+            url_template=row.get("url_template", ""),
+            dedup_rule=(row.get("dedup_rule") or DEFAULT_DEDUP_RULE).lower(),
+        )
+        for value, allowed, name in (
+            (spec.source_format, SOURCE_FORMATS, "source_format"),
+            (spec.header_strategy, HEADER_STRATEGIES, "header_strategy"),
+            (spec.id_strategy, ID_STRATEGIES, "id_strategy"),
+            (spec.dedup_rule, DEDUP_RULES, "dedup_rule"),
+        ):
+            if value not in allowed:
+                raise ValueError(f"{name} inválido para {spec.tj_code}: {value} (use {', '.join(allowed)})")
+        return spec
+
+
+class GenericExtractor(BaseExtractor):
+    """Extrator único para arquivos locais em data/raw/<TJ>/<YYYY-MM>/.
+
+    O comportamento por TJ vem de `spec`; o registro cria uma subclasse por TJ do catálogo.
+    """
+    tj_code: str = ""
+    spec: Optional[ExtractorSpec] = None
+
+    def __init__(self, user_agent: str = "Mozilla/5.0", timeout: int = 60, raw_root: str = "data/raw",
+                 spec: ExtractorSpec | None = None):
+        self.raw_root = raw_root
+        if spec is not None:
+            self.spec = spec
+            self.tj_code = spec.tj_code
+        if self.spec is None:
+            self.spec = ExtractorSpec(tj_code=self.tj_code)
+
+    @property
+    def name_based_ids(self) -> bool:
+        return self.spec.id_strategy == "name"
+
+    def month_url(self, year_month: str) -> Optional[str]:
+        if not self.spec.url_template:
+            return None
+        year, month = year_month.split("-")
+        return self.spec.url_template.format(year=year, month=month, year_month=year_month)
+
+    def _cache_dirs(self) -> Dict[str, Optional[str]]:
+        if self.read_cache:
+            return {"archive_cache_dir": ARCHIVE_CACHE_DIR, "parse_cache_dir": PARSE_CACHE_DIR}
+        return {"archive_cache_dir": None, "parse_cache_dir": None}
+
+    def fetch_month(self, year_month: str) -> pd.DataFrame:
+        return self._load_month(year_month)
+
+    def fetch_month_rubrics(self, year_month: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        # rubricas atravessam id e deduplicação como colunas e só então viram fatos longos
+        return split_rubrics(self._load_month(year_month, with_rubrics=True))
+
+    def _load_month(self, year_month: str, with_rubrics: bool = False) -> pd.DataFrame:
+        spec = self.spec
+        needs_matricula = spec.id_strategy != "name"
+        df = load_month_data(
+            self.tj_code, year_month, raw_root=self.raw_root,
+            column_overrides=spec.column_overrides,
+            header_strategy=spec.header_strategy,
+            source_format=spec.source_format,
+            with_matricula=needs_matricula,
+            with_source_rank=spec.dedup_rule != "none",
+            with_rubrics=with_rubrics,
+            **self._cache_dirs(),
+        )
+        if df.empty:
+            return pd.DataFrame(columns=UNIFIED_COLUMNS)
+        with profile_scope("hash"):
+            df[Columns.server_id] = self.derive_server_ids(df)
+        df = self.dedupe_month(df, year_month)
+        df = df.drop(columns=[c for c in (MATRICULA_COLUMN, SOURCE_RANK_COLUMN) if c in df.columns])
+        return df
+
+    def fetch_month_arrow(self, year_month: str):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from src.utils.arrow_ingest import frame_to_arrow, load_month_arrow
+        from src.utils.validation import validate_arrow
+
+        spec = self.spec
+        table = load_month_arrow(
+            self.tj_code, year_month, raw_root=self.raw_root,
+            column_overrides=spec.column_overrides,
+            header_strategy=spec.header_strategy,
+            source_format=spec.source_format,
+            with_matricula=spec.id_strategy != "name",
+            with_source_rank=spec.dedup_rule != "none",
+            **self._cache_dirs(),
+        )
+        if table.num_rows == 0:
+            return table
+        with profile_scope("hash"):
+            # só as colunas usadas no id passam pelo pandas
+            id_cols = [c for c in (Columns.server_name, MATRICULA_COLUMN) if c in table.column_names]
+            ids = self.derive_server_ids(table.select(id_cols).to_pandas())
+            table = table.set_column(table.schema.get_field_index(Columns.server_id), Columns.server_id,
+                                     pa.array(ids, pa.string()))
+        if spec.dedup_rule != "none" and pc.count_distinct(table.column(SOURCE_RANK_COLUMN)).as_py() > 1:
+            # mais de um arquivo no mês (raro): conciliados pelo mesmo `dedupe` do caminho pandas
+            table = frame_to_arrow(self.dedupe_month(table.to_pandas(), year_month))
+        return validate_arrow(table.select(UNIFIED_COLUMNS), source=self.tj_code)
+
+    def dedupe_month(self, df: pd.DataFrame, year_month: str) -> pd.DataFrame:
+        """Arquivos sobrepostos no mês (folha base + suplementares): uma linha por servidor."""
+        with stage("dedup", tj_code=self.tj_code, year_month=year_month) as st:
+            res = dedupe(df, self.spec.dedup_rule)
+            st.rows_in, st.rows_out = res.rows_in, len(res.df)
+        if res.conflict_ids:
+            sample = ", ".join(res.conflict_ids[:5])
+            msg = (f"{self.tj_code} {year_month}: {len(res.conflict_ids)} servidor(es) com valores divergentes "
+                   f"entre arquivos (mantido o mais recente), ex.: {sample}")
+            print(f"[WARN] {msg}")
+            warn(msg)
+        return res.df
+
+    def derive_server_ids(self, df: pd.DataFrame) -> pd.Series:
+        names = df[Columns.server_name]
+        if self.spec.id_strategy == "name" or MATRICULA_COLUMN not in df.columns:
+            return make_server_ids(self.tj_code, names)
+        mats = df[MATRICULA_COLUMN]
+        if self.spec.id_strategy == "name_matricula":
+            return make_server_ids(self.tj_code, names, mats)
+        # "matricula": usa a matrícula como id; hash do nome quando ausente
+        mat_str = mats.astype(object).where(mats.notna(), "").map(str).str.strip()
+        ids = self.tj_code + ":" + mat_str
+        missing = mat_str == ""
+        if missing.any():
+            ids = ids.where(~missing, make_server_ids(self.tj_code, names[missing]))
+        return ids
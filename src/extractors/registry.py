@@ -0,0 +1,86 @@
+from __future__ import annotations
+import csv
+import importlib
+import os
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Type
+
+CATALOG_PATH = os.path.join("config", "tj_catalog.csv")
+
+
+def read_catalog(path: str = CATALOG_PATH) -> List[Dict[str, str]]:
+    """Lê o catálogo de TJs ignorando linhas de comentário (`#`) e linhas vazias."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = [ln for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+    rows = []
+    for row in csv.DictReader(lines):
+        code = (row.get("tj_code") or "").strip().upper()
+        if code:
+            rows.append({k: (v or "").strip() for k, v in row.items() if k is not None} | {"tj_code": code})
+    return rows
+
+
+def _import_object(target: str):
+    # "pacote.modulo:Classe"
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr) if attr else module
+
+
+class ExtractorRegistry(Mapping):
+    """Registro de extratores declarado em `config/tj_catalog.csv`.
+
+    TJs sem a coluna `extractor` preenchida usam `GenericExtractor`, configurado pelas
+    colunas `source_format`, `header_strategy`, `id_strategy`, `column_overrides` e `dedup_rule`;
+    `extractor` (formato `modulo:Classe`) fica para TJs que exigem código próprio.
+
+    Listar os TJs (`keys`, `in`, `len`) lê apenas o catálogo; o módulo do extrator
+    (e os parsers que ele usa) só é importado no primeiro acesso ao TJ.
+    """
+
+    def __init__(self, catalog_path: str = CATALOG_PATH):
+        self.catalog_path = catalog_path
+        self._lock = threading.Lock()
+        self._rows: Dict[str, Dict[str, str]] | None = None
+        self._classes: Dict[str, Type] = {}
+
+    def _specs(self) -> Dict[str, Dict[str, str]]:
+        if self._rows is None:
+            self._rows = {r["tj_code"]: r for r in read_catalog(self.catalog_path)}
+        return self._rows
+
+    def __getitem__(self, tj_code: str) -> Type:
+        row = self._specs()[tj_code]
+        with self._lock:
+            if tj_code not in self._classes:
+                self._classes[tj_code] = self._build(row)
+            return self._classes[tj_code]
+
+    @staticmethod
+    def _build(row: Dict[str, str]) -> Type:
+        if row.get("extractor"):
+            return _import_object(row["extractor"])
+        from src.extractors.generic import ExtractorSpec, GenericExtractor
+
+        spec = ExtractorSpec.from_catalog_row(row)
+        return type(f"{spec.tj_code}Extractor", (GenericExtractor,), {"tj_code": spec.tj_code, "spec": spec})
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs())
+
+    def __len__(self) -> int:
+        return len(self._specs())
+
+    def __contains__(self, tj_code: object) -> bool:
+        return tj_code in self._specs()
+
+    def reload(self) -> None:
+        with self._lock:
+            self._rows = None
+            self._classes.clear()
+
+
+EXTRACTOR_REGISTRY = ExtractorRegistry()
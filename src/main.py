@@ -4,7 +4,10 @@ import os
 import pandas as pd
 
 from src.config import load_settings
-from src.pipeline import run_pipeline
+from src.pipeline import (
+    EXTRACTOR_REGISTRY, download_raw, publish_snapshot, run_pipeline, run_pipeline_arrow, write_unified,
+)
+from src.utils.instrumentation import PROFILE_MODES, RunReport, run_report_path, stage, use_report
 
 
 def parse_args():
@@ -12,6 +15,19 @@ def parse_args():
     ap.add_argument("--tjs", type=str, default="", help="Lista de TJs separados por vírgula (ex.: TJRS,TJPI,TJTO). Vazio usa todos os TJs suportados neste projeto.")
     ap.add_argument("--start", type=str, default="", help="YYYY-MM início")
     ap.add_argument("--end", type=str, default="", help="YYYY-MM fim")
+    ap.add_argument("--download", action="store_true", help="Baixa os arquivos mensais (month_url dos extratores) antes de processar")
+    ap.add_argument("--run_report", type=str, default=run_report_path("pipeline"),
+                    help="JSON com tempos, linhas, bytes e memória por etapa e por arquivo")
+    ap.add_argument("--engine", choices=("pandas", "arrow"), default="pandas",
+                    help="arrow: lê CSVs com o leitor Arrow e grava o Parquet mês a mês, sem montar o DataFrame do período")
+    ap.add_argument("--no_identity", action="store_true",
+                    help="Não unifica variações de grafia do nome (mantém o server_id do extrator)")
+    ap.add_argument("--raw_labels", action="store_true",
+                    help="Mantém cargo, carreira e vínculo como publicados (sem a taxonomia de config/taxonomy.yaml)")
+    ap.add_argument("--no_rubrics", action="store_true",
+                    help="Não grava as rubricas individuais (data.rubrics_dir); só os cinco totais")
+    ap.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                    help="Perfila as etapas (cProfile ou amostragem); saída em profiles/ ao lado do relatório")
     return ap.parse_args()
 
 
@@ -22,17 +38,81 @@ def main():
     start = args.start or settings.start
     end = args.end or settings.end
 
-    # Por ora, usamos somente TJs registrados no código (RS, PI, TO)
+    # Sem --tjs, usamos todos os TJs com extrator declarado em config/tj_catalog.csv
     if args.tjs:
         tj_codes = [t.strip().upper() for t in args.tjs.split(",") if t.strip()]
     else:
-        tj_codes = ["TJRS", "TJPI", "TJTO"]
+        tj_codes = sorted(EXTRACTOR_REGISTRY)
 
-    df = run_pipeline(tj_codes, start, end, user_agent=settings.user_agent, timeout=settings.timeout)
+    report = RunReport("pipeline", profile=args.profile, tjs=tj_codes, start=start, end=end, engine=args.engine,
+                       source="cli")
+    try:
+        with use_report(report):
+            run(args, settings, tj_codes, start, end)
+    finally:
+        # salvo mesmo se a execução falhar, para diagnosticar onde parou
+        path = report.save(args.run_report)
+    summary = report.to_dict()
+    if summary["file_errors"]:
+        print(f"[WARN] {summary['file_errors']} arquivo(s) com erro de leitura; detalhes no relatório de execução")
+    if summary["quality_issues"]:
+        print(f"[WARN] {summary['quality_issues']} anomalia(s) de validação (valores negativos/fora da faixa, "
+              "líquido > bruto, ids/meses mal formados); contagens por TJ e mês no relatório de execução")
+    print(f"[OK] Relatório de execução salvo em: {path}")
+    if report.profile_files:
+        print(f"[OK] Perfis salvos em: {os.path.dirname(report.profile_files[0])}")
 
-    os.makedirs(os.path.dirname(settings.unified_parquet), exist_ok=True)
-    df.to_parquet(settings.unified_parquet, index=False)
-    print(f"[OK] Dataset unificado salvo em: {settings.unified_parquet}")
+
+def run(args, settings, tj_codes, start, end):
+    if args.download:
+        # importados sob demanda: requests só é necessário quando há download
+        from src.utils.fetch import Fetcher
+        from src.utils.raw_cache import RawCache
+
+        fetcher = Fetcher(
+            user_agent=settings.user_agent, timeout=settings.timeout, retries=settings.retries,
+            backoff_factor=settings.backoff_factor, raw_root=settings.raw_dir,
+            rate_per_host=settings.rate_per_host, burst=settings.burst,
+            max_workers=settings.max_workers, max_per_tj=settings.max_per_tj,
+            cache=RawCache(settings.http_cache_dir) if settings.http_cache_dir else None,
+        )
+        try:
+            with stage("download") as st:
+                results = download_raw(tj_codes, start, end, fetcher)
+                st.bytes_read = sum(r.bytes for r in results if r.ok)
+        finally:
+            fetcher.close()
+        for r in results:
+            if not r.ok:
+                print(f"[WARN] Falha ao baixar {r.task.tj_code} {r.task.year_month}: {r.error}")
+        unchanged = sum(1 for r in results if r.ok and r.status == "not_modified")
+        print(f"[OK] Downloads concluídos: {sum(1 for r in results if r.ok)}/{len(results)} ({unchanged} sem alteração)")
+
+    options = dict(identity_map=None if args.no_identity else settings.identity_map,
+                    identity_threshold=settings.identity_threshold,
+                    label_dictionary=None if args.raw_labels else settings.label_dictionary,
+                    taxonomy=settings.taxonomy)
+    rubrics_dir = None if args.no_rubrics else settings.rubrics_dir
+    if args.engine == "arrow":
+        if rubrics_dir:
+            print("[WARN] --engine arrow não grava rubricas individuais; use o motor pandas para atualizá-las")
+        rows = run_pipeline_arrow(tj_codes, start, end, settings.unified_parquet, user_agent=settings.user_agent,
+                                  timeout=settings.timeout, raw_root=settings.raw_dir, **options)
+        print(f"[OK] Dataset unificado salvo em: {settings.unified_parquet} ({rows} linhas)")
+    else:
+        df = run_pipeline(tj_codes, start, end, user_agent=settings.user_agent, timeout=settings.timeout,
+                          raw_root=settings.raw_dir, rubrics_dir=rubrics_dir, **options)
+
+        with stage("write_parquet") as st:
+            write_unified(df, settings.unified_parquet)
+            st.rows_in = st.rows_out = len(df)
+        print(f"[OK] Dataset unificado salvo em: {settings.unified_parquet}")
+
+    snap = publish_snapshot(settings.snapshots_dir, settings.unified_parquet, tjs=tj_codes, start=start, end=end,
+                            engine=args.engine, source="cli")
+    if snap:
+        print(f"[OK] Versão publicada: {snap['version']} ({snap['new_partitions']} partição(ões) nova(s), "
+              f"{snap['reused_partitions']} reaproveitada(s))")
 
 
 if __name__ == "__main__":
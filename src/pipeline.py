@@ -1,21 +1,20 @@
 from __future__ import annotations
 import os
-from typing import Iterable, Dict, Type
+from typing import Iterable, Optional, TYPE_CHECKING
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 from datetime import datetime
 
-from src.schemas import UNIFIED_COLUMNS
-from src.extractors.tj_rs import TJRSExtractor
-from src.extractors.tj_pi import TJPIExtractor
-from src.extractors.tj_to import TJTOExtractor
+from src.schemas import Columns, UNIFIED_COLUMNS
+from src.extractors.registry import EXTRACTOR_REGISTRY
+from src.utils.canonical import TAXONOMY_PATH, LabelDictionary, load_taxonomy
+from src.utils.identity import DEFAULT_THRESHOLD, IdentityResolver
+from src.utils.instrumentation import profile_scope, stage, warn
+from src.utils.planner import Scheduler, Staging, WorkUnit
+from src.utils.rubrics import RubricStore, remap_ids
 
-
-EXTRACTOR_REGISTRY: Dict[str, Type] = {
-    "TJRS": TJRSExtractor,
-    "TJPI": TJPIExtractor,
-    "TJTO": TJTOExtractor,
-}
+if TYPE_CHECKING:
+    from src.utils.fetch import DownloadResult, Fetcher
 
 
 def month_range(start: str, end: str) -> list[str]:
@@ -29,28 +28,271 @@ def month_range(start: str, end: str) -> list[str]:
     return months
 
 
-def run_pipeline(tj_codes: Iterable[str], start: str, end: str, user_agent: str = "Mozilla/5.0", timeout: int = 60) -> pd.DataFrame:
+def download_raw(tj_codes: Iterable[str], start: str, end: str, fetcher: Fetcher) -> list[DownloadResult]:
+    """Baixa em paralelo os arquivos mensais dos TJs cujo extrator informa `month_url`."""
+    from src.utils.fetch import DownloadTask
+
     months = month_range(start, end)
+    tasks = []
+    for tj in tj_codes:
+        extractor_cls = EXTRACTOR_REGISTRY.get(tj)
+        if extractor_cls is None:
+            continue
+        extractor = extractor_cls(user_agent=fetcher.user_agent, timeout=fetcher.timeout)
+        for ym in months:
+            url = extractor.month_url(ym)
+            if url:
+                tasks.append(DownloadTask(tj_code=tj, year_month=ym, url=url))
+    return fetcher.fetch_all(tasks)
+
+
+def _identity_resolver(identity_map: Optional[str], threshold: float) -> Optional[IdentityResolver]:
+    if not identity_map:
+        return None
+    return IdentityResolver(identity_map, threshold=threshold)
+
+
+def resolve_identities(df: pd.DataFrame, resolver: IdentityResolver, tj_code: str) -> pd.DataFrame:
+    """Une variações de grafia do mesmo servidor num único `server_id` (ver `IdentityResolver`)."""
+    with stage("identity", tj_code=tj_code) as st:
+        before = df[Columns.server_id].nunique()
+        df = resolver.resolve(df)
+        st.rows_in = st.rows_out = len(df)
+    merged = before - df[Columns.server_id].nunique()
+    if merged:
+        print(f"[INFO] {tj_code}: {merged} id(s) unificado(s) por resolução de identidade")
+    return df
+
+
+def _label_dictionary(label_dictionary: Optional[str], taxonomy: str) -> Optional[LabelDictionary]:
+    if not label_dictionary:
+        return None
+    return LabelDictionary(label_dictionary, taxonomy=load_taxonomy(taxonomy))
+
+
+def canonicalize_labels(data, labels: LabelDictionary, tj_code: Optional[str] = None):
+    """Cargo, carreira e vínculo na taxonomia harmonizada (DataFrame ou tabela Arrow; ver `LabelDictionary`)."""
+    with stage("canonicalize", **({"tj_code": tj_code} if tj_code else {})) as st:
+        if isinstance(data, pd.DataFrame):
+            data = labels.canonicalize(data)
+            st.rows_in = st.rows_out = len(data)
+        else:
+            data = labels.canonicalize_arrow(data)
+            st.rows_in = st.rows_out = data.num_rows
+    return data
+
+
+def run_pipeline_arrow(tj_codes: Iterable[str], start: str, end: str, output_path: str,
+                       user_agent: str = "Mozilla/5.0", timeout: int = 60, raw_root: str = "data/raw",
+                       identity_map: Optional[str] = None,
+                       identity_threshold: float = DEFAULT_THRESHOLD,
+                       label_dictionary: Optional[str] = None, taxonomy: str = TAXONOMY_PATH,
+                       read_cache: bool = True) -> int:
+    """Como `run_pipeline` + gravação do Parquet, mas em Arrow e mês a mês.
+
+    Cada mês (tabela Arrow do extrator) é gravado direto no Parquet, sem concatenar o
+    período inteiro na memória; o arquivo final só substitui o anterior ao terminar.
+    Devolve o número de linhas gravadas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.utils.arrow_ingest import UNIFIED_ARROW_SCHEMA, to_unified_arrow
+
+    months = month_range(start, end)
+    resolver = _identity_resolver(identity_map, identity_threshold)
+    labels = _label_dictionary(label_dictionary, taxonomy)
+    id_columns = [Columns.tj_code, Columns.year_month, Columns.server_id, Columns.server_name, Columns.role]
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp = output_path + ".tmp"
+    total = 0
+    try:
+        with pq.ParquetWriter(tmp, UNIFIED_ARROW_SCHEMA) as writer:
+            for tj in tj_codes:
+                extractor_cls = EXTRACTOR_REGISTRY.get(tj)
+                if extractor_cls is None:
+                    print(f"[WARN] Sem extrator cadastrado para {tj}")
+                    warn(f"Sem extrator cadastrado para {tj}")
+                    continue
+                with stage("extract", tj_code=tj) as st:
+                    extractor = extractor_cls(user_agent=user_agent, timeout=timeout, raw_root=raw_root)
+                    extractor.read_cache = read_cache
+                    rows = 0
+                    for ym in months:
+                        table = extractor.fetch_month_arrow(ym)
+                        if table.num_rows and resolver is not None and extractor.name_based_ids:
+                            # só as colunas da identidade passam pelo pandas
+                            ids = resolve_identities(table.select(id_columns).to_pandas(), resolver, tj)
+                            table = table.set_column(table.schema.get_field_index(Columns.server_id),
+                                                     Columns.server_id,
+                                                     pa.array(ids[Columns.server_id].tolist(), pa.string()))
+                        if table.num_rows:
+                            table = to_unified_arrow(table)
+                            if labels is not None:
+                                table = canonicalize_labels(table, labels, tj)
+                            with profile_scope("write"):
+                                writer.write_table(table)
+                            rows += table.num_rows
+                    st.rows_out = rows
+                total += rows
+        os.replace(tmp, output_path)
+        if resolver is not None:
+            resolver.save()
+        if labels is not None:
+            labels.save()
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return total
+
+
+def run_pipeline(tj_codes: Iterable[str], start: str, end: str, user_agent: str = "Mozilla/5.0", timeout: int = 60,
+                 raw_root: str = "data/raw", identity_map: Optional[str] = None,
+                 identity_threshold: float = DEFAULT_THRESHOLD, label_dictionary: Optional[str] = None,
+                 taxonomy: str = TAXONOMY_PATH, rubrics_dir: Optional[str] = None,
+                 read_cache: bool = True) -> pd.DataFrame:
+    """Extrai e unifica os TJs no período; etapas ficam no relatório de execução ativo (se houver).
+
+    Com `identity_map`, os ids baseados em nome passam pela resolução de identidade e o
+    mapeamento persistente é atualizado ao final. Com `label_dictionary`, cargo, carreira e
+    vínculo são harmonizados pela taxonomia `taxonomy` após a unificação. Com `rubrics_dir`,
+    as rubricas individuais de cada mês são gravadas na tabela de fatos (ver `RubricStore`).
+    `read_cache=False` lê todos os arquivos brutos de novo, sem os caches de leitura.
+    """
+    months = month_range(start, end)
+    resolver = _identity_resolver(identity_map, identity_threshold)
+    rubrics = RubricStore(rubrics_dir, taxonomy=load_taxonomy(taxonomy)) if rubrics_dir else None
     frames = []
     for tj in tj_codes:
         extractor_cls = EXTRACTOR_REGISTRY.get(tj)
         if extractor_cls is None:
             print(f"[WARN] Sem extrator cadastrado para {tj}")
+            warn(f"Sem extrator cadastrado para {tj}")
             continue
-        extractor = extractor_cls(user_agent=user_agent, timeout=timeout)
-        df = extractor.fetch_many(months)
+        facts = None
+        with stage("extract", tj_code=tj) as st:
+            extractor = extractor_cls(user_agent=user_agent, timeout=timeout, raw_root=raw_root)
+            extractor.read_cache = read_cache
+            if rubrics is not None:
+                df, facts = extractor.fetch_many_rubrics(months)
+            else:
+                df = extractor.fetch_many(months)
+            st.rows_out = len(df)
+        if resolver is not None and extractor.name_based_ids and not df.empty:
+            before = df[Columns.server_id]
+            df = resolve_identities(df, resolver, tj)
+            if facts is not None:
+                facts = remap_ids(facts, before, df[Columns.server_id])
+        if rubrics is not None:
+            write_rubrics(rubrics, facts, tj, months)
         frames.append(df)
+    if resolver is not None:
+        resolver.save()
+    return _unify(frames, label_dictionary, taxonomy)
+
+
+def write_rubrics(store: RubricStore, facts: pd.DataFrame, tj_code: str, months: list[str]) -> None:
+    """Grava os fatos de rubrica dos meses processados de um TJ (meses sem rubricas são limpos)."""
+    with stage("rubrics", tj_code=tj_code) as st:
+        res = store.write(facts, [(tj_code, ym) for ym in months])
+        st.rows_in, st.rows_out = len(facts), res["rows"]
+    if res["rows"]:
+        print(f"[INFO] {tj_code}: {res['rows']} valor(es) de rubrica em {res['partitions']} mês(es) "
+              f"({res['rubrics']} rubrica(s) no dicionário)")
+
+
+def _unify(frames: list[pd.DataFrame], label_dictionary: Optional[str], taxonomy: str) -> pd.DataFrame:
     if frames:
-        unified = pd.concat(frames, ignore_index=True)
-        # Tipagem básica
-        for col in ["gross_pay", "base_pay", "benefits", "deductions", "net_pay"]:
-            if col in unified.columns:
-                unified[col] = pd.to_numeric(unified[col], errors="coerce").fillna(0.0)
-        # Derivar líquido quando não informado
-        if set(["gross_pay", "deductions", "net_pay"]).issubset(unified.columns):
-            mask_missing_net = (unified["net_pay"] <= 0) & (unified["gross_pay"] > 0)
-            unified.loc[mask_missing_net, "net_pay"] = (
-                unified.loc[mask_missing_net, "gross_pay"] - unified.loc[mask_missing_net, "deductions"]
-            ).clip(lower=0)
+        with stage("unify") as st:
+            unified = pd.concat(frames, ignore_index=True)
+            st.rows_in = st.rows_out = len(unified)
+            # valores já chegam como float sem nulos (validate_columns em fetch_many)
+            # Derivar líquido quando não informado
+            if set(["gross_pay", "deductions", "net_pay"]).issubset(unified.columns):
+                mask_missing_net = (unified["net_pay"] <= 0) & (unified["gross_pay"] > 0)
+                unified.loc[mask_missing_net, "net_pay"] = (
+                    unified.loc[mask_missing_net, "gross_pay"] - unified.loc[mask_missing_net, "deductions"]
+                ).clip(lower=0)
+        labels = _label_dictionary(label_dictionary, taxonomy)
+        if labels is not None:
+            unified = canonicalize_labels(unified, labels)
+            labels.save()
         return unified
     return pd.DataFrame(columns=UNIFIED_COLUMNS)
+
+
+def extract_unit(unit: WorkUnit, extractor, staging: Staging) -> int:
+    """Lê e valida um mês de um TJ e grava o resultado na staging (uma tarefa do `Scheduler`)."""
+    with stage("extract", tj_code=unit.tj_code, year_month=unit.year_month) as st:
+        df = extractor.validate_columns(extractor.fetch_month(unit.year_month))
+        staging.put(unit, df)
+        st.rows_out = len(df)
+        st.bytes_read = unit.bytes
+    return len(df)
+
+
+def run_backfill(units: list[WorkUnit], staging: Staging, scheduler_opts: Optional[dict] = None,
+                 user_agent: str = "Mozilla/5.0", timeout: int = 60, raw_root: str = "data/raw",
+                 identity_map: Optional[str] = None, identity_threshold: float = DEFAULT_THRESHOLD,
+                 label_dictionary: Optional[str] = None, taxonomy: str = TAXONOMY_PATH,
+                 on_done=None) -> pd.DataFrame:
+    """Executa as unidades pendentes do plano (ver `src.utils.planner`) e monta o dataset unificado.
+
+    Cada mês vai para a staging assim que termina, na ordem de prioridade do plano; a montagem
+    final (identidade, unificação, taxonomia) usa todas as unidades prontas, inclusive as de
+    execuções anteriores, como `run_pipeline`.
+    """
+    extractors = {}
+    for u in units:
+        if u.status == "pending" and u.tj_code not in extractors:
+            extractors[u.tj_code] = EXTRACTOR_REGISTRY[u.tj_code](user_agent=user_agent, timeout=timeout,
+                                                                raw_root=raw_root)
+    scheduler = Scheduler(lambda u: extract_unit(u, extractors[u.tj_code], staging), on_done=on_done,
+                          **(scheduler_opts or {}))
+    scheduler.run(units)
+
+    resolver = _identity_resolver(identity_map, identity_threshold)
+    frames = []
+    for tj in dict.fromkeys(u.tj_code for u in units):
+        months = sorted(u.year_month for u in units if u.tj_code == tj and u.status in ("ok", "done"))
+        paths = staging.paths(tj, months)
+        if not paths:
+            continue
+        with stage("read_staging", tj_code=tj) as st:
+            df = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+            st.rows_out = len(df)
+        if resolver is not None and EXTRACTOR_REGISTRY[tj].name_based_ids and not df.empty:
+            df = resolve_identities(df, resolver, tj)
+        frames.append(df)
+    if resolver is not None:
+        resolver.save()
+    return _unify(frames, label_dictionary, taxonomy)
+
+
+def write_unified(df: pd.DataFrame, output_path: str) -> None:
+    """Grava o Parquet unificado num temporário e troca de uma vez (leitores nunca veem arquivo pela metade)."""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp = output_path + ".tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def publish_snapshot(snapshots_dir: str, output_path: str, **meta) -> Optional[dict]:
+    """Publica o Parquet unificado como nova versão em `snapshots_dir` (ver `src.utils.snapshots`)."""
+    if not snapshots_dir:
+        return None
+    from src.utils.snapshots import SnapshotStore, publish_unified
+
+    with stage("snapshot") as st:
+        res = publish_unified(SnapshotStore(snapshots_dir), output_path, **meta)
+        st.rows_out = res["partitions"]
+    if res["metrics_stale"]:
+        # as métricas herdadas continuam publicadas, marcadas com o dataset de origem
+        msg = (f"Métricas da versão {res['version']} foram calculadas sobre o dataset de {res['metrics_dataset']}; "
+               f"execute scripts/compute_metrics.py --snapshots_dir {snapshots_dir} para atualizá-las")
+        print(f"[WARN] {msg}")
+        warn(msg)
+    return res
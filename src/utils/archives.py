@@ -0,0 +1,209 @@
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.utils.instrumentation import profile_scope, record_file
+
+ARCHIVE_EXTS = (".zip", ".gz")
+CACHE_DIR = os.path.join("data", "cache", "archives")
+
+# (caminho do membro dentro do arquivo, extensão interna)
+Member = Tuple[str, str]
+
+_index_lock = threading.Lock()
+
+
+def archive_ext(path: str) -> Optional[str]:
+    ext = os.path.splitext(path)[1].lower()
+    return ext if ext in ARCHIVE_EXTS else None
+
+
+def list_members(path: str, allowed_exts: Sequence[str]) -> List[Member]:
+    """Membros legíveis do arquivo compactado, sem extrair nada para o disco."""
+    if archive_ext(path) == ".gz":
+        # arquivo.csv.gz -> um único membro, "arquivo.csv"
+        name = os.path.splitext(os.path.basename(path))[0]
+        inner = os.path.splitext(name)[1].lower()
+        return [(name, inner)] if inner in allowed_exts else []
+    members = []
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                continue
+            ext = os.path.splitext(info.filename)[1].lower()
+            if ext in allowed_exts:
+                members.append((info.filename, ext))
+    return members
+
+
+def member_sizes(path: str) -> Dict[str, int]:
+    """Tamanho descompactado de cada membro (no .gz, o tamanho compactado do arquivo)."""
+    if archive_ext(path) == ".gz":
+        return {os.path.splitext(os.path.basename(path))[0]: os.path.getsize(path)}
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: info.file_size for info in zf.infolist()}
+
+
+def read_member(path: str, member: Member, reader: Callable) -> List[pd.DataFrame]:
+    """Abre um membro como fluxo (descompactado sob demanda) e aplica `reader(fluxo, ext)`."""
+    name, ext = member
+    if archive_ext(path) == ".gz":
+        with gzip.open(path, "rb") as fh:
+            return reader(fh, ext)
+    # cada chamada abre seu próprio ZipFile: seguro para uso em paralelo
+    with zipfile.ZipFile(path) as zf, zf.open(name) as fh:
+        return reader(fh, ext)
+
+
+def _safe_read_member(path: str, member: Member, reader: Callable) -> Tuple[List[pd.DataFrame], float, Optional[str]]:
+    # roda no processo de trabalho: devolve também tempo e erro para o relatório de execução
+    t0 = time.perf_counter()
+    try:
+        frames, error = read_member(path, member, reader), None
+    except Exception as e:
+        # membro problemático não interrompe os demais
+        frames, error = [], f"{type(e).__name__}: {e}"
+    return frames, round(time.perf_counter() - t0, 4), error
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def indexed_sha256(path: str, index_path: str) -> str:
+    """SHA-256 do arquivo, reaproveitado de `index_path` enquanto (tamanho, mtime) não mudar."""
+    st = os.stat(path)
+    stat = [int(st.st_size), int(st.st_mtime_ns)]
+    key = os.path.abspath(path)
+    with _index_lock:
+        entry = _load_json(index_path).get(key)
+    if entry and entry.get("stat") == stat:
+        return entry["sha256"]
+    sha = file_sha256(path)
+    with _index_lock:
+        index = _load_json(index_path)
+        index[key] = {"stat": stat, "sha256": sha}
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        tmp = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path)
+    return sha
+
+
+def _load_json(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ArchiveCache:
+    """Resultado mapeado de cada arquivo compactado, por hash do conteúdo.
+
+    `<root>/<sha[:2]>/<sha>-<chave>.parquet`, onde a chave combina TJ, mês, opções de
+    leitura e a versão dos leitores (`reader_fingerprint`). `index.json` guarda o hash por
+    (tamanho, mtime) para não reler arquivos inalterados só para calcular o hash.
+    """
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+
+    def archive_hash(self, path: str) -> str:
+        return indexed_sha256(path, self.index_path)
+
+    def _entry_path(self, sha: str, key: str) -> str:
+        # importado aqui: parse_cache depende deste módulo
+        from src.utils.parse_cache import reader_fingerprint
+
+        # mudanças nos leitores/mapeamento invalidam os resultados em cache
+        digest = hashlib.sha1(f"{reader_fingerprint()}|{key}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, sha[:2], f"{sha}-{digest}.parquet")
+
+    def get(self, sha: str, key: str) -> Optional[pd.DataFrame]:
+        path = self._entry_path(sha, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+
+    def put(self, sha: str, key: str, df: pd.DataFrame) -> None:
+        path = self._entry_path(sha, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        except Exception:
+            # colunas de tipos mistos não serializáveis: segue sem cache
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def read_archive(
+    path: str,
+    reader: Callable,
+    allowed_exts: Sequence[str],
+    workers: int | None = None,
+    cache: ArchiveCache | None = None,
+    cache_key: str = "",
+    tj_code: str = "",
+    year_month: str = "",
+) -> List[pd.DataFrame]:
+    """Lê os membros de um ZIP/GZ com `reader(fluxo, ext) -> [DataFrame]`.
+
+    Membros são processados em paralelo (processos) quando há mais de um; `reader`
+    precisa ser serializável (função de módulo ou `functools.partial`). Com `cache`,
+    o resultado concatenado é reaproveitado enquanto o conteúdo do arquivo não mudar.
+    Cada membro (ou o acerto de cache) é registrado no relatório de execução ativo.
+    """
+    t0 = time.perf_counter()
+    with profile_scope("hash"):
+        sha = cache.archive_hash(path) if cache is not None else ""
+    if cache is not None:
+        cached = cache.get(sha, cache_key)
+        if cached is not None:
+            record_file(tj_code=tj_code, year_month=year_month, path=path, reader="archive_cache",
+                        rows_out=len(cached), bytes_read=os.path.getsize(path),
+                        seconds=round(time.perf_counter() - t0, 4))
+            return [cached]
+
+    members = list_members(path, allowed_exts)
+    workers = min(workers or os.cpu_count() or 1, len(members))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_safe_read_member, [path] * len(members), members, [reader] * len(members)))
+    else:
+        results = [_safe_read_member(path, m, reader) for m in members]
+    sizes = member_sizes(path) if members else {}
+    frames = []
+    for (name, _), (dfs, seconds, error) in zip(members, results):
+        record_file(
+            tj_code=tj_code, year_month=year_month, path=path, member=name,
+            reader=",".join(sorted({f.attrs.get("reader_strategy", "") for f in dfs} - {""})) or None,
+            rows_out=sum(len(f) for f in dfs), bytes_read=sizes.get(name, 0), seconds=seconds, error=error,
+        )
+        frames.extend(dfs)
+
+    if cache is not None and frames:
+        out = pd.concat(frames, ignore_index=True)
+        cache.put(sha, cache_key, out)
+        return [out]
+    return frames
@@ -0,0 +1,285 @@
+from __future__ import annotations
+import codecs
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from src.schemas import Columns, UNIFIED_COLUMNS
+from src.utils.archives import ArchiveCache, archive_ext, read_archive
+from src.utils.dedup import SOURCE_RANK_COLUMN
+from src.utils.ingest_local import (
+    ARCHIVE_CACHE_DIR, COLUMN_CANDIDATES, FORMAT_EXTENSIONS, MATRICULA_COLUMN, PARSE_CACHE_DIR, READER_STRATEGY,
+    SUPPORTED_EXTS, _combine_two_header_rows, _normalize_header_names, _read_mapped, _resolve_columns,
+    _should_use_two_line_header,
+)
+from src.utils.instrumentation import profile_scope, record_file, stage
+from src.utils.parse_cache import ParseCache
+
+BLOCK_SIZE = 8 << 20
+SNIFF_BYTES = 64 * 1024
+
+PAY_COLUMNS = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+TEXT_COLUMNS = [Columns.server_name, Columns.role, Columns.career, Columns.bond_type]
+
+UNIFIED_ARROW_SCHEMA = pa.schema([(c, pa.float64() if c in PAY_COLUMNS else pa.string()) for c in UNIFIED_COLUMNS])
+
+# mesmas regras de `to_float_series`, em kernels Arrow
+_NON_NUMERIC = r"[^0-9,.\- ]+"
+_NUMBER = r"^-?(\d+\.?\d*|\.\d+)$"
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    # o leitor Arrow exige nomes distintos; repetições ganham sufixo como no pandas ("x", "x.1")
+    seen: Dict[str, int] = {}
+    out = []
+    for n in names:
+        k = seen.get(n, 0)
+        out.append(n if k == 0 else f"{n}.{k}")
+        seen[n] = k + 1
+    return out
+
+
+def _sniff_csv(path: str, header_strategy: str = "auto") -> Optional[Tuple[str, str, List[str], int, str]]:
+    """(encoding, delimitador, nomes, linhas de cabeçalho, estratégia) a partir do início do arquivo."""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if not head.strip():
+        return None
+    try:
+        # decodificador incremental: um caractere multibyte cortado no fim da amostra fica
+        # pendente (só é erro se o arquivo terminar ali)
+        text = codecs.getincrementaldecoder("utf-8")().decode(head, final=len(head) < SNIFF_BYTES)
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        text, encoding = head.decode("latin-1"), "latin-1"
+    text = text.lstrip("\ufeff")
+    first = text.split("\n", 1)[0]
+    delim = ";" if first.count(";") >= first.count(",") else ","
+    rows = list(itertools.islice(csv.reader(io.StringIO(text), delimiter=delim), 2))
+    if not rows or len(rows[0]) < 2:
+        return None
+    row1, row2 = rows[0], (rows[1] if len(rows) > 1 else [])
+    if header_strategy == "two_line":
+        two_line = bool(row2)
+    elif header_strategy == "single":
+        two_line = False
+    else:
+        cols = [c.strip() or f"Unnamed: {i}" for i, c in enumerate(row1)]
+        two_line = bool(row2) and _should_use_two_line_header(pd.DataFrame(columns=cols))
+    if two_line:
+        return encoding, delim, _unique_names(_combine_two_header_rows(row1, row2)), 2, "arrow_csv_two_line"
+    names = [n or f"Unnamed: {i}" for i, n in enumerate(_normalize_header_names(row1))]
+    return encoding, delim, _unique_names(names), 1, "arrow_csv"
+
+
+def to_float_arrow(arr, keep_nulls: bool = False) -> pa.ChunkedArray | pa.Array:
+    """Valores monetários (texto PT-BR ou números) -> float64, com 0.0 para nulos/ilegíveis.
+
+    `keep_nulls`: nulos e textos ilegíveis ficam nulos (contados em `validate_arrow`).
+    """
+    def done(out):
+        return out if keep_nulls else pc.fill_null(out, 0.0)
+
+    if pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type) or pa.types.is_boolean(arr.type):
+        return done(pc.cast(arr, pa.float64()))
+    if pa.types.is_null(arr.type):
+        return done(pc.cast(arr, pa.float64()))
+    s = pc.utf8_normalize(pc.cast(arr, pa.string()), "NFKC")  # NBSP vira espaço
+    for token in ("R$", "BRL", "brl"):
+        s = pc.replace_substring(s, token, "")
+    s = pc.replace_substring_regex(s, _NON_NUMERIC, "")
+    s = pc.replace_substring(s, " ", "")
+    s = pc.replace_substring(s, ".", "")
+    s = pc.replace_substring(s, ",", ".")
+    s = pc.if_else(pc.match_substring_regex(s, _NUMBER), s, pa.scalar(None, pa.string()))
+    return done(pc.cast(s, pa.float64()))
+
+
+def map_table(
+    table: pa.Table,
+    tj_code: str,
+    year_month: str,
+    column_overrides: Dict[str, List[str]] | None = None,
+    with_matricula: bool = False,
+) -> pa.Table:
+    """Projeção do bruto no esquema unificado: textos são as próprias colunas de origem (sem cópia)."""
+    n = table.num_rows
+    fields = list(COLUMN_CANDIDATES) + ([MATRICULA_COLUMN] if with_matricula else [])
+    resolved = _resolve_columns(table.column_names, column_overrides, fields)
+
+    def source(field: str):
+        name = resolved.get(field)
+        return table.column(name) if name is not None else pa.nulls(n, pa.string())
+
+    cols = {
+        Columns.tj_code: pa.repeat(pa.scalar(tj_code, pa.string()), n),
+        Columns.year_month: pa.repeat(pa.scalar(year_month, pa.string()), n),
+        # derivado depois pelo extrator (id_strategy)
+        Columns.server_id: pa.nulls(n, pa.string()),
+    }
+    for c in TEXT_COLUMNS:
+        col = source(c)
+        cols[c] = col if col.type == pa.string() else pc.cast(col, pa.string())
+    for c in PAY_COLUMNS:
+        # como em `_map_columns`: ilegíveis ficam nulos até a validação; sem origem, 0.0
+        cols[c] = to_float_arrow(source(c), keep_nulls=True) if resolved.get(c) is not None \
+            else pa.repeat(pa.scalar(0.0, pa.float64()), n)
+    if with_matricula:
+        col = source(MATRICULA_COLUMN)
+        cols[MATRICULA_COLUMN] = col if col.type == pa.string() else pc.cast(col, pa.string())
+    return pa.table(cols)
+
+
+def read_csv_arrow(path: str, header_strategy: str = "auto") -> Optional[Tuple[str, pa.Table]]:
+    """CSV/TXT lido em blocos pelo leitor multithread do Arrow (tudo como texto).
+
+    None quando o arquivo não tem formato reconhecível; erros de parsing (ex.: linhas com
+    número de campos diferente) propagam para o chamador usar o leitor pandas.
+    """
+    sniff = _sniff_csv(path, header_strategy)
+    if sniff is None:
+        return None
+    encoding, delim, names, skip, strategy = sniff
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(encoding=encoding, skip_rows=skip, column_names=names, block_size=BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(delimiter=delim, newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in names}, strings_can_be_null=True),
+    )
+    return strategy, reader.read_all()
+
+
+def _text_array(s: pd.Series) -> pa.Array:
+    # `astype(str)` no pandas 2 transforma None/NaN em "None"/"nan"; nulos ficam nulos
+    nulls = s.isna().to_numpy()
+    values = s.to_numpy(dtype=object, copy=True)
+    values[~nulls] = s[~nulls].astype(str).to_numpy(dtype=object)
+    values[nulls] = None
+    return pa.array(values, pa.string())
+
+
+def frame_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """DataFrame já mapeado (leitores pandas) -> Arrow; textos de tipos mistos viram string (nulos preservados)."""
+    text = [c for c in df.columns if c not in PAY_COLUMNS and df[c].dtype == object]
+    table = pa.Table.from_pandas(df.drop(columns=text), preserve_index=False)
+    for i, c in enumerate(df.columns):
+        if c in text:
+            table = table.add_column(i, c, _text_array(df[c]))
+    return table
+
+
+def to_unified_arrow(table: pa.Table) -> pa.Table:
+    """Esquema final do Parquet, com o líquido derivado quando não informado (como em `run_pipeline`)."""
+    table = table.select(UNIFIED_COLUMNS).cast(UNIFIED_ARROW_SCHEMA)
+    gross, ded, net = (table.column(c) for c in (Columns.gross_pay, Columns.deductions, Columns.net_pay))
+    missing = pc.and_(pc.less_equal(net, 0.0), pc.greater(gross, 0.0))
+    derived = pc.max_element_wise(pc.subtract(gross, ded), 0.0)
+    i = table.schema.get_field_index(Columns.net_pay)
+    return table.set_column(i, Columns.net_pay, pc.if_else(missing, derived, net))
+
+
+def load_month_arrow(
+    tj_code: str,
+    year_month: str,
+    raw_root: str = "data/raw",
+    column_overrides: Dict[str, List[str]] | None = None,
+    header_strategy: str = "auto",
+    source_format: str = "auto",
+    with_matricula: bool = False,
+    archive_cache_dir: str | None = ARCHIVE_CACHE_DIR,
+    archive_workers: int | None = None,
+    with_source_rank: bool = False,
+    parse_cache_dir: str | None = PARSE_CACHE_DIR,
+) -> pa.Table:
+    """Como `load_month_data`, mas devolve uma tabela Arrow.
+
+    CSV/TXT soltos vão direto do leitor Arrow para `map_table`; os demais formatos (e CSVs
+    que o Arrow não consegue ler) passam pelos leitores pandas e são convertidos uma vez.
+    """
+    month_dir = os.path.join(raw_root, tj_code, year_month)
+    if not os.path.isdir(month_dir):
+        return UNIFIED_ARROW_SCHEMA.empty_table()
+
+    allowed = SUPPORTED_EXTS if source_format == "auto" else FORMAT_EXTENSIONS.get(source_format, [])
+    reader = partial(
+        _read_mapped, tj_code=tj_code, year_month=year_month, column_overrides=column_overrides,
+        header_strategy=header_strategy, with_matricula=with_matricula,
+        parse_cache=ParseCache(parse_cache_dir) if parse_cache_dir else None,
+    )
+    cache = ArchiveCache(archive_cache_dir) if archive_cache_dir else None
+    cache_key = json.dumps([tj_code, year_month, column_overrides or {}, header_strategy, source_format,
+                            with_matricula], sort_keys=True, ensure_ascii=False)
+
+    with stage("load_month", tj_code=tj_code, year_month=year_month) as st:
+        tables: List[pa.Table] = []
+        bytes_read = 0
+        paths = [p for p in (os.path.join(month_dir, f) for f in sorted(os.listdir(month_dir))) if os.path.isfile(p)]
+        # arquivo mais recente (mtime, depois nome) recebe a maior ordem
+        ranks = {p: i for i, p in enumerate(sorted(paths, key=lambda p: (os.path.getmtime(p), p)))}
+        for path in paths:
+            ext = os.path.splitext(path)[1].lower()
+            if not archive_ext(path) and ext not in allowed:
+                continue
+            size = os.path.getsize(path)
+            bytes_read += size
+            t0 = time.perf_counter()
+            file_tables: List[pa.Table] = []
+            strategies: set = set()
+            error = None
+            try:
+                if archive_ext(path):
+                    frames = read_archive(path, reader, allowed, workers=archive_workers, cache=cache,
+                                          cache_key=cache_key, tj_code=tj_code, year_month=year_month)
+                    file_tables = [frame_to_arrow(f) for f in frames]
+                else:
+                    raw = None
+                    if ext in FORMAT_EXTENSIONS["csv"]:
+                        try:
+                            with profile_scope("read", ext=ext):
+                                raw = read_csv_arrow(path, header_strategy)
+                        except (pa.ArrowInvalid, UnicodeDecodeError):
+                            raw = None
+                    if raw is not None:
+                        strategy, table = raw
+                        with profile_scope("map"):
+                            file_tables = [map_table(table, tj_code, year_month, column_overrides, with_matricula)]
+                        strategies.add(strategy)
+                    else:
+                        frames = reader(path, ext)
+                        strategies.update(f.attrs.get(READER_STRATEGY, "") for f in frames)
+                        file_tables = [frame_to_arrow(f) for f in frames]
+            except Exception as e:
+                # arquivo problemático não interrompe o mês, mas fica registrado
+                file_tables, error = [], f"{type(e).__name__}: {e}"
+            if not archive_ext(path) or error is not None:
+                # membros de ZIP/GZ já foram registrados por `read_archive`
+                record_file(
+                    tj_code=tj_code, year_month=year_month, path=path,
+                    reader=",".join(sorted(strategies - {""})) or None,
+                    rows_out=sum(t.num_rows for t in file_tables), bytes_read=size,
+                    seconds=round(time.perf_counter() - t0, 4), error=error,
+                )
+            if with_source_rank:
+                file_tables = [t.append_column(SOURCE_RANK_COLUMN, pa.repeat(pa.scalar(ranks[path], pa.int32()),
+                                                                             t.num_rows))
+                               for t in file_tables]
+            tables.extend(file_tables)
+        st.bytes_read = bytes_read
+
+        if not tables:
+            st.rows_out = 0
+            return UNIFIED_ARROW_SCHEMA.empty_table()
+        # tabelas de leitores diferentes podem divergir em tipos (ex.: null x string); "permissive" unifica
+        out = pa.concat_tables(tables, promote_options="permissive")
+        st.rows_out = out.num_rows
+        return out
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.schemas import Columns
+from src.utils.identity import name_keys
+
+TAXONOMY_PATH = os.path.join("config", "taxonomy.yaml")
+LABEL_DICTIONARY_PATH = os.path.join("data", "processed", "label_dictionary.parquet")
+LABEL_FIELDS = [Columns.role, Columns.career, Columns.bond_type]
+# regras que classificam rubricas individuais nos totais do esquema (ver `src.utils.rubrics`)
+RUBRIC_FIELD = "rubric"
+
+DICTIONARY_COLUMNS = ["field", "label_key", "canonical", "rule", "taxonomy"]
+
+
+@dataclass
+class Taxonomy:
+    abbreviations: Dict[str, str]
+    rules: Dict[str, List[Tuple[str, str]]]          # campo -> [(rótulo, regex)] em ordem
+    overrides: Dict[str, Dict[str, str]] = field(default_factory=dict)  # campo -> chave normalizada -> rótulo
+    version: str = ""                                 # hash do arquivo: muda quando as regras mudam
+    rubric_exclude: str = ""                          # colunas numéricas que não são rubricas (regex)
+
+
+def load_taxonomy(path: str = TAXONOMY_PATH) -> Taxonomy:
+    with open(path, "rb") as f:
+        raw = f.read()
+    y = yaml.safe_load(raw) or {}
+    abbreviations = {str(k).lower(): str(v).lower() for k, v in (y.get("abbreviations") or {}).items()}
+    tax = Taxonomy(
+        abbreviations=abbreviations,
+        rules={f: [(str(r["label"]), str(r["match"])) for r in (y.get(f) or [])] for f in LABEL_FIELDS + [RUBRIC_FIELD]},
+        version=hashlib.sha256(raw).hexdigest()[:16],
+        rubric_exclude=str(y.get("rubric_exclude") or ""),
+    )
+    for f in LABEL_FIELDS:
+        over = (y.get("overrides") or {}).get(f) or {}
+        if over:
+            keys = label_keys(pd.Series(list(over), dtype=object), tax)
+            tax.overrides[f] = dict(zip(keys.tolist(), (str(v) for v in over.values())))
+    return tax
+
+
+def label_keys(labels: pd.Series, taxonomy: Taxonomy) -> pd.Series:
+    """Rótulo normalizado (como os nomes em `name_keys`) com as abreviações expandidas."""
+    keys = name_keys(labels)
+    if not taxonomy.abbreviations:
+        return keys
+    # uma passada com alternância das abreviações, palavra inteira
+    pattern = r"\b(" + "|".join(sorted(map(re.escape, taxonomy.abbreviations), key=len, reverse=True)) + r")\b"
+    return keys.str.replace(pattern, lambda m: taxonomy.abbreviations[m.group(1)], regex=True)
+
+
+def _display(labels: pd.Series) -> pd.Series:
+    # grafia "limpa" de um rótulo bruto (usada quando nenhuma regra casa)
+    return labels.astype(str).str.replace(r"\s+", " ", regex=True).str.strip(" .-;,")
+
+
+class LabelDictionary:
+    """Dicionário persistente rótulo normalizado -> rótulo harmonizado, por campo.
+
+    Cada rótulo novo é resolvido uma única vez (override, regras da taxonomia na ordem, ou a
+    grafia mais frequente dele) e guardado em `path`; nas execuções seguintes, só rótulos
+    nunca vistos passam pelas regras. Entradas de outra versão da taxonomia são descartadas.
+    """
+
+    def __init__(self, path: Optional[str] = LABEL_DICTIONARY_PATH, taxonomy: Optional[Taxonomy] = None):
+        self.path = path
+        self.taxonomy = taxonomy or load_taxonomy()
+        self.entries = self._load()
+        self._memo: Dict[str, Dict[str, str]] = {f: {} for f in LABEL_FIELDS}
+        for f, k, c in self.entries[["field", "label_key", "canonical"]].itertuples(index=False):
+            self._memo.setdefault(f, {})[k] = c
+        self.dirty = False
+
+    def _load(self) -> pd.DataFrame:
+        if self.path and os.path.exists(self.path):
+            df = pd.read_parquet(self.path, columns=DICTIONARY_COLUMNS)
+            return df[df["taxonomy"] == self.taxonomy.version].reset_index(drop=True)
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in DICTIONARY_COLUMNS})
+
+    def save(self) -> None:
+        if not self.dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        self.entries.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def _resolve(self, field_name: str, keys: pd.Series, display: pd.Series) -> pd.DataFrame:
+        """Rótulo harmonizado de chaves nunca vistas (valores distintos), em lote por regra."""
+        canonical = pd.Series(np.nan, index=keys.index, dtype=object)
+        rule = pd.Series("", index=keys.index, dtype=object)
+        overrides = self.taxonomy.overrides.get(field_name, {})
+        if overrides:
+            hit = keys.map(overrides)
+            canonical, rule = canonical.fillna(hit), rule.mask(hit.notna(), "override")
+        for label, pattern in self.taxonomy.rules.get(field_name, []):
+            todo = keys[canonical.isna()]
+            if todo.empty:
+                break
+            rx = re.compile(pattern)
+            idx = [i for i, k in todo.items() if rx.search(k)]
+            canonical[idx] = label
+            rule[idx] = pattern
+        fallback = canonical.isna()
+        canonical[fallback] = display[fallback]
+        rule[fallback] = "fallback"
+        return pd.DataFrame({"field": field_name, "label_key": keys.to_numpy(), "canonical": canonical.to_numpy(),
+                             "rule": rule.to_numpy(), "taxonomy": self.taxonomy.version})
+
+    def canonical_values(self, field_name: str, labels: pd.Series, counts: Optional[np.ndarray] = None) -> pd.Series:
+        """Rótulo harmonizado de cada valor distinto em `labels` (nulos/vazios continuam nulos).
+
+        `counts` (ocorrências de cada valor) escolhe a grafia de rótulos sem regra.
+        """
+        keys = label_keys(labels, self.taxonomy)
+        memo = self._memo.setdefault(field_name, {})
+        out = keys.map(memo)
+        unseen = out.isna() & (keys != "")
+        if unseen.any():
+            weights = pd.Series(counts if counts is not None else np.ones(len(labels)), index=labels.index)
+            cand = pd.DataFrame({"key": keys[unseen], "display": _display(labels[unseen]), "n": weights[unseen]})
+            # grafia mais frequente de cada chave nova
+            best = cand.sort_values("n", ascending=False, kind="stable").drop_duplicates("key")
+            resolved = self._resolve(field_name, best["key"].reset_index(drop=True),
+                                     best["display"].reset_index(drop=True))
+            memo.update(zip(resolved["label_key"], resolved["canonical"]))
+            self.entries = pd.concat([self.entries, resolved], ignore_index=True)
+            self.dirty = True
+            out = keys.map(memo)
+        return out.where(keys != "")
+
+    def canonicalize(self, df: pd.DataFrame, fields: Optional[List[str]] = None) -> pd.DataFrame:
+        """Substitui `role`, `career` e `bond_type` pelos rótulos harmonizados (só valores distintos)."""
+        fixed = {}
+        for f in fields or LABEL_FIELDS:
+            if f not in df.columns or df.empty:
+                continue
+            codes, uniques = pd.factorize(df[f], use_na_sentinel=True)
+            if len(uniques) == 0:
+                continue
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            values = self.canonical_values(f, pd.Series(uniques, dtype=object), counts).to_numpy(dtype=object)
+            fixed[f] = pd.Series(np.append(values, None)[codes], index=df.index, dtype=object)
+        return df.assign(**fixed) if fixed else df
+
+    def canonicalize_arrow(self, table, fields: Optional[List[str]] = None):
+        """`canonicalize` para tabelas Arrow: dicionário da coluna -> rótulos -> `take` pelos índices."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        for f in fields or LABEL_FIELDS:
+            if f not in table.column_names or table.num_rows == 0:
+                continue
+            encoded = pc.dictionary_encode(table.column(f)).combine_chunks()
+            if len(encoded.dictionary) == 0:
+                continue
+            counts = np.bincount(encoded.indices.drop_null().to_numpy(), minlength=len(encoded.dictionary))
+            values = self.canonical_values(f, pd.Series(encoded.dictionary.to_pylist(), dtype=object), counts)
+            new_dict = pa.array([v if isinstance(v, str) else None for v in values], pa.string())
+            table = table.set_column(table.schema.get_field_index(f), f, pc.take(new_dict, encoded.indices))
+        return table
+
+    def summary(self) -> pd.DataFrame:
+        """Quantos rótulos distintos viraram cada rótulo harmonizado, por campo e regra."""
+        return (self.entries.groupby(["field", "canonical", "rule"], dropna=False).size()
+                .reset_index(name="labels").sort_values(["field", "labels"], ascending=[True, False]))
@@ -0,0 +1,64 @@
+from __future__ import annotations
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Alguma destas rubricas > 0: linha informativa (coerente com compute_metrics)
+INFORMATIVE_COLUMNS = ["gross_pay", "net_pay", "benefits", "base_pay"]
+
+
+def informative_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Linhas com algum valor financeiro positivo."""
+    mask = pd.Series(False, index=df.index)
+    for c in INFORMATIVE_COLUMNS:
+        mask |= df.get(c, 0) > 0
+    return df[mask].copy()
+
+
+def dashboard_aggregations(df_inf: pd.DataFrame, teto: Optional[float] = None) -> Dict[str, pd.DataFrame]:
+    """Agregações das seções do painel (scripts/dash_app.py) sobre as linhas informativas.
+
+    Sem Streamlit/Plotly, para o benchmark medir o mesmo código do painel. Chaves ausentes
+    quando faltam as colunas necessárias; as de teto só com `teto` > 0.
+    """
+    out: Dict[str, pd.DataFrame] = {}
+    if df_inf.empty:
+        return out
+    cols = set(df_inf.columns)
+    if "role" in cols:
+        out["by_role_cnt"] = df_inf.groupby(["role"], dropna=False)["server_id"].nunique().reset_index(name="servidores")
+    if {"year_month", "gross_pay"}.issubset(cols):
+        out["bym"] = df_inf.groupby(["year_month"]).agg(
+            media_bruta=("gross_pay", "mean"), mediana_bruta=("gross_pay", "median")
+        ).reset_index()
+    if {"year_month", "server_name", "gross_pay"}.issubset(cols):
+        out["top"] = df_inf.loc[[df_inf["gross_pay"].idxmax()], ["year_month", "tj_code", "server_name", "role",
+                                                                  "gross_pay"]]
+    if teto and teto > 0 and "gross_pay" in cols:
+        df_ex = df_inf.assign(excedente=(df_inf["gross_pay"] - float(teto)).clip(lower=0))
+        exceeders = df_ex[df_ex["excedente"] > 0]
+        out["exceeders"] = exceeders
+        if "career" in cols:
+            by_career = exceeders.groupby(["career"], dropna=False).agg(
+                servidores=("server_id", "nunique"),
+                excedente_total=("excedente", "sum"),
+            ).reset_index()
+            if not by_career.empty:
+                by_career["excedente_per_capita"] = (
+                    by_career["excedente_total"] / by_career["servidores"].replace({0: float("nan")})
+                )
+            out["exceeders_by_career"] = by_career
+    if {"server_id", "gross_pay", "year_month"}.issubset(cols):
+        # Medida: amplitude (max - min) por servidor
+        out["var_by_srv"] = df_inf.groupby(["server_id", "server_name"], dropna=False).agg(
+            var_amplitude=("gross_pay", lambda s: float(s.max() - s.min())),
+            media=("gross_pay", "mean"),
+            observacoes=("gross_pay", "count"),
+        ).reset_index()
+        if "role" in cols:
+            out["var_by_role"] = df_inf.groupby(["role"], dropna=False).agg(
+                var_median=("gross_pay", lambda s: float(s.max() - s.min())),
+                media=("gross_pay", "mean"),
+                servidores=("server_id", "nunique"),
+            ).reset_index()
+    return out
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import hashlib
+from dataclasses import dataclass, field
+from typing import List
+
+import pandas as pd
+
+from src.schemas import Columns
+from src.utils.rubrics import RUBRIC_PREFIX
+
+# As regras só valem entre arquivos diferentes do mês; homônimos no mesmo arquivo (mesmo
+# server_id quando o id é o hash do nome) são pessoas distintas e nunca são unidos.
+# "sum": folha base + folhas suplementares (rubricas somadas por servidor)
+# "latest": fica a linha do arquivo mais recente
+# "flag": como "latest", mas servidores com valores divergentes entre arquivos são apontados (padrão)
+# "none": mantém as linhas como vieram
+DEDUP_RULES = ("sum", "latest", "flag", "none")
+DEFAULT_DEDUP_RULE = "flag"
+
+# Ordem do arquivo de origem dentro do mês (maior = mais recente); coluna interna da ingestão
+SOURCE_RANK_COLUMN = "_source_rank"
+
+KEY_COLUMNS = [Columns.tj_code, Columns.year_month, Columns.server_id]
+AMOUNT_COLUMNS = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+TEXT_COLUMNS = [Columns.server_name, Columns.role, Columns.career, Columns.bond_type]
+
+
+@dataclass
+class DedupResult:
+    df: pd.DataFrame
+    rows_in: int
+    duplicated_keys: int = 0
+    conflict_ids: List[str] = field(default_factory=list)
+
+
+def _repeated_files(df: pd.DataFrame) -> pd.Series:
+    """Linhas de arquivos com conteúdo idêntico ao de um arquivo anterior do mês (mesmas linhas, na mesma ordem)."""
+    cols = [c for c in df.columns if c != SOURCE_RANK_COLUMN]
+    hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    ranks = df[SOURCE_RANK_COLUMN].to_numpy()
+    seen, repeated = set(), []
+    for rank in sorted(pd.unique(ranks)):
+        digest = hashlib.sha1(hashes[ranks == rank].tobytes()).hexdigest()
+        if digest in seen:
+            repeated.append(rank)
+        seen.add(digest)
+    return df[SOURCE_RANK_COLUMN].isin(repeated)
+
+
+def dedupe(df: pd.DataFrame, rule: str = DEFAULT_DEDUP_RULE) -> DedupResult:
+    """Concilia o mesmo servidor vindo de arquivos diferentes do mês conforme `rule` (ver `DEDUP_RULES`).
+
+    A chave é (tj_code, year_month, server_id, ocorrência), em que a ocorrência é a ordem da
+    linha entre as de mesmo server_id *no seu arquivo* (`SOURCE_RANK_COLUMN`): homônimos de
+    um arquivo ficam em ocorrências distintas e não se fundem, e a n-ésima linha de um arquivo
+    se alinha à n-ésima do outro. Sem `SOURCE_RANK_COLUMN` não há como separar arquivos e o
+    DataFrame volta intacto. Arquivos repetidos (ex.: `.csv` solto e dentro de um `.zip`) são
+    descartados antes de qualquer regra: em "sum" só arquivos inteiros idênticos, já que uma
+    linha suplementar pode repetir a da folha base e precisa ser somada; nas demais regras,
+    também linhas idênticas entre arquivos.
+    """
+    if rule not in DEDUP_RULES:
+        raise ValueError(f"dedup_rule inválido: {rule} (use {', '.join(DEDUP_RULES)})")
+    rows_in = len(df)
+    keys = [c for c in KEY_COLUMNS if c in df.columns]
+    if rule == "none" or df.empty or Columns.server_id not in keys or SOURCE_RANK_COLUMN not in df.columns:
+        return DedupResult(df, rows_in)
+    if rule == "sum" and df[SOURCE_RANK_COLUMN].nunique() > 1:
+        repeated = _repeated_files(df)
+        if repeated.any():
+            df = df[~repeated]
+    # só importam chaves presentes em mais de um arquivo; as demais seguem intactas
+    multi = df.groupby(keys, sort=False, dropna=False)[SOURCE_RANK_COLUMN].transform("nunique") > 1
+    if not multi.any():
+        return DedupResult(df, rows_in)
+    rest, dups = df[~multi], df[multi].sort_values(SOURCE_RANK_COLUMN, kind="stable")
+    duplicated_keys = int(dups[keys].drop_duplicates().shape[0])
+    slot = "_occurrence"
+    dups = dups.assign(**{slot: dups.groupby(keys + [SOURCE_RANK_COLUMN], sort=False, dropna=False).cumcount()})
+    slot_keys = keys + [slot]
+
+    # rubricas individuais (`rubric:*`, ver `src.utils.rubrics`) seguem a regra dos valores
+    amounts = [c for c in AMOUNT_COLUMNS if c in df.columns] + [
+        c for c in df.columns if isinstance(c, str) and c.startswith(RUBRIC_PREFIX)]
+    texts = [c for c in TEXT_COLUMNS if c in df.columns]
+    if rule != "sum":
+        # a ocorrência está no subset: homônimos de mesmo cargo e valor no mesmo arquivo ficam
+        dups = dups.drop_duplicates(subset=slot_keys + amounts + texts)
+
+    conflict_ids: List[str] = []
+    if rule == "sum":
+        agg = {c: "sum" for c in amounts}
+        # textos do primeiro arquivo que os informa (a folha base costuma vir antes)
+        agg.update({c: "first" for c in texts})
+        agg[SOURCE_RANK_COLUMN] = "max"
+        resolved = dups.groupby(slot_keys, sort=False, dropna=False).agg(agg).reset_index()
+    else:
+        if rule == "flag":
+            # ocorrências ainda repetidas após remover linhas idênticas divergem em algum valor/texto
+            still = dups.duplicated(slot_keys, keep=False)
+            conflict_ids = dups.loc[still, Columns.server_id].astype(str).unique().tolist()
+        resolved = dups.drop_duplicates(subset=slot_keys, keep="last")
+    out = pd.concat([rest, resolved[[c for c in df.columns if c in resolved.columns]]], ignore_index=True)
+    return DedupResult(out, rows_in, duplicated_keys, conflict_ids)
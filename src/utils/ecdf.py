@@ -0,0 +1,265 @@
+from __future__ import annotations
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.schemas import Columns
+from src.utils.topk import GROUP_COLUMNS, TOPK_MEASURES, partition_fingerprints
+
+ECDF_FILE = "ecdf.parquet"
+# pontos por grupo: até aqui a ECDF é exata (valores distintos); acima, vira um resumo com
+# MAX_POINTS nós em postos igualmente espaçados (erro máximo de ~1/MAX_POINTS no percentil)
+MAX_POINTS = 1024
+ECDF_MEASURES = TOPK_MEASURES
+ECDF_COLUMNS = GROUP_COLUMNS + ["measure", "value", "cum", "exact"]
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# índices mantidos em memória (um por arquivo, ex.: versões fixadas)
+MAX_INDEXES = 8
+
+_META_KEY = b"ecdf"
+
+
+@dataclass
+class Ecdf:
+    """Função de distribuição empírica de um grupo (ou da união de vários).
+
+    `values` crescentes e `cum[i]` = quantos valores são <= `values[i]`; `n` = total. Nos
+    grupos resumidos (`exact=False`), a contagem entre dois nós é interpolada.
+    """
+
+    values: np.ndarray
+    cum: np.ndarray
+    n: int
+    exact: bool = True
+
+    def count_le(self, x) -> np.ndarray:
+        """Quantos valores são <= x (x escalar ou vetor), por busca binária."""
+        x = np.asarray(x, dtype=float)
+        if self.n == 0:
+            return np.zeros(x.shape)
+        i = np.searchsorted(self.values, x, side="right") - 1
+        out = np.where(i >= 0, self.cum[np.clip(i, 0, None)], 0).astype(float)
+        if not self.exact:
+            j = np.clip(i + 1, 0, len(self.values) - 1)
+            inner = (i >= 0) & (i + 1 < len(self.values))
+            lo, hi = self.values[np.clip(i, 0, None)], self.values[j]
+            frac = np.where(inner & (hi > lo), (x - lo) / np.where(hi > lo, hi - lo, 1), 0)
+            out = out + frac * (self.cum[j] - out)
+        return out
+
+    def percentile(self, x) -> np.ndarray:
+        """Percentual (0-100) dos valores do grupo que são <= x."""
+        return 100.0 * self.count_le(x) / self.n if self.n else np.full(np.shape(x), np.nan)
+
+    def quantile(self, q) -> np.ndarray:
+        """Menor valor com pelo menos a fração `q` do grupo abaixo ou igual (inversa da ECDF)."""
+        q = np.asarray(q, dtype=float)
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        target = np.clip(q, 0, 1) * self.n
+        if self.exact:
+            return self.values[np.clip(np.searchsorted(self.cum, target, side="left"), 0, len(self.values) - 1)]
+        return np.interp(target, self.cum, self.values)
+
+    @staticmethod
+    def union(parts: Sequence["Ecdf"]) -> "Ecdf":
+        """ECDF da união de grupos disjuntos: as contagens se somam em cada valor."""
+        parts = [p for p in parts if p.n]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return Ecdf(np.empty(0), np.empty(0, dtype=np.int64), 0)
+        values = np.unique(np.concatenate([p.values for p in parts]))
+        cum = np.sum([p.count_le(values) for p in parts], axis=0)
+        exact = all(p.exact for p in parts)
+        return Ecdf(values, np.rint(cum).astype(np.int64) if exact else cum, sum(p.n for p in parts), exact)
+
+
+def build_ecdf(df: pd.DataFrame, max_points: int = MAX_POINTS,
+               measures: Sequence[str] = ECDF_MEASURES) -> pd.DataFrame:
+    """ECDF de cada medida por (TJ, mês, cargo), em formato longo (um nó por linha).
+
+    Uma ordenação por medida (grupo, valor); os nós são os fins de cada sequência de valores
+    iguais, com o posto acumulado dentro do grupo. Grupos com mais de `max_points` valores
+    distintos guardam `max_points` nós igualmente espaçados (sempre incluindo mínimo e máximo).
+    Como no top-K, só entram valores positivos.
+    """
+    if df.empty:
+        return _empty()
+    group_codes = df.groupby(GROUP_COLUMNS, dropna=False, sort=False).ngroup().to_numpy()
+    parts = []
+    for m in measures:
+        if m not in df.columns:
+            continue
+        values = df[m].to_numpy(dtype=float)
+        rows = np.flatnonzero(values > 0)
+        if len(rows) == 0:
+            continue
+        order = rows[np.lexsort((values[rows], group_codes[rows]))]
+        g, v = group_codes[order], values[order]
+        n = len(order)
+        starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+        # fim de cada valor distinto dentro do grupo
+        last = np.flatnonzero(np.r_[(g[1:] != g[:-1]) | (v[1:] != v[:-1]), True])
+        cum = last + 1 - np.repeat(starts, np.diff(np.r_[starts, n]))[last]
+        # nós por grupo: todos, ou `max_points` igualmente espaçados
+        node_group = np.searchsorted(starts, last, side="right") - 1
+        first_node = np.searchsorted(node_group, np.arange(len(starts)))
+        n_nodes = np.diff(np.r_[first_node, len(last)])
+        keep_n = np.minimum(n_nodes, max_points)
+        j = np.arange(keep_n.sum()) - np.repeat(np.cumsum(keep_n) - keep_n, keep_n)
+        span = np.repeat(n_nodes - 1, keep_n)
+        denom = np.maximum(np.repeat(keep_n - 1, keep_n), 1)
+        pick = np.repeat(first_node, keep_n) + np.where(span > 0, (j * span) // denom, 0)
+        nodes = last[pick]
+        part = df.iloc[order[nodes]][GROUP_COLUMNS].reset_index(drop=True)
+        part["measure"] = m
+        part["value"] = v[nodes]
+        part["cum"] = cum[pick].astype(np.int64)
+        part["exact"] = np.repeat(n_nodes <= max_points, keep_n)
+        parts.append(part)
+    if not parts:
+        return _empty()
+    return _compact(pd.concat(parts, ignore_index=True)[ECDF_COLUMNS])
+
+
+def _empty() -> pd.DataFrame:
+    return _compact(pd.DataFrame({c: pd.Series(dtype=object) for c in ECDF_COLUMNS}).astype(
+        {"value": float, "cum": np.int64, "exact": bool}))
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    for c in GROUP_COLUMNS + ["measure"]:
+        df[c] = df[c].astype("category")
+    return df.sort_values(GROUP_COLUMNS + ["measure", "value"], kind="stable", ignore_index=True)
+
+
+def read_ecdf_meta(path: str) -> Optional[Dict]:
+    import pyarrow.parquet as pq
+
+    try:
+        return json.loads(pq.read_schema(path).metadata[_META_KEY])
+    except Exception:
+        return None
+
+
+def write_ecdf(df: pd.DataFrame, path: str, meta: Dict) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           _META_KEY: json.dumps(meta).encode("utf-8")})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def update_ecdf(df: pd.DataFrame, path: str, max_points: int = MAX_POINTS, keep_missing: bool = False) -> Dict:
+    """Atualiza `path` recalculando só as partições (TJ, mês) novas ou alteradas (como `update_topk`)."""
+    fingerprints = partition_fingerprints(df)
+    meta = read_ecdf_meta(path) if os.path.exists(path) else None
+    if meta is None or meta.get("max_points") != max_points:
+        old, old_fp = _empty(), {}
+    else:
+        old, old_fp = pd.read_parquet(path), meta.get("partitions", {})
+    changed = sorted(k for k, fp in fingerprints.items() if old_fp.get(k) != fp)
+    removed = [] if keep_missing else sorted(k for k in old_fp if k not in fingerprints)
+    if not changed and not removed and meta is not None:
+        return {"changed": 0, "removed": 0, "reused": len(fingerprints), "rows": int(meta.get("rows", 0))}
+    keys = df[Columns.tj_code].astype(str) + "|" + df[Columns.year_month].astype(str)
+    fresh = build_ecdf(df[keys.isin(set(changed))], max_points)
+    if not old.empty:
+        old_keys = old[Columns.tj_code].astype(str) + "|" + old[Columns.year_month].astype(str)
+        old = old[~old_keys.isin(set(changed + removed))]
+    frames = [f.astype({c: object for c in GROUP_COLUMNS + ["measure"]}) for f in (old, fresh) if not f.empty]
+    out = _compact(pd.concat(frames, ignore_index=True)) if frames else _empty()
+    partitions = {k: v for k, v in old_fp.items() if k not in removed} | {k: fingerprints[k] for k in changed}
+    write_ecdf(out, path, {"max_points": max_points, "rows": len(out), "partitions": partitions})
+    return {"changed": len(changed), "removed": len(removed), "reused": len(fingerprints) - len(changed),
+            "rows": len(out)}
+
+
+class EcdfIndex:
+    """ECDFs de um `ecdf.parquet` em memória: grupo -> fatia dos vetores ordenados.
+
+    Percentil de um valor é uma busca binária na fatia do grupo; coortes mais amplas (ex.:
+    todos os cargos de um TJ, ou vários meses) somam as contagens dos grupos que as compõem.
+    """
+
+    def __init__(self, path: str):
+        df = pd.read_parquet(path)
+        self.path = path
+        self.values = df["value"].to_numpy(dtype=float)
+        self.cum = df["cum"].to_numpy(dtype=np.int64)
+        exact = df["exact"].to_numpy(dtype=bool)
+        keys = pd.MultiIndex.from_frame(df[GROUP_COLUMNS + ["measure"]].astype(object))
+        codes, uniques = pd.factorize(keys)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=int)
+        ends = np.r_[starts[1:], len(codes)]
+        self.groups: Dict[Tuple, Tuple[int, int, bool]] = {
+            tuple(None if pd.isna(x) else x for x in uniques[codes[s]]): (int(s), int(e), bool(exact[s]))
+            for s, e in zip(starts, ends)
+        }
+
+    def _ecdf(self, key: Tuple) -> Ecdf:
+        s, e, exact = self.groups[key]
+        return Ecdf(self.values[s:e], self.cum[s:e], int(self.cum[e - 1]), exact)
+
+    def keys(self, measure: str = Columns.gross_pay, tj_code=None, year_month=None, role=None) -> List[Tuple]:
+        """Grupos (tj_code, year_month, role, measure) que compõem a coorte filtrada (cada filtro
+        aceita um valor ou uma lista de valores)."""
+        wanted = [w if w is None or isinstance(w, (list, tuple, set)) else (w,) for w in (tj_code, year_month, role)]
+        return [k for k in self.groups if k[3] == measure
+                and all(w is None or v in w for w, v in zip(wanted, k[:3]))]
+
+    def cohort(self, measure: str = Columns.gross_pay, tj_code=None, year_month=None, role=None) -> Ecdf:
+        """ECDF da coorte: um grupo (busca direta) ou a união dos grupos filtrados (None = todos)."""
+        key = (tj_code, year_month, role, measure)
+        if all(isinstance(x, str) for x in key) and key in self.groups:
+            return self._ecdf(key)
+        return Ecdf.union([self._ecdf(k) for k in self.keys(measure, tj_code, year_month, role)])
+
+    def compare(self, values: Sequence[float], by: str = Columns.tj_code, measure: str = Columns.gross_pay,
+                tj_code=None, year_month=None, role=None,
+                cohorts: Optional[Sequence[str]] = None, quantiles: Sequence[float] = QUANTILES) -> pd.DataFrame:
+        """Uma linha por coorte de `by` (ex.: cada TJ, restrito a `cohorts`) com o percentil de
+        cada valor e os quantis; os demais filtros delimitam as coortes (ex.: cargo e mês)."""
+        pos = GROUP_COLUMNS.index(by)
+        groups: Dict[str, List[Tuple]] = {}
+        for k in self.keys(measure, tj_code, year_month, role):
+            if cohorts is None or k[pos] in cohorts:
+                groups.setdefault(k[pos], []).append(k)
+        rows = []
+        for name in sorted(groups, key=str):
+            e = Ecdf.union([self._ecdf(k) for k in groups[name]])
+            row = {by: name, "n": e.n, "exact": e.exact}
+            row.update({f"pct_{v:g}": float(p) for v, p in zip(values, e.percentile(values))})
+            row.update({f"q{round(q * 100)}": float(x) for q, x in zip(quantiles, e.quantile(quantiles))})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+_INDEXES: Dict[Tuple[str, int, int], EcdfIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def load_index(path: str) -> EcdfIndex:
+    """Índice compartilhado por arquivo; recarregado quando o arquivo muda."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), int(st.st_size), int(st.st_mtime_ns))
+    with _INDEXES_LOCK:
+        index = _INDEXES.pop(key, None)
+    if index is None:
+        index = EcdfIndex(path)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index  # reinserido no fim: os menos usados saem primeiro
+        while len(_INDEXES) > MAX_INDEXES:
+            _INDEXES.pop(next(iter(_INDEXES)))
+    return index
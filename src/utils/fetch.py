@@ -0,0 +1,171 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from src.utils.http import TokenBucket, get, make_session
+from src.utils.raw_cache import RawCache
+
+
+@dataclass
+class DownloadTask:
+    tj_code: str
+    year_month: str                 # YYYY-MM
+    url: str
+    filename: Optional[str] = None  # padrão: último segmento da URL
+
+
+@dataclass
+class DownloadResult:
+    task: DownloadTask
+    path: Optional[str] = None
+    bytes: int = 0
+    status: str = "downloaded"   # "downloaded" | "resumed" | "not_modified"
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _filename_for(task: DownloadTask) -> str:
+    if task.filename:
+        return task.filename
+    name = os.path.basename(unquote(urlsplit(task.url).path))
+    return name or f"{task.tj_code}_{task.year_month}.bin"
+
+
+class Fetcher:
+    """Baixa arquivos de remuneração em paralelo para data/raw/<TJ>/<YYYY-MM>/.
+
+    - uma `requests.Session` (pool de conexões) por host;
+    - um token bucket por host no lugar do `sleep` fixo de `http.get`;
+    - concorrência global limitada por `max_workers` e por TJ por `max_per_tj`;
+    - corpo gravado em streaming (`.part` + rename atômico), ou via `RawCache`
+      (requisições condicionais, retomada com Range e deduplicação por conteúdo).
+    """
+
+    def __init__(
+        self,
+        user_agent: str = "Mozilla/5.0",
+        timeout: int = 60,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        raw_root: str = "data/raw",
+        rate_per_host: float = 2.0,
+        burst: float | None = None,
+        max_workers: int = 8,
+        max_per_tj: int = 2,
+        chunk_size: int = 1 << 16,
+        cache: RawCache | None = None,
+    ):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.raw_root = raw_root
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.max_workers = max(1, int(max_workers))
+        self.max_per_tj = max(1, int(max_per_tj))
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._tj_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _host_state(self, url: str) -> tuple[requests.Session, TokenBucket]:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = make_session(
+                    self.user_agent, retries=self.retries, backoff_factor=self.backoff_factor,
+                    timeout=self.timeout, pool_maxsize=self.max_workers,
+                )
+                self._buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+            return self._sessions[host], self._buckets[host]
+
+    def _tj_slot(self, tj_code: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if tj_code not in self._tj_slots:
+                self._tj_slots[tj_code] = threading.BoundedSemaphore(self.max_per_tj)
+            return self._tj_slots[tj_code]
+
+    def destination(self, task: DownloadTask) -> str:
+        return os.path.join(self.raw_root, task.tj_code, task.year_month, _filename_for(task))
+
+    def download(self, task: DownloadTask) -> DownloadResult:
+        """Baixa uma tarefa esperando uma vaga do TJ (as mesmas que `fetch_all` usa)."""
+        with self._tj_slot(task.tj_code):
+            return self._download(task)
+
+    def _download(self, task: DownloadTask) -> DownloadResult:
+        dest = self.destination(task)
+        session, bucket = self._host_state(task.url)
+        tmp = dest + ".part"
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if self.cache is not None:
+                res = self.cache.fetch(session, task.url, dest, limiter=bucket, timeout=self.timeout)
+                return DownloadResult(task=task, path=dest, bytes=res.transferred, status=res.status)
+            written = 0
+            with get(session, task.url, timeout=self.timeout, limiter=bucket, stream=True) as resp:
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            written += len(chunk)
+            os.replace(tmp, dest)
+            return DownloadResult(task=task, path=dest, bytes=written)
+        except Exception as e:
+            # `.part` incompleto não é retomado (a retomada com Range é do `RawCache`)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return DownloadResult(task=task, error=f"{type(e).__name__}: {e}")
+
+    def fetch_all(self, tasks: Iterable[DownloadTask]) -> List[DownloadResult]:
+        """Baixa as tarefas em paralelo; resultados na ordem de `tasks`.
+
+        O despacho é feito por esta thread (como `src.utils.planner.Scheduler`): a cada vaga
+        sai a próxima tarefa cujo TJ ainda tem vaga (`max_per_tj`, tentada sem bloquear nos
+        mesmos semáforos de `download`), então nenhum worker fica parado esperando o TJ de
+        outra tarefa, qualquer que seja a ordem da lista.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        results: List[Optional[DownloadResult]] = [None] * len(tasks)
+        queue = list(range(len(tasks)))
+        running = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as pool:
+            while queue or running:
+                for i in list(queue):
+                    if len(running) >= self.max_workers:
+                        break
+                    if not self._tj_slot(tasks[i].tj_code).acquire(blocking=False):
+                        continue
+                    queue.remove(i)
+                    running[pool.submit(self._download, tasks[i])] = i
+                if not running:
+                    # todas as vagas dos TJs restantes com chamadas avulsas de `download`
+                    time.sleep(0.05)
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i = running.pop(fut)
+                    self._tj_slot(tasks[i].tj_code).release()
+                    results[i] = fut.result()
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import codecs
+import re
+from typing import Iterator, List, Optional
+
+import pandas as pd
+from lxml import etree
+
+from src.utils.ingest_local import (
+    _build_headers_from_rows,
+    _count_significant_headers,
+    _detect_header_row,
+)
+
+# Linhas do início de cada tabela usadas para decidir se é a tabela de remuneração
+PREVIEW_ROWS = 50
+BATCH_ROWS = 50_000
+SNIFF_BYTES = 64 * 1024
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.I)
+
+
+def _sniff_encoding(path) -> str:
+    """Charset declarado no <meta>; sem declaração, UTF-8 se o início decodificar, senão ISO-8859-1."""
+    if hasattr(path, "read"):
+        head = path.read(SNIFF_BYTES)
+        path.seek(0)
+    else:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8"
+    m = _CHARSET_RE.search(head)
+    if m:
+        declared = m.group(1).decode("ascii").lower()
+        try:
+            return "iso-8859-1" if codecs.lookup(declared).name == "iso8859-1" else declared
+        except LookupError:
+            pass  # charset inválido: decide pelo conteúdo
+    try:
+        # ignora um possível caractere multibyte cortado no fim da amostra
+        head.decode("utf-8") if len(head) < SNIFF_BYTES else head[:-4].decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "iso-8859-1"  # nome aceito pelo libxml2 ("latin-1" não é)
+
+
+def _cell_text(el) -> str:
+    return " ".join(" ".join(el.itertext()).split())
+
+
+def _row_cells(tr) -> tuple[List[str], bool]:
+    """Textos das células (expandindo colspan) e se a linha é toda de <th>."""
+    cells: List[str] = []
+    all_th = True
+    for el in tr:
+        tag = el.tag
+        if tag not in ("td", "th"):
+            continue
+        all_th = all_th and tag == "th"
+        try:
+            span = max(1, int(el.get("colspan", 1)))
+        except ValueError:
+            span = 1
+        cells.extend([_cell_text(el)] * span)
+    return cells, all_th and bool(cells)
+
+
+def _release(el) -> None:
+    # Mantém a memória constante: limpa o elemento e descarta irmãos já processados
+    el.clear()
+    parent = el.getparent()
+    if parent is not None:
+        while el.getprevious() is not None:
+            del parent[0]
+
+
+def _preview_frame(rows: List[List[str]]) -> pd.DataFrame:
+    width = max(len(r) for r in rows)
+    return pd.DataFrame([r + [""] * (width - len(r)) for r in rows])
+
+
+class _TableState:
+    def __init__(self):
+        self.preview: List[List[str]] = []
+        self.th_flags: List[bool] = []
+        self.headers: Optional[List[str]] = None
+        self.skip = False          # tabela descartada pela heurística
+        self.pending: List[List[str]] = []
+
+    def decide(self, force: bool = False) -> None:
+        """Escolhe a linha de cabeçalho com as mesmas heurísticas de `_read_excel_robust`."""
+        if self.headers is not None or self.skip or not self.preview:
+            return
+        preview = _preview_frame(self.preview)
+        hdr = _detect_header_row(preview)
+        if hdr is None:
+            if force:
+                hdr = 0
+            else:
+                self.skip = True
+                return
+        # linhas de <th> consecutivas formam cabeçalhos de vários níveis (até 3)
+        levels = 1
+        while levels < 3 and hdr + levels < len(self.th_flags) and self.th_flags[hdr + levels]:
+            levels += 1
+        headers = _build_headers_from_rows(preview, hdr, levels=levels)
+        if not force and _count_significant_headers(headers) < 3:
+            self.skip = True
+            return
+        self.headers = headers
+        self.pending = self.preview[hdr + levels:]
+        self.preview = []
+
+
+def _frame(rows: List[List[str]], headers: List[str], forced: bool = False) -> pd.DataFrame:
+    width = len(headers)
+    fixed = [(r + [""] * (width - len(r)))[:width] for r in rows]
+    df = pd.DataFrame(fixed, columns=headers).replace("", None)
+    df.attrs["reader_strategy"] = "html_first_table" if forced else "html_stream"
+    return df
+
+
+def iter_html_table_batches(path, batch_size: int = BATCH_ROWS, force_first: bool = False) -> Iterator[pd.DataFrame]:
+    """Lê a tabela de remuneração de um HTML em streaming (lxml iterparse).
+
+    A primeira tabela cujo cabeçalho passa pelas heurísticas de `_detect_header_row` é
+    emitida em lotes de até `batch_size` linhas; elementos já lidos são descartados, de
+    modo que a memória não cresce com o tamanho da página. Se nenhuma tabela passar,
+    relê o arquivo e usa a primeira tabela com a primeira linha como cabeçalho
+    (comportamento equivalente ao `pd.read_html(path)[0]` anterior).
+    """
+    encoding = _sniff_encoding(path)
+    stack: List[_TableState] = []
+    selected: Optional[_TableState] = None
+    emitted = False
+    seen_table = False
+    try:
+        events = etree.iterparse(path, events=("start", "end"), tag=("table", "tr"),
+                                 html=True, recover=True, encoding=encoding)
+    except LookupError:
+        # charset declarado desconhecido pelo libxml2: deixa o parser decidir
+        events = etree.iterparse(path, events=("start", "end"), tag=("table", "tr"), html=True, recover=True)
+    for event, el in events:
+        if el.tag == "table":
+            if event == "start":
+                stack.append(_TableState())
+                continue
+            state = stack.pop() if stack else None
+            if state is not None and selected is None:
+                state.decide(force=force_first and not seen_table)
+                if state.headers is not None:
+                    selected = state
+            seen_table = True
+            if selected is not None and selected is state:
+                if selected.pending:
+                    yield _frame(selected.pending, selected.headers, force_first)
+                    emitted = True
+                return
+            _release(el)
+            continue
+        if event != "end" or not stack:
+            continue
+        state = stack[-1]
+        if state.skip or (selected is not None and state is not selected):
+            _release(el)
+            continue
+        cells, all_th = _row_cells(el)
+        _release(el)
+        if not cells:
+            continue
+        if state.headers is None:
+            state.preview.append(cells)
+            state.th_flags.append(all_th)
+            if len(state.preview) >= PREVIEW_ROWS:
+                state.decide(force=force_first and not seen_table)
+                if state.headers is not None:
+                    selected = state
+            continue
+        state.pending.append(cells)
+        if len(state.pending) >= batch_size:
+            yield _frame(state.pending, state.headers, force_first)
+            emitted = True
+            state.pending = []
+    if not emitted and not force_first and selected is None:
+        yield from iter_html_table_batches(path, batch_size=batch_size, force_first=True)
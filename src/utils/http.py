@@ -1,10 +1,41 @@
 from __future__ import annotations
+import threading
 import time
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
 
-def make_session(user_agent: str, retries: int = 3, backoff_factor: float = 0.5, timeout: int = 60) -> requests.Session:
+class TokenBucket:
+    """Limitador de taxa (token bucket) seguro para uso entre threads.
+
+    `rate` tokens são repostos por segundo até `capacity`; cada requisição consome um token.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate deve ser positivo")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            # dorme fora do lock para não bloquear as demais threads
+            time.sleep(wait)
+
+
+def make_session(user_agent: str, retries: int = 3, backoff_factor: float = 0.5, timeout: int = 60,
+                 pool_maxsize: int = 10) -> requests.Session:
     session = requests.Session()
     session.headers.update({"User-Agent": user_agent})
     retry = Retry(
@@ -15,17 +46,27 @@ def make_session(user_agent: str, retries: int = 3, backoff_factor: float = 0.5,
         status_forcelist=(429, 500, 502, 503, 504),
         allowed_methods=("GET", "POST"),
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     session.request_timeout = timeout
     return session
 
 
-def get(session: requests.Session, url: str, timeout: int | None = None) -> requests.Response:
+def get(session: requests.Session, url: str, timeout: int | None = None,
+        limiter: TokenBucket | None = None, stream: bool = False,
+        headers: dict | None = None) -> requests.Response:
     t = timeout if timeout is not None else getattr(session, "request_timeout", 60)
-    resp = session.get(url, timeout=t)
-    resp.raise_for_status()
-    # respeitar politeness básica
-    time.sleep(0.5)
+    if limiter is not None:
+        limiter.acquire()
+    resp = session.get(url, timeout=t, stream=stream, headers=headers)
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        # com stream=True a conexão só volta ao pool depois de fechada
+        resp.close()
+        raise
+    if limiter is None:
+        # respeitar politeness básica (sem limitador de taxa explícito)
+        time.sleep(0.5)
     return resp
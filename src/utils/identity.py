@@ -0,0 +1,266 @@
+from __future__ import annotations
+import os
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.schemas import Columns
+
+IDENTITY_MAP_PATH = os.path.join("data", "processed", "identity_map.parquet")
+DEFAULT_THRESHOLD = 0.8
+# Blocos maiores que isto (nomes muito comuns) não são comparados par a par
+MAX_BLOCK = 200
+SIGNATURE_BITS = 256
+
+MAP_COLUMNS = ["tj_code", "name_key", "phon_key", "role_key", "person_id", "first_seen", "last_seen"]
+
+# Regras fonéticas simplificadas para nomes em português (aplicadas em ordem)
+_PHONETIC_RULES: List[Tuple[str, str]] = [
+    (r"ph", "f"), (r"th", "t"), (r"lh", "l"), (r"nh", "n"), (r"[cs]h", "x"),
+    (r"y", "i"), (r"w", "v"), (r"c(?=[ei])", "s"), (r"g(?=[ei])", "j"),
+    (r"qu(?=[ei])", "k"), (r"gu(?=[ei])", "g"), (r"q|c|k", "k"),
+    (r"z", "s"), (r"h", ""), (r"m\b", "n"),
+]
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def name_keys(names: pd.Series) -> pd.Series:
+    """Nome normalizado: sem acentos, minúsculo, só letras/dígitos e espaços simples."""
+    codes, uniques = pd.factorize(names.astype(object).fillna("").map(str))
+    u = (
+        pd.Series(uniques, dtype=object).str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore").str.decode("ascii")
+        .str.lower()
+        .str.replace(r"[^a-z0-9 ]+", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return pd.Series(u.to_numpy(dtype=object)[codes], index=names.index)
+
+
+def phonetic_keys(keys: pd.Series) -> pd.Series:
+    """Código fonético de cada token do nome (ex.: "luiz souza" e "luis sousa" -> "luis sousa")."""
+    s = keys.astype(object)
+    for pattern, repl in _PHONETIC_RULES:
+        s = s.str.replace(pattern, repl, regex=True)
+    # letras repetidas colapsadas ("rr", "ss", "ll")
+    return s.str.replace(r"(\w)\1+", r"\1", regex=True)
+
+
+def _prefix_keys(keys: pd.Series) -> pd.Series:
+    # prefixos de 3 letras do primeiro e do último token ("maria silva santos" -> "mar|san")
+    first = keys.str.extract(r"^(\S{1,3})", expand=False).fillna("")
+    last = keys.str.extract(r"(\S{1,3})\S*$", expand=False).fillna("")
+    return first + "|" + last
+
+
+def signatures(keys: pd.Series) -> np.ndarray:
+    """Trigramas de cada nome espalhados (hash) num vetor de `SIGNATURE_BITS` bits, em lote.
+
+    Os nomes (já ASCII, ver `name_keys`) viram uma matriz de bytes; cada posição gera o
+    código do trigrama e o bit correspondente, sem laço por nome.
+    """
+    n = len(keys)
+    padded = ("  " + keys.astype(str) + " ").to_numpy(dtype=str)
+    width = max(int(pd.Series(padded).str.len().max() or 0), 3)
+    chars = np.frombuffer(padded.astype(f"S{width}").tobytes(), dtype=np.uint8).reshape(n, width).astype(np.uint32)
+    codes = (chars[:, :-2] << 16) | (chars[:, 1:-1] << 8) | chars[:, 2:]
+    valid = chars[:, 2:] != 0  # trigramas além do fim do nome (preenchimento com zeros)
+    bits = ((codes * np.uint32(2654435761)) >> np.uint32(24)) % SIGNATURE_BITS
+    dense = np.zeros((n, SIGNATURE_BITS), dtype=bool)
+    rows = np.broadcast_to(np.arange(n)[:, None], bits.shape)
+    dense[rows[valid], bits[valid]] = True
+    return np.packbits(dense, axis=1)
+
+
+def _popcount(a: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(a.view(np.uint64)).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[a].sum(axis=1, dtype=np.int64)
+
+
+def jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> np.ndarray:
+    """Similaridade de Jaccard aproximada entre as assinaturas linha a linha (vetorizada)."""
+    inter = _popcount(sig_a & sig_b)
+    union = _popcount(sig_a | sig_b)
+    return np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+class IdentityResolver:
+    """Une variações de grafia do mesmo servidor (entre meses e arquivos) num único `server_id`.
+
+    Mantém em `map_path` a tabela (TJ, nome normalizado) -> pessoa, atualizada a cada
+    execução. Nomes já vistos (após normalização de acentos, caixa e espaços) são
+    resolvidos por junção; os novos são comparados apenas dentro de blocos (código
+    fonético do nome; cargo + prefixos do primeiro/último nome), com similaridade de
+    trigramas calculada em lote. Sem par acima de `threshold`, o nome vira uma nova
+    pessoa com o `server_id` que o extrator já havia calculado.
+    """
+
+    def __init__(self, map_path: str = IDENTITY_MAP_PATH, threshold: float = DEFAULT_THRESHOLD):
+        self.map_path = map_path
+        self.threshold = threshold
+        self.map = self._load()
+        self.dirty = False
+
+    def _load(self) -> pd.DataFrame:
+        if self.map_path and os.path.exists(self.map_path):
+            return pd.read_parquet(self.map_path, columns=MAP_COLUMNS)
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in MAP_COLUMNS})
+
+    def save(self) -> None:
+        if not self.dirty or not self.map_path:
+            return
+        os.makedirs(os.path.dirname(self.map_path) or ".", exist_ok=True)
+        tmp = self.map_path + ".tmp"
+        self.map.to_parquet(tmp, index=False)
+        os.replace(tmp, self.map_path)
+        self.dirty = False
+
+    @staticmethod
+    def _candidate_pairs(pool: pd.DataFrame, n_new: int) -> pd.DataFrame:
+        # pares (novo, candidato) que compartilham alguma chave de bloco; blocos grandes são ignorados
+        pairs = []
+        for key in ("phon_key", "block"):
+            code = pool.groupby(["tj_code", key], sort=False).ngroup().to_numpy()
+            size = np.bincount(code)[code]
+            keep = (size > 1) & (size <= MAX_BLOCK)
+            rows = np.flatnonzero(keep)
+            cand = pd.DataFrame({"code": code[rows], "j": rows})
+            new = cand[cand["j"] < n_new].rename(columns={"j": "i"})
+            pairs.append(new.merge(cand, on="code")[["i", "j"]])
+        out = pd.concat(pairs, ignore_index=True).drop_duplicates()
+        # par entre dois nomes novos aparece nos dois sentidos: fica um só
+        return out[(out["j"] >= n_new) | (out["i"] < out["j"])].reset_index(drop=True)
+
+    def resolve(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Reescreve `server_id` de `df` com a pessoa resolvida e atualiza o mapa em memória."""
+        if df.empty:
+            return df
+        keys = name_keys(df[Columns.server_name])
+        roles = name_keys(df[Columns.role])
+        obs = pd.DataFrame({
+            "tj_code": df[Columns.tj_code].astype(object).to_numpy(),
+            "name_key": keys.to_numpy(),
+            "role_key": roles.to_numpy(),
+            "server_id": df[Columns.server_id].astype(object).to_numpy(),
+            "year_month": df[Columns.year_month].astype(object).to_numpy(),
+        })
+        obs = obs[obs["name_key"] != ""]
+        # um registro por (TJ, nome normalizado): cargo e id da primeira ocorrência, meses extremos
+        uniq = obs.sort_values("year_month", kind="stable").groupby(["tj_code", "name_key"], sort=False).agg(
+            role_key=("role_key", "first"), server_id=("server_id", "first"),
+            first_seen=("year_month", "first"), last_seen=("year_month", "last"),
+        ).reset_index()
+
+        known = uniq.merge(self.map[["tj_code", "name_key", "person_id"]], on=["tj_code", "name_key"], how="left")
+        new = known[known["person_id"].isna()].drop(columns=["person_id"]).reset_index(drop=True)
+        if not new.empty:
+            months = obs[["tj_code", "name_key", "year_month"]].drop_duplicates()
+            new["person_id"] = self._match_new(new, months)
+            new["person_id"] = self._split_same_month(new, known, months)
+            self.map = pd.concat([self.map, new[MAP_COLUMNS]], ignore_index=True)
+            self.dirty = True
+        # atualiza a faixa de meses das pessoas já conhecidas
+        seen = known[known["person_id"].notna()]
+        if not seen.empty:
+            idx = self.map.set_index(["tj_code", "name_key"]).index
+            pos = idx.get_indexer(pd.MultiIndex.from_frame(seen[["tj_code", "name_key"]]))
+            first = self.map.loc[pos, "first_seen"].astype(str).to_numpy()
+            last = self.map.loc[pos, "last_seen"].astype(str).to_numpy()
+            seen_first, seen_last = seen["first_seen"].astype(str).to_numpy(), seen["last_seen"].astype(str).to_numpy()
+            self.map.loc[pos, "first_seen"] = np.where(seen_first < first, seen_first, first)
+            self.map.loc[pos, "last_seen"] = np.where(seen_last > last, seen_last, last)
+            self.dirty = True
+
+        lookup = self.map.set_index(["tj_code", "name_key"])["person_id"]
+        pos = lookup.index.get_indexer(pd.MultiIndex.from_arrays([df[Columns.tj_code].astype(object).to_numpy(),
+                                                                  keys.to_numpy()]))
+        resolved = np.where(pos >= 0, lookup.to_numpy()[np.maximum(pos, 0)],
+                            df[Columns.server_id].astype(object).to_numpy())
+        return df.assign(**{Columns.server_id: resolved})
+
+    @staticmethod
+    def _split_same_month(new: pd.DataFrame, known: pd.DataFrame, months: pd.DataFrame) -> np.ndarray:
+        # uniões transitivas podem pôr dois nomes do mesmo mês na mesma pessoa: o nome novo
+        # excedente volta ao próprio `server_id` (nomes já mapeados têm prioridade)
+        names = pd.concat([known.loc[known["person_id"].notna(), ["tj_code", "name_key", "person_id"]].assign(new=-1),
+                           new[["tj_code", "name_key", "person_id"]].assign(new=np.arange(len(new)))],
+                          ignore_index=True)
+        seen = months.merge(names, on=["tj_code", "name_key"]).sort_values("new", kind="stable")
+        clash = seen[seen.duplicated(["tj_code", "year_month", "person_id"])]
+        out = new["person_id"].to_numpy(dtype=object).copy()
+        rows = clash.loc[clash["new"] >= 0, "new"].unique()
+        out[rows] = new["server_id"].to_numpy(dtype=object)[rows]
+        return out
+
+    @staticmethod
+    def _same_month(pairs: pd.DataFrame, pool: pd.DataFrame, months: pd.DataFrame) -> np.ndarray:
+        # dois nomes presentes no mesmo mês do mesmo TJ são pessoas distintas (homônimos parciais)
+        pos = pd.MultiIndex.from_frame(pool[["tj_code", "name_key"]]).get_indexer(
+            pd.MultiIndex.from_frame(months[["tj_code", "name_key"]]))
+        seen = pd.DataFrame({"node": pos, "ym": pd.factorize(months["year_month"])[0]})[pos >= 0]
+        indexed = pairs.assign(pair=np.arange(len(pairs)))
+        a = indexed[["pair", "i"]].merge(seen.rename(columns={"node": "i"}), on="i")
+        b = indexed[["pair", "j"]].merge(seen.rename(columns={"node": "j"}), on="j")
+        both = a[["pair", "ym"]].merge(b[["pair", "ym"]], on=["pair", "ym"])
+        out = np.zeros(len(pairs), dtype=bool)
+        out[both["pair"].to_numpy()] = True
+        return out
+
+    def _match_new(self, new: pd.DataFrame, months: pd.DataFrame) -> np.ndarray:
+        """person_id de cada nome novo: pessoa existente mais parecida, ou grupo de nomes novos."""
+        n_new = len(new)
+        # candidatos: nomes novos + mapa dos mesmos TJs
+        existing = self.map[self.map["tj_code"].isin(new["tj_code"].unique())]
+        new["phon_key"] = phonetic_keys(new["name_key"])
+        pool = pd.concat([new[["tj_code", "name_key", "phon_key", "role_key"]],
+                          existing[["tj_code", "name_key", "phon_key", "role_key"]]], ignore_index=True)
+        pool["block"] = pool["role_key"] + "|" + _prefix_keys(pool["name_key"])
+        ids = np.concatenate([new["server_id"].to_numpy(dtype=object), existing["person_id"].to_numpy(dtype=object)])
+        out = ids[:n_new].copy()
+
+        pairs = self._candidate_pairs(pool, n_new)
+        if pairs.empty:
+            return out
+        i, j = pairs["i"].to_numpy(), pairs["j"].to_numpy()
+        # assinaturas só dos nomes que aparecem em algum par
+        involved = np.unique(np.concatenate([i, j]))
+        score = np.zeros(len(pairs))
+        # maior similaridade entre grafia e pronúncia ("sousa"/"souza", "felipe"/"phelipe")
+        for col in ("name_key", "phon_key"):
+            sig = np.zeros((len(pool), SIGNATURE_BITS // 8), dtype=np.uint8)
+            sig[involved] = signatures(pool[col].iloc[involved])
+            score = np.maximum(score, jaccard(sig[i], sig[j]))
+        accepted = pairs[(score >= self.threshold) & ~self._same_month(pairs, pool, months)]
+        if accepted.empty:
+            return out
+        uf = _UnionFind(len(pool))
+        for a, b in zip(accepted["i"].tolist(), accepted["j"].tolist()):
+            uf.union(a, b)
+        # cada grupo fica com o id de uma pessoa já mapeada, se houver; senão, o do primeiro nome novo
+        nodes = np.unique(accepted[["i", "j"]].to_numpy())
+        comp = pd.DataFrame({"node": nodes, "root": [uf.find(x) for x in nodes.tolist()]})
+        comp["id"] = ids[comp["node"].to_numpy()]
+        mapped = comp[comp["node"] >= n_new].drop_duplicates("root").set_index("root")["id"]
+        comp["id"] = comp["root"].map(mapped).fillna(pd.Series(ids[comp["root"].to_numpy()], index=comp.index))
+        comp = comp[comp["node"] < n_new]
+        out[comp["node"].to_numpy()] = comp["id"].to_numpy()
+        return out
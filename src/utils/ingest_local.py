@@ -1,10 +1,20 @@
 from __future__ import annotations
+import io
+import json
 import os
+import time
+from contextlib import contextmanager
+from functools import partial
 import pandas as pd
-from typing import List, Dict
+from typing import Iterator, List, Dict
 
 from src.schemas import Columns, UNIFIED_COLUMNS
-from src.utils.parsing import to_float
+from src.utils.archives import CACHE_DIR as ARCHIVE_CACHE_DIR, ArchiveCache, archive_ext, read_archive
+from src.utils.dedup import SOURCE_RANK_COLUMN
+from src.utils.instrumentation import profile_scope, record_file, stage
+from src.utils.parse_cache import CACHE_DIR as PARSE_CACHE_DIR, CACHEABLE_EXTS, ParseCache
+from src.utils.parsing import to_float_series
+from src.utils.rubrics import RUBRIC_PREFIX, is_rubric_column
 
 # Mapeamento simples de possíveis nomes de colunas -> esquema unificado
 COLUMN_CANDIDATES: Dict[str, List[str]] = {
@@ -45,25 +55,67 @@ COLUMN_CANDIDATES: Dict[str, List[str]] = {
     ],
 }
 
-READERS = {
-    ".json": pd.read_json,
-}
+# Coluna auxiliar (fora do esquema unificado) usada para derivar server_id
+MATRICULA_COLUMN = "matricula"
+MATRICULA_CANDIDATES: List[str] = ["matricula", "matrícula", "matr."]
 
+# source_format do catálogo -> extensões lidas na pasta do mês
+FORMAT_EXTENSIONS: Dict[str, List[str]] = {
+    "csv": [".csv", ".txt"],
+    "xlsx": [".xlsx"],
+    "json": [".json"],
+    "html": [".html", ".htm"],
+}
+SUPPORTED_EXTS: List[str] = [e for exts in FORMAT_EXTENSIONS.values() for e in exts]
 
 def _guess_column(df: pd.DataFrame, candidates: List[str]) -> str | None:
-    cols_norm = {c: c.strip().lower() for c in df.columns}
+    return _guess_column_name(list(df.columns), candidates)
+
+
+def _guess_column_name(columns: List[str], candidates: List[str]) -> str | None:
+    cols_norm = {c: c.strip().lower() for c in columns}
     # tentativa por igualdade direta
-    for c in df.columns:
+    for c in columns:
         if cols_norm[c] in candidates:
             return c
     # tentativa por "contém"
-    for c in df.columns:
+    for c in columns:
         lc = cols_norm[c]
         if any(tok in lc for tok in candidates):
             return c
     return None
 
 
+def _matching_columns(columns: List[str], candidates: List[str]) -> List[str]:
+    """Todas as colunas que casariam com os candidatos (igualdade ou "contém")."""
+    return [c for c in columns if any(tok in c.strip().lower() for tok in candidates)]
+
+
+def _field_candidates(field: str, column_overrides: Dict[str, List[str]] | None = None) -> List[List[str]]:
+    # nomes do catálogo (column_overrides) têm precedência sobre os candidatos padrão
+    overrides = column_overrides or {}
+    defaults = MATRICULA_CANDIDATES if field == MATRICULA_COLUMN else COLUMN_CANDIDATES.get(field, [])
+    groups = [[c.lower() for c in overrides[field]]] if overrides.get(field) else []
+    return groups + [[c.lower() for c in defaults]]
+
+
+def _resolve_columns(
+    columns: List[str],
+    column_overrides: Dict[str, List[str]] | None = None,
+    fields: List[str] | None = None,
+) -> Dict[str, str | None]:
+    """Coluna de origem escolhida para cada campo unificado (None quando não há)."""
+    resolved: Dict[str, str | None] = {}
+    for field in fields if fields is not None else list(COLUMN_CANDIDATES):
+        found = None
+        for candidates in _field_candidates(field, column_overrides):
+            found = _guess_column_name(columns, candidates)
+            if found is not None:
+                break
+        resolved[field] = found
+    return resolved
+
+
 def _should_use_two_line_header(df: pd.DataFrame) -> bool:
     cols = [str(c).strip().lower() for c in df.columns]
     unnamed = sum(1 for c in cols if c.startswith("unnamed") or c == "")
@@ -76,101 +128,155 @@ def _normalize_headers(df: pd.DataFrame) -> pd.DataFrame:
     # Achata MultiIndex e normaliza espaços/virgulas
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = [" ".join([str(p) for p in tup if str(p) != "nan"]).strip() for tup in df.columns.to_list()]
-    df.columns = [str(c).strip().replace(",", "").replace("  ", " ") for c in df.columns]
+    df.columns = _normalize_header_names(df.columns)
+    return df
+
+
+def _normalize_header_names(columns) -> List[str]:
+    return [str(c).strip().replace(",", "").replace("  ", " ") for c in columns]
+
+
+# Palavras que indicam a linha de cabeçalho de uma tabela de remuneração
+HEADER_KEYWORDS: List[str] = [
+    "nome", "servidor", "cargo", "funcao", "função", "lotacao", "lotação",
+    "total de creditos", "total de créditos", "liquido", "líquido", "descontos",
+]
+
+
+def _detect_header_row(df_preview: pd.DataFrame) -> int | None:
+    # Procura até 200 linhas por uma que contenha cabeçalhos-alvo e muitas células não vazias
+    max_rows = min(len(df_preview), 200)
+    best_row = None
+    best_score = -1
+    for r in range(max_rows):
+        vals = df_preview.iloc[r].to_list()
+        row_vals = [str(v).strip().lower() for v in vals]
+        keyword_score = sum(1 for v in row_vals if any(k in v for k in HEADER_KEYWORDS))
+        nonempty = sum(1 for v in row_vals if v not in ("", "nan", "none"))
+        score = keyword_score * 10 + nonempty
+        if score > best_score:
+            best_score = score
+            best_row = r
+    # considera válido se ao menos alguma palavra-chave foi encontrada e há colunas suficientes
+    if best_row is not None and best_score >= 15:
+        return best_row
+    return None
+
+
+def _build_headers_from_rows(df_preview: pd.DataFrame, start_row: int, levels: int = 3) -> list[str]:
+    hdr_block = df_preview.iloc[start_row:start_row+levels].fillna("")
+    # Converte para strings normalizadas
+    parts = hdr_block.map(lambda x: str(x).strip())
+    # Forward-fill horizontalmente nomes vazios quando níveis superiores existem
+    arr = parts.to_numpy(dtype=object)
+    # Ffill vertical entre níveis para mesclas (se nível inferior vazio, herda do superior)
+    for r in range(1, arr.shape[0]):
+        for c in range(arr.shape[1]):
+            if arr[r, c] == "" and arr[r-1, c] != "":
+                arr[r, c] = arr[r-1, c]
+    # Construir nome final por coluna juntando níveis distintos
+    headers = []
+    for c in range(arr.shape[1]):
+        parts_c = [str(arr[r, c]).strip() for r in range(arr.shape[0]) if str(arr[r, c]).strip() not in ("", "nan")]
+        name = " ".join(dict.fromkeys(parts_c))  # remove repetições mantendo ordem
+        name = name.replace(",", "").replace("  ", " ")
+        headers.append(name if name != "" else f"col_{c}")
+    return headers
+
+
+def _count_significant_headers(headers: List[str]) -> int:
+    return sum(1 for h in headers if any(k in str(h).lower() for k in HEADER_KEYWORDS))
+
+
+# df.attrs[READER_STRATEGY]: qual tentativa/fallback de leitura produziu o DataFrame
+READER_STRATEGY = "reader_strategy"
+
+
+def _tag(df: pd.DataFrame, strategy: str) -> pd.DataFrame:
+    df.attrs[READER_STRATEGY] = strategy
     return df
 
 
-def _read_excel_robust(path: str) -> pd.DataFrame:
+def _rewind(src) -> None:
+    # leitores aceitam caminho ou fluxo binário (membro de ZIP/GZ); cada tentativa relê do início
+    if hasattr(src, "seek"):
+        src.seek(0)
+
+
+def _read_csv(src, **kwargs) -> pd.DataFrame:
+    _rewind(src)
+    return pd.read_csv(src, **kwargs)
+
+
+def _read_excel(src, **kwargs):
+    _rewind(src)
+    return pd.read_excel(src, **kwargs)
+
+
+@contextmanager
+def _open_text(src, encoding: str):
+    if not hasattr(src, "read"):
+        with open(src, "r", encoding=encoding, errors="ignore") as f:
+            yield f
+        return
+    _rewind(src)
+    f = io.TextIOWrapper(src, encoding=encoding, errors="ignore")
+    try:
+        yield f
+    finally:
+        f.detach()
+
+
+def _read_excel_robust(path) -> pd.DataFrame:
     # Tenta leitura esperta varrendo abas e detectando linha de cabeçalho
+    if hasattr(path, "read"):
+        # XLSX exige acesso aleatório: membro compactado é lido uma vez para a memória
+        _rewind(path)
+        path = io.BytesIO(path.read())
     try:
         xls = pd.ExcelFile(path)
         sheet_names = xls.sheet_names
     except Exception:
         sheet_names = [None]
 
-    header_keywords = [
-        "nome", "servidor", "cargo", "funcao", "função", "lotacao", "lotação",
-        "total de creditos", "total de créditos", "liquido", "líquido", "descontos",
-    ]
-
-    def detect_header_row(df_preview: pd.DataFrame) -> int | None:
-        # Procura até 200 linhas por uma que contenha cabeçalhos-alvo e muitas células não vazias
-        max_rows = min(len(df_preview), 200)
-        best_row = None
-        best_score = -1
-        for r in range(max_rows):
-            vals = df_preview.iloc[r].to_list()
-            row_vals = [str(v).strip().lower() for v in vals]
-            keyword_score = sum(1 for v in row_vals if any(k in v for k in header_keywords))
-            nonempty = sum(1 for v in row_vals if v not in ("", "nan", "none"))
-            score = keyword_score * 10 + nonempty
-            if score > best_score:
-                best_score = score
-                best_row = r
-        # considera válido se ao menos alguma palavra-chave foi encontrada e há colunas suficientes
-        if best_row is not None and best_score >= 15:
-            return best_row
-        return None
-
-    def build_headers_from_rows(df_preview: pd.DataFrame, start_row: int, levels: int = 3) -> list[str]:
-        import numpy as np
-        hdr_block = df_preview.iloc[start_row:start_row+levels].fillna("")
-        # Converte para strings normalizadas
-        parts = hdr_block.applymap(lambda x: str(x).strip())
-        # Forward-fill horizontalmente nomes vazios quando níveis superiores existem
-        arr = parts.to_numpy(dtype=object)
-        # Ffill vertical entre níveis para mesclas (se nível inferior vazio, herda do superior)
-        for r in range(1, arr.shape[0]):
-            for c in range(arr.shape[1]):
-                if arr[r, c] == "" and arr[r-1, c] != "":
-                    arr[r, c] = arr[r-1, c]
-        # Construir nome final por coluna juntando níveis distintos
-        headers = []
-        for c in range(arr.shape[1]):
-            parts_c = [str(arr[r, c]).strip() for r in range(arr.shape[0]) if str(arr[r, c]).strip() not in ("", "nan")]
-            name = " ".join(dict.fromkeys(parts_c))  # remove repetições mantendo ordem
-            name = name.replace(",", "").replace("  ", " ")
-            headers.append(name if name != "" else f"col_{c}")
-        return headers
-
     for sheet in sheet_names:
         try:
             # prévia sem cabeçalho para detectar linha de header
-            preview = pd.read_excel(path, sheet_name=sheet, header=None)
+            preview = _read_excel(path, sheet_name=sheet, header=None)
             if not isinstance(preview, pd.DataFrame) or preview.empty:
                 continue
-            hdr = detect_header_row(preview)
+            hdr = _detect_header_row(preview)
             if hdr is not None:
                 # Tenta construir cabeçalho com até 3 linhas
-                headers = build_headers_from_rows(preview, hdr, levels=3)
+                headers = _build_headers_from_rows(preview, hdr, levels=3)
                 data = preview.iloc[hdr+1:].copy()
                 data.columns = headers[:data.shape[1]]
                 # Remove colunas completamente vazias
                 data = data.dropna(axis=1, how="all")
                 # Heurística: deve ter ao menos 3 colunas nomeadas significativas
-                sig = sum(1 for h in data.columns if any(k in h.lower() for k in header_keywords))
+                sig = _count_significant_headers(list(data.columns))
                 if sig >= 3 and data.shape[1] > 3:
-                    return _normalize_headers(data)
+                    return _tag(_normalize_headers(data), "xlsx_header_scan")
                 # fallback: tentar ler com header=hdr diretamente
                 try:
-                    df = pd.read_excel(path, sheet_name=sheet, header=hdr)
+                    df = _read_excel(path, sheet_name=sheet, header=hdr)
                     if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-                        return _normalize_headers(df)
+                        return _tag(_normalize_headers(df), "xlsx_header_row")
                 except Exception:
                     pass
             # fallback: tentar header=[0,1]
             try:
-                df2 = pd.read_excel(path, sheet_name=sheet, header=[0,1])
+                df2 = _read_excel(path, sheet_name=sheet, header=[0,1])
                 if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
-                    return _normalize_headers(df2)
+                    return _tag(_normalize_headers(df2), "xlsx_two_line")
             except Exception:
                 pass
             # fallback: tentar pular algumas linhas
             for skip in (1,2,3,4,5,6,7,8,9,10):
                 try:
-                    df3 = pd.read_excel(path, sheet_name=sheet, skiprows=skip)
+                    df3 = _read_excel(path, sheet_name=sheet, skiprows=skip)
                     if isinstance(df3, pd.DataFrame) and df3.shape[1] > 1:
-                        return _normalize_headers(df3)
+                        return _tag(_normalize_headers(df3), f"xlsx_skiprows_{skip}")
                 except Exception:
                     continue
         except Exception:
@@ -178,16 +284,27 @@ def _read_excel_robust(path: str) -> pd.DataFrame:
 
     # tentativas mais simples sem sheet_name
     try:
-        df = pd.read_excel(path)
+        df = _read_excel(path)
         if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-            return _normalize_headers(df)
+            return _tag(_normalize_headers(df), "xlsx_default")
     except Exception:
         pass
     return pd.DataFrame()
 
 
-def _map_columns(df: pd.DataFrame, tj_code: str, year_month: str) -> pd.DataFrame:
+def _map_columns(
+    df: pd.DataFrame,
+    tj_code: str,
+    year_month: str,
+    column_overrides: Dict[str, List[str]] | None = None,
+    with_matricula: bool = False,
+    with_rubrics: bool = False,
+) -> pd.DataFrame:
     df = _normalize_headers(df)
+    # leitores podem devolver índices deslocados (ex.: linhas acima do cabeçalho no XLSX)
+    df = df.reset_index(drop=True)
+    fields = list(COLUMN_CANDIDATES) + ([MATRICULA_COLUMN] if with_matricula else [])
+    resolved = _resolve_columns(list(df.columns), column_overrides, fields)
     out = pd.DataFrame()
     out[Columns.tj_code] = [tj_code] * len(df)
     out[Columns.year_month] = [year_month] * len(df)
@@ -197,8 +314,7 @@ def _map_columns(df: pd.DataFrame, tj_code: str, year_month: str) -> pd.DataFram
     
     # tentativa de mapear campos
     def get_series(col_key: str):
-        candidates = [s.lower() for s in COLUMN_CANDIDATES.get(col_key, [])]
-        found = _guess_column(df, candidates)
+        found = resolved.get(col_key)
         if found is not None:
             return df[found]
         return pd.Series([None] * len(df))
@@ -209,76 +325,115 @@ def _map_columns(df: pd.DataFrame, tj_code: str, year_month: str) -> pd.DataFram
     out[Columns.bond_type] = get_series(Columns.bond_type)
 
     # valores numéricos (tratando formatação PT-BR)
+    # células vazias/ilegíveis ficam NaN até `validate_unified`, que as conta e zera; campo
+    # sem coluna de origem já é 0.0
     for num_col in [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]:
-        s = get_series(num_col)
-        out[num_col] = s.apply(to_float)
+        found = resolved.get(num_col)
+        out[num_col] = to_float_series(df[found], keep_nulls=True) if found is not None else 0.0
 
     # garantir todas as colunas do esquema
     for c in UNIFIED_COLUMNS:
         if c not in out.columns:
             out[c] = None
 
-    return out[UNIFIED_COLUMNS]
-
-
-def _read_csv_robust(path: str) -> pd.DataFrame:
+    extra = [MATRICULA_COLUMN] if with_matricula else []
+    if with_matricula:
+        out[MATRICULA_COLUMN] = get_series(MATRICULA_COLUMN)
+    if with_rubrics:
+        # demais colunas de valor (indenizações, auxílios, descontos...): `rubric:<cabeçalho>`,
+        # separadas em formato longo depois do id e da deduplicação (ver `src.utils.rubrics`)
+        used = {c for c in resolved.values() if c is not None}
+        rubrics = {}
+        for i, name in enumerate(df.columns):
+            key = RUBRIC_PREFIX + name
+            if name in used or key in rubrics or not name:
+                continue
+            s = df.iloc[:, i]
+            if is_rubric_column(s):
+                rubrics[key] = to_float_series(s).to_numpy()
+        if rubrics:
+            out = pd.concat([out, pd.DataFrame(rubrics, index=out.index)], axis=1)
+            extra += list(rubrics)
+    return out[UNIFIED_COLUMNS + extra]
+
+
+def _read_csv_robust(path, header_strategy: str = "auto") -> pd.DataFrame:
+    # header_strategy: "auto" (detecta cabeçalho em duas linhas), "two_line" ou "single"
+    if header_strategy == "two_line":
+        df2 = _read_csv_two_line_header(path)
+        if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
+            return _tag(df2, "csv_two_line")
+    detect_two_line = header_strategy == "auto"
     # Tentativas: inferir separador, diferentes encodings e fallback explícito para ';'
     # 1) inferir separador (Sniffer) + utf-8
     try:
-        df = pd.read_csv(path, sep=None, engine="python", encoding="utf-8")
+        df = _read_csv(path, sep=None, engine="python", encoding="utf-8")
         if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-            if _should_use_two_line_header(df):
+            if detect_two_line and _should_use_two_line_header(df):
                 df2 = _read_csv_two_line_header(path)
                 if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
-                    return df2
-            return df
+                    return _tag(df2, "csv_two_line")
+            return _tag(df, "csv_sniff_utf8")
     except Exception:
         pass
     # 2) inferir separador + latin-1
     try:
-        df = pd.read_csv(path, sep=None, engine="python", encoding="latin-1")
+        df = _read_csv(path, sep=None, engine="python", encoding="latin-1")
         if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-            if _should_use_two_line_header(df):
+            if detect_two_line and _should_use_two_line_header(df):
                 df2 = _read_csv_two_line_header(path)
                 if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
-                    return df2
-            return df
+                    return _tag(df2, "csv_two_line")
+            return _tag(df, "csv_sniff_latin1")
     except Exception:
         pass
     # 3) separador ';' + utf-8
     try:
-        df = pd.read_csv(path, sep=";", encoding="utf-8")
+        df = _read_csv(path, sep=";", encoding="utf-8")
         if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-            if _should_use_two_line_header(df):
+            if detect_two_line and _should_use_two_line_header(df):
                 df2 = _read_csv_two_line_header(path)
                 if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
-                    return df2
-            return df
+                    return _tag(df2, "csv_two_line")
+            return _tag(df, "csv_semicolon_utf8")
     except Exception:
         pass
     # 4) separador ';' + latin-1
     try:
-        df = pd.read_csv(path, sep=";", encoding="latin-1")
+        df = _read_csv(path, sep=";", encoding="latin-1")
         if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
-            if _should_use_two_line_header(df):
+            if detect_two_line and _should_use_two_line_header(df):
                 df2 = _read_csv_two_line_header(path)
                 if isinstance(df2, pd.DataFrame) and df2.shape[1] > 1:
-                    return df2
-            return df
+                    return _tag(df2, "csv_two_line")
+            return _tag(df, "csv_semicolon_latin1")
     except Exception:
         pass
     # 5) fallback: tenta construir cabeçalho com as duas primeiras linhas (usado em alguns CSVs do TJRS)
     df2 = _read_csv_two_line_header(path)
-    return df2 if isinstance(df2, pd.DataFrame) else pd.DataFrame()
+    return _tag(df2, "csv_two_line") if isinstance(df2, pd.DataFrame) else pd.DataFrame()
+
+
+def _combine_two_header_rows(row1: List[str], row2: List[str]) -> List[str]:
+    headers = []
+    max_len = max(len(row1), len(row2))
+    for i in range(max_len):
+        p1 = (row1[i] if i < len(row1) else "").strip()
+        p2 = (row2[i] if i < len(row2) else "").strip()
+        name = (p1 + " " + p2).strip()
+        # normalizações simples
+        name = name.replace(",", "").replace("  ", " ")
+        headers.append(name if name != "" else f"col_{i}")
+    return headers
 
 
-def _read_csv_two_line_header(path: str) -> pd.DataFrame | None:
+def _read_csv_two_line_header(path) -> pd.DataFrame | None:
     import csv
     # Tenta ler primeiras 2 linhas manualmente para montar cabeçalho
     for enc in ("utf-8", "latin-1"):
         try:
             # Detecta delimitador simples por contagem de separadores prováveis
-            with open(path, "r", encoding=enc, errors="ignore") as f:
+            with _open_text(path, enc) as f:
                 head = f.readline()
             if not head:
                 continue
@@ -286,23 +441,15 @@ def _read_csv_two_line_header(path: str) -> pd.DataFrame | None:
             comma = head.count(",")
             delim = ";" if semi >= comma else ","
 
-            with open(path, "r", encoding=enc, errors="ignore") as f:
+            with _open_text(path, enc) as f:
                 reader = csv.reader(f, delimiter=delim)
                 row1 = next(reader, None)
                 row2 = next(reader, None)
             if not row1 or not row2:
                 continue
-            headers = []
-            max_len = max(len(row1), len(row2))
-            for i in range(max_len):
-                p1 = (row1[i] if i < len(row1) else "").strip()
-                p2 = (row2[i] if i < len(row2) else "").strip()
-                name = (p1 + " " + p2).strip()
-                # normalizações simples
-                name = name.replace(",", "").replace("  ", " ")
-                headers.append(name if name != "" else f"col_{i}")
+            headers = _combine_two_header_rows(row1, row2)
             # Lê o restante com esses nomes
-            df = pd.read_csv(path, sep=delim, encoding=enc, header=None, skiprows=2, names=headers)
+            df = _read_csv(path, sep=delim, encoding=enc, header=None, skiprows=2, names=headers)
             if isinstance(df, pd.DataFrame) and df.shape[1] > 1:
                 return df
         except Exception:
@@ -310,55 +457,182 @@ def _read_csv_two_line_header(path: str) -> pd.DataFrame | None:
     return None
 
 
-def load_month_data(tj_code: str, year_month: str, raw_root: str = "data/raw") -> pd.DataFrame:
+def _read_robust(path, ext: str, header_strategy: str = "auto") -> pd.DataFrame:
+    if ext == ".xlsx":
+        return _read_excel_robust(path)
+    # leitura robusta para CSV/TXT
+    return _read_csv_robust(path, header_strategy=header_strategy)
+
+
+def _read_raw_frames(path, ext: str, header_strategy: str = "auto",
+                     parse_cache: ParseCache | None = None) -> Iterator[pd.DataFrame]:
+    """Lê um arquivo bruto (caminho ou fluxo binário); JSON e HTML produzem vários lotes.
+
+    Com `parse_cache`, CSV/TXT/XLSX soltos vêm do cache quando o conteúdo já foi lido.
+    """
+    if ext in CACHEABLE_EXTS:
+        if parse_cache is None or hasattr(path, "read"):
+            # membros de ZIP/GZ: o resultado mapeado do arquivo inteiro fica no `ArchiveCache`
+            yield _read_robust(path, ext, header_strategy)
+            return
+        with profile_scope("hash"):
+            key = parse_cache.key(path, header_strategy)
+        df = parse_cache.get(key)
+        if df is not None:
+            if READER_STRATEGY in df.attrs:
+                df.attrs[READER_STRATEGY] += "+cache"
+            yield df
+            return
+        df = _read_robust(path, ext, header_strategy)
+        if isinstance(df, pd.DataFrame) and READER_STRATEGY in df.attrs:
+            # sem estratégia = nenhuma leitura funcionou: não vale guardar
+            parse_cache.put(key, df)
+        yield df
+    elif ext == ".json":
+        # array, objeto-envelope ou NDJSON, decodificados em lotes de registros
+        from src.utils.json_stream import iter_json_batches
+
+        for df in iter_json_batches(path):
+            yield _tag(df, "json_stream")
+    elif ext in [".html", ".htm"]:
+        # tabela de remuneração lida em lotes, sem montar a árvore inteira do documento
+        from src.utils.html_stream import iter_html_table_batches
+
+        for df in iter_html_table_batches(path):
+            # html_stream marca "html_first_table" quando nenhuma tabela passou nas heurísticas
+            yield _tag(df, df.attrs.get(READER_STRATEGY, "html_stream"))
+
+
+def _read_mapped(
+    src,
+    ext: str,
+    tj_code: str,
+    year_month: str,
+    column_overrides: Dict[str, List[str]] | None = None,
+    header_strategy: str = "auto",
+    with_matricula: bool = False,
+    parse_cache: ParseCache | None = None,
+    with_rubrics: bool = False,
+) -> List[pd.DataFrame]:
+    # lê um arquivo (ou membro de ZIP/GZ) e mapeia cada lote para o esquema unificado
+    out = []
+    frames = _read_raw_frames(src, ext, header_strategy, parse_cache)
+    while True:
+        # leitores em streaming são geradores: o trabalho de leitura acontece em cada next()
+        with profile_scope("read", ext=ext):
+            df = next(frames, None)
+        if df is None:
+            break
+        if not isinstance(df, pd.DataFrame):
+            continue
+        if READER_STRATEGY not in df.attrs:
+            continue
+        with profile_scope("map"):
+            mapped = _map_columns(df, tj_code, year_month, column_overrides, with_matricula, with_rubrics)
+        out.append(_tag(mapped, df.attrs[READER_STRATEGY]))
+    if not out:
+        # todos os fallbacks falharam (ou não há tabela/registros): vira erro no relatório de execução
+        raise ValueError(f"nenhuma estratégia de leitura reconheceu o arquivo ({ext})")
+    return out
+
+
+def load_month_data(
+    tj_code: str,
+    year_month: str,
+    raw_root: str = "data/raw",
+    column_overrides: Dict[str, List[str]] | None = None,
+    header_strategy: str = "auto",
+    source_format: str = "auto",
+    with_matricula: bool = False,
+    archive_cache_dir: str | None = ARCHIVE_CACHE_DIR,
+    archive_workers: int | None = None,
+    with_source_rank: bool = False,
+    parse_cache_dir: str | None = PARSE_CACHE_DIR,
+    with_rubrics: bool = False,
+) -> pd.DataFrame:
     """
     Lê todos os arquivos dentro de data/raw/<TJ>/<YYYY-MM>/ e tenta mapear
-    colunas comuns para o esquema unificado. Suporta CSV/TXT, XLSX, JSON.
-    Arquivos HTML podem ser tratados em versão futura (pandas.read_html).
+    colunas comuns para o esquema unificado. Suporta CSV/TXT, XLSX, JSON/NDJSON e
+    tabelas HTML (JSON e HTML lidos em streaming, ver `src.utils.json_stream` e
+    `src.utils.html_stream`), soltos ou dentro de arquivos `.zip`/`.gz`.
+
+    Membros de ZIP/GZ são lidos como fluxos, sem extração para o disco, em paralelo
+    (`archive_workers`); o resultado mapeado de cada arquivo compactado fica em cache
+    por hash do conteúdo em `archive_cache_dir`, e o DataFrame lido de cada CSV/TXT/XLSX
+    solto, em `parse_cache_dir` (ver `src.utils.parse_cache`; None desativa).
+
+    `column_overrides`, `header_strategy` e `source_format` vêm do catálogo de TJs
+    (ver `src.extractors.generic.ExtractorSpec`). Com `with_source_rank`, cada linha leva a
+    ordem do seu arquivo no mês (`SOURCE_RANK_COLUMN`, maior = mais recente) para a deduplicação.
+    Com `with_rubrics`, as colunas de valor não usadas nos cinco totais vêm como `rubric:<cabeçalho>`
+    (ver `src.utils.rubrics.split_rubrics`).
     """
     month_dir = os.path.join(raw_root, tj_code, year_month)
     if not os.path.isdir(month_dir):
         return pd.DataFrame(columns=UNIFIED_COLUMNS)
 
-    frames: List[pd.DataFrame] = []
-    for fname in os.listdir(month_dir):
-        path = os.path.join(month_dir, fname)
-        if not os.path.isfile(path):
-            continue
-        _, ext = os.path.splitext(path)
-        ext = ext.lower()
-        try:
-            if ext in [".csv", ".txt"]:
-                # leitura robusta para CSV/TXT
-                df = _read_csv_robust(path)
-            elif ext == ".xlsx":
-                df = _read_excel_robust(path)
-            elif ext in READERS:
-                reader = READERS[ext]
-                df = reader(path)
-            elif ext in [".html", ".htm"]:
-                # tentativa de ler primeira tabela
-                tables = pd.read_html(path)
-                df = tables[0] if tables else None
-            else:
-                df = None
-
-            if not isinstance(df, pd.DataFrame):
+    allowed = SUPPORTED_EXTS if source_format == "auto" else FORMAT_EXTENSIONS.get(source_format, [])
+    reader = partial(
+        _read_mapped, tj_code=tj_code, year_month=year_month, column_overrides=column_overrides,
+        header_strategy=header_strategy, with_matricula=with_matricula,
+        parse_cache=ParseCache(parse_cache_dir) if parse_cache_dir else None, with_rubrics=with_rubrics,
+    )
+    cache = ArchiveCache(archive_cache_dir) if archive_cache_dir else None
+    # `with_rubrics` só entra na chave quando ativo: entradas já existentes continuam válidas
+    cache_key = json.dumps([tj_code, year_month, column_overrides or {}, header_strategy, source_format,
+                            with_matricula] + (["rubrics"] if with_rubrics else []), sort_keys=True, ensure_ascii=False)
+
+    with stage("load_month", tj_code=tj_code, year_month=year_month) as st:
+        frames: List[pd.DataFrame] = []
+        bytes_read = 0
+        paths = [p for p in (os.path.join(month_dir, f) for f in sorted(os.listdir(month_dir))) if os.path.isfile(p)]
+        # arquivo mais recente (mtime, depois nome) recebe a maior ordem
+        ranks = {p: i for i, p in enumerate(sorted(paths, key=lambda p: (os.path.getmtime(p), p)))}
+        for path in paths:
+            _, ext = os.path.splitext(path)
+            ext = ext.lower()
+            if not archive_ext(path) and ext not in allowed:
                 continue
-
-            mapped = _map_columns(df, tj_code, year_month)
-            frames.append(mapped)
-        except Exception:
-            # ignora arquivo problemático, poderia logar
-            continue
-
-    if frames:
-        out = pd.concat(frames, ignore_index=True)
-        # limpeza básica (mantém valores numéricos já tratados por to_float)
-        numeric_cols = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
-        for c in numeric_cols:
-            if c in out.columns:
-                out[c] = pd.to_numeric(out[c], errors="coerce").fillna(0.0)
-        return out
-
-    return pd.DataFrame(columns=UNIFIED_COLUMNS)
+            size = os.path.getsize(path)
+            bytes_read += size
+            t0 = time.perf_counter()
+            try:
+                if archive_ext(path):
+                    # membros registram o próprio tempo/erro no relatório de execução
+                    archive_frames = read_archive(path, reader, allowed, workers=archive_workers, cache=cache,
+                                                  cache_key=cache_key, tj_code=tj_code, year_month=year_month)
+                    if with_source_rank:
+                        for f in archive_frames:
+                            f[SOURCE_RANK_COLUMN] = ranks[path]
+                    frames.extend(archive_frames)
+                    continue
+                file_frames = reader(path, ext)
+                error = None
+            except Exception as e:
+                # arquivo problemático não interrompe o mês, mas fica registrado
+                file_frames, error = [], f"{type(e).__name__}: {e}"
+            record_file(
+                tj_code=tj_code, year_month=year_month, path=path,
+                reader=",".join(sorted({f.attrs.get(READER_STRATEGY, "") for f in file_frames} - {""})) or None,
+                rows_out=sum(len(f) for f in file_frames), bytes_read=size,
+                seconds=round(time.perf_counter() - t0, 4), error=error,
+            )
+            if with_source_rank:
+                for f in file_frames:
+                    f[SOURCE_RANK_COLUMN] = ranks[path]
+            frames.extend(file_frames)
+        st.bytes_read = bytes_read
+
+        if frames:
+            out = pd.concat(frames, ignore_index=True)
+            # limpeza básica (mantém valores numéricos já tratados por to_float; nulos seguem
+            # para a validação)
+            numeric_cols = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+            for c in numeric_cols:
+                if c in out.columns:
+                    out[c] = pd.to_numeric(out[c], errors="coerce")
+            st.rows_out = len(out)
+            return out
+
+        st.rows_out = 0
+        return pd.DataFrame(columns=UNIFIED_COLUMNS)
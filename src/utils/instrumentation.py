@@ -0,0 +1,414 @@
+from __future__ import annotations
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+try:  # indisponível no Windows
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+RUN_REPORT_DIR = os.path.join("reports", "output")
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005
+# relatórios/perfis por execução (`RunReport.save(per_run=True)`) mantidos por nome
+RUN_REPORT_KEEP = 20
+
+
+def new_run_id() -> str:
+    """Id de execução: instante UTC (ordena cronologicamente) + sufixo aleatório."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+
+def run_report_path(name: str, report_dir: str = RUN_REPORT_DIR, run_id: str | None = None) -> str:
+    suffix = f"-{run_id}" if run_id else ""
+    return os.path.join(report_dir, f"run_report_{name}{suffix}.json")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo (e de subprocessos já encerrados), em MB."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@dataclass
+class StageRecord:
+    name: str
+    labels: Dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    bytes_read: Optional[int] = None
+    peak_rss_mb: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class FileRecord:
+    tj_code: str
+    year_month: str
+    path: str
+    member: Optional[str] = None        # membro dentro de ZIP/GZ
+    reader: Optional[str] = None        # estratégia de leitura que funcionou (ex.: csv_sniff_latin1)
+    rows_out: int = 0
+    bytes_read: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class QualityRecord:
+    """Contagens de validação de uma partição (TJ, mês); ver `src.utils.validation`."""
+    tj_code: str
+    year_month: str
+    source: str = ""
+    rows: int = 0
+    coerced_columns: List[str] = field(default_factory=list)  # colunas de valores que não vieram numéricas
+    null_pay: int = 0
+    negative_pay: int = 0
+    out_of_range: int = 0
+    net_gt_gross: int = 0
+    zero_pay: int = 0
+    missing_name: int = 0
+    bad_server_id: int = 0
+    bad_year_month: int = 0
+
+    # anomalias que merecem aviso (zero_pay/null_pay são comuns em folhas e só informativas)
+    ISSUES = ("negative_pay", "out_of_range", "net_gt_gross", "missing_name", "bad_server_id", "bad_year_month")
+
+    def issues(self) -> int:
+        return sum(getattr(self, k) for k in self.ISSUES)
+
+
+def _frame_label(code) -> str:
+    # sem ';' (separador do formato "folded" usado por flamegraph.pl/speedscope)
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class _CProfileScopes:
+    """Um cProfile por nome de escopo, com tempo exclusivo: o escopo aninhado pausa o externo."""
+
+    def __init__(self):
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self._local = threading.local()
+
+    def _stack(self) -> List[Optional[str]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _switch(self, leaving: Optional[str], entering: Optional[str]) -> None:
+        if leaving is not None:
+            self.profiles[leaving].disable()
+        if entering is not None:
+            try:
+                self.profiles.setdefault(entering, cProfile.Profile()).enable()
+            except ValueError:
+                # outro profiler ativo (ex.: Python 3.12+ com cProfile em outra thread)
+                self._stack()[-1] = None
+
+    def enter(self, name: str, labels: Dict[str, str]) -> None:
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        self._switch(parent, name)
+
+    def exit(self) -> None:
+        stack = self._stack()
+        name = stack.pop()
+        self._switch(name, stack[-1] if stack else None)
+
+    def stop(self) -> None:
+        pass
+
+    def write(self, out_dir: str) -> List[str]:
+        paths = []
+        folded: List[str] = []
+        for name, prof in self.profiles.items():
+            safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name)
+            path = os.path.join(out_dir, f"{safe}.prof")
+            prof.dump_stats(path)
+            paths.append(path)
+            # resumo de dois níveis (etapa;função -> tempo exclusivo em µs) para flamegraph
+            for (filename, line, func), (_, _, tottime, _, _) in pstats.Stats(prof).stats.items():
+                us = int(tottime * 1_000_000)
+                if us > 0:
+                    label = f"{func} ({os.path.basename(filename)}:{line})".replace(";", ",")
+                    folded.append(f"{name};{label} {us}")
+        if folded:
+            path = os.path.join(out_dir, "cprofile.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(folded) + "\n")
+            paths.append(path)
+        return paths
+
+
+class _Sampler:
+    """Amostra periodicamente a pilha das threads dentro de escopos e agrega no formato "folded".
+
+    Cada pilha começa pelos escopos ativos (ex.: `extract[TJRS];load_month[TJRS,2024-01];read`),
+    então o flamegraph já aparece separado por etapa.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._scopes: Dict[int, List[str]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="run-report-sampler", daemon=True)
+        self._thread.start()
+
+    def enter(self, name: str, labels: Dict[str, str]) -> None:
+        label = f"{name}[{','.join(labels.values())}]" if labels else name
+        self._scopes.setdefault(threading.get_ident(), []).append(label)
+
+    def exit(self) -> None:
+        self._scopes[threading.get_ident()].pop()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, scopes in list(self._scopes.items()):
+                frame = frames.get(tid)
+                if not scopes or frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.counts[";".join(list(scopes) + stack[::-1])] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, out_dir: str) -> List[str]:
+        path = os.path.join(out_dir, "samples.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self.counts.items()):
+                f.write(f"{stack} {n}\n")
+        return [path]
+
+
+class RunReport:
+    """Tempos, linhas, bytes e memória de uma execução, por etapa e por arquivo.
+
+    Fica ativo via `use_report`; o código do pipeline registra etapas com `stage(...)` e
+    arquivos com `record_file(...)` sem precisar receber o relatório como parâmetro.
+
+    Com `profile="cprofile"` ou `"sample"`, as etapas e os escopos de `profile_scope(...)`
+    também são perfilados; os arquivos vão para `profiles/<nome>/` ao lado do relatório
+    (`profiles/<nome>/<run_id>/` com `save(per_run=True)`).
+    """
+
+    def __init__(self, name: str, profile: str | None = None, **meta):
+        if profile and profile not in PROFILE_MODES:
+            raise ValueError(f"profile inválido: {profile} (use {', '.join(PROFILE_MODES)})")
+        self.name = name
+        self.run_id = new_run_id()
+        self.meta = dict(meta)
+        self.profile = profile or None
+        self.profiler = None
+        if profile == "cprofile":
+            self.profiler = _CProfileScopes()
+        elif profile == "sample":
+            self.profiler = _Sampler()
+        self.profile_files: List[str] = []
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: List[StageRecord] = []
+        self.files: List[FileRecord] = []
+        self.quality: List[QualityRecord] = []
+        self.warnings: List[str] = []
+
+    def add_stage(self, rec: StageRecord) -> None:
+        with self._lock:
+            self.stages.append(rec)
+
+    def add_file(self, rec: FileRecord) -> None:
+        with self._lock:
+            self.files.append(rec)
+
+    def add_quality(self, rec: QualityRecord) -> None:
+        with self._lock:
+            self.quality.append(rec)
+
+    def warn(self, message: str) -> None:
+        with self._lock:
+            self.warnings.append(message)
+
+    def _summary(self) -> Dict:
+        by_format: Dict[str, Dict] = {}
+        by_tj: Dict[str, Dict] = {}
+        for f in self.files:
+            ext = os.path.splitext(f.member or f.path)[1].lower() or "?"
+            for key, agg in ((ext, by_format), (f.tj_code, by_tj)):
+                acc = agg.setdefault(key, {"files": 0, "rows": 0, "bytes": 0, "seconds": 0.0, "errors": 0})
+                acc["files"] += 1
+                acc["rows"] += f.rows_out
+                acc["bytes"] += f.bytes_read
+                acc["seconds"] = round(acc["seconds"] + f.seconds, 4)
+                acc["errors"] += int(f.error is not None)
+        return {"by_format": by_format, "by_tj": by_tj}
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "run_id": self.run_id,
+            "meta": self.meta,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.perf_counter() - self._t0, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": [asdict(s) for s in self.stages],
+            "files": [asdict(f) for f in self.files],
+            "file_errors": sum(1 for f in self.files if f.error is not None),
+            "summary": self._summary(),
+            "quality": [asdict(q) for q in self.quality],
+            "quality_issues": sum(q.issues() for q in self.quality),
+            "warnings": list(self.warnings),
+            "profile": self.profile,
+            "profile_files": list(self.profile_files),
+        }
+
+    def stop_profiling(self) -> None:
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def save(self, path: str | None = None, per_run: bool = False) -> str:
+        """Grava o relatório (e os perfis) e devolve o caminho.
+
+        Com `per_run` (execuções concorrentes, ex.: API), grava em `run_report_<nome>-<run_id>.json`
+        e perfis em `profiles/<nome>/<run_id>/`, que ninguém mais sobrescreve; o caminho fixo
+        (`path` ou o padrão) recebe uma cópia como "último relatório". Só os `RUN_REPORT_KEEP`
+        mais recentes de cada nome são mantidos.
+        """
+        latest = path or run_report_path(self.name)
+        report_dir = os.path.dirname(latest) or "."
+        path = run_report_path(self.name, report_dir, self.run_id) if per_run else latest
+        os.makedirs(report_dir, exist_ok=True)
+        if self.profiler is not None:
+            self.stop_profiling()
+            out_dir = os.path.join(report_dir, "profiles", self.name)
+            if per_run:
+                out_dir = os.path.join(out_dir, self.run_id)
+            else:
+                # perfis da execução anterior (inclusive de outro modo) não se misturam com os novos;
+                # subdiretórios são de execuções `per_run`
+                for entry in (os.scandir(out_dir) if os.path.isdir(out_dir) else []):
+                    if entry.is_file():
+                        os.remove(entry.path)
+            os.makedirs(out_dir, exist_ok=True)
+            self.profile_files = self.profiler.write(out_dir)
+        targets = [path, latest] if per_run else [path]
+        for target in targets:
+            tmp = f"{target}.{self.run_id}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, target)
+        if per_run:
+            _prune_runs(report_dir, self.name)
+        return path
+
+
+def _prune_runs(report_dir: str, name: str, keep: int = RUN_REPORT_KEEP) -> None:
+    prefix = f"run_report_{name}-"
+    reports = sorted(f for f in os.listdir(report_dir) if f.startswith(prefix) and f.endswith(".json"))
+    for f in reports[:max(len(reports) - keep, 0)]:
+        try:
+            os.remove(os.path.join(report_dir, f))
+        except OSError:
+            pass  # removido por outra execução
+    profiles = os.path.join(report_dir, "profiles", name)
+    if os.path.isdir(profiles):
+        runs = sorted(e.name for e in os.scandir(profiles) if e.is_dir())
+        for d in runs[:max(len(runs) - keep, 0)]:
+            shutil.rmtree(os.path.join(profiles, d), ignore_errors=True)
+
+
+_CURRENT: contextvars.ContextVar[Optional[RunReport]] = contextvars.ContextVar("run_report", default=None)
+
+
+def current_report() -> Optional[RunReport]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def use_report(report: RunReport) -> Iterator[RunReport]:
+    token = _CURRENT.set(report)
+    try:
+        yield report
+    finally:
+        _CURRENT.reset(token)
+        report.stop_profiling()
+
+
+@contextmanager
+def profile_scope(name: str, **labels) -> Iterator[None]:
+    """Escopo de profiling (ex.: "read", "map", "hash") sem registro de etapa no relatório."""
+    report = _CURRENT.get()
+    profiler = report.profiler if report is not None else None
+    if profiler is None:
+        yield
+        return
+    profiler.enter(name, {k: str(v) for k, v in labels.items()})
+    try:
+        yield
+    finally:
+        profiler.exit()
+
+
+@contextmanager
+def stage(name: str, **labels) -> Iterator[StageRecord]:
+    """Mede uma etapa; o chamador preenche `rows_in`/`rows_out`/`bytes_read` no registro.
+
+    Sem relatório ativo, apenas executa o bloco.
+    """
+    rec = StageRecord(name=name, labels={k: str(v) for k, v in labels.items()})
+    t0 = time.perf_counter()
+    try:
+        with profile_scope(name, **labels):
+            yield rec
+    except Exception as e:
+        rec.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        rec.seconds = round(time.perf_counter() - t0, 4)
+        report = _CURRENT.get()
+        if report is not None:
+            rec.peak_rss_mb = peak_rss_mb()
+            report.add_stage(rec)
+
+
+def record_file(**kwargs) -> None:
+    report = _CURRENT.get()
+    if report is not None:
+        report.add_file(FileRecord(**kwargs))
+
+
+def record_quality(**kwargs) -> None:
+    report = _CURRENT.get()
+    if report is not None:
+        report.add_quality(QualityRecord(**kwargs))
+
+
+def warn(message: str) -> None:
+    report = _CURRENT.get()
+    if report is not None:
+        report.warn(message)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import io
+import json
+import re
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from src.utils.parsing import to_float
+
+BATCH_ROWS = 50_000
+CHUNK_CHARS = 1 << 20
+SNIFF_BYTES = 64 * 1024
+
+# Chaves de um item de rubrica: {"rubrica": "Subsídio", "valor": "1.234,56"}
+LABEL_KEYS = ["rubrica", "descricao", "descrição", "nome", "label", "name", "item"]
+VALUE_KEYS = ["valor", "value", "montante", "quantia", "total"]
+
+_WS = re.compile(r"[\s,:]*")
+_DECODER = json.JSONDecoder()
+
+
+def _open_text(source, encoding: str | None = None) -> io.TextIOWrapper:
+    raw = source if hasattr(source, "read") else open(source, "rb")
+    if encoding is None:
+        head = raw.read(SNIFF_BYTES)
+        raw.seek(0)
+        try:
+            # ignora um possível caractere multibyte cortado no fim da amostra
+            (head if len(head) < SNIFF_BYTES else head[:-4]).decode("utf-8")
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "latin-1"
+    return io.TextIOWrapper(raw, encoding=encoding, newline="")
+
+
+def _looks_like_ndjson(text: str) -> bool:
+    # NDJSON: a primeira linha já é um objeto completo e a seguinte começa outro
+    first, sep, rest = text.lstrip().partition("\n")
+    if not sep or not first.rstrip().endswith("}"):
+        return False
+    try:
+        json.loads(first)
+    except ValueError:
+        return False
+    return rest.lstrip().startswith("{") or not rest.strip()
+
+
+class _Scanner:
+    """Decodifica valores JSON de um fluxo de texto sem carregar o documento inteiro."""
+
+    def __init__(self, fh: io.TextIOBase, chunk_chars: int = CHUNK_CHARS):
+        self.fh = fh
+        self.chunk_chars = chunk_chars
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        # lê ao menos o tamanho do trecho pendente para que valores grandes não fiquem quadráticos
+        chunk = self.fh.read(max(self.chunk_chars, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Próximo caractere significativo (pula espaços e separadores `,`/`:`)."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self) -> str:
+        ch = self.peek()
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # número/literal no fim do buffer pode estar truncado
+            if end == len(self.buf) and not isinstance(obj, (dict, list, str)) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def iter_array(self) -> Iterator:
+        """Itens de um array cujo `[` é o próximo caractere."""
+        self.take()
+        while self.peek() not in ("]", ""):
+            yield self.value()
+        self.take()
+
+
+def _iter_object_records(sc: _Scanner) -> Iterator[Dict]:
+    # {"metadados": ..., "servidores": [{...}, ...]}: registros vêm do primeiro array de objetos;
+    # sem array de objetos, o próprio objeto é um registro
+    sc.take()
+    top: Dict = {}
+    found = False
+    while sc.peek() not in ("}", ""):
+        key = sc.value()
+        if not found and sc.peek() == "[":
+            items = sc.iter_array()
+            first = next(items, None)
+            if isinstance(first, dict):
+                found = True
+                yield first
+                yield from (it for it in items if isinstance(it, dict))
+                continue
+            top[key] = [first, *items] if first is not None else []
+            continue
+        top[key] = sc.value()
+    sc.take()
+    if not found and top:
+        yield top
+
+
+def iter_json_records(source, encoding: str | None = None) -> Iterator[Dict]:
+    """Registros (objetos) de um JSON em array, objeto-envelope ou NDJSON, lidos em streaming."""
+    fh = _open_text(source, encoding)
+    try:
+        head = fh.read(SNIFF_BYTES)
+        fh.seek(0)
+        if _looks_like_ndjson(head):
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # linha truncada/corrompida (comum no fim de exportações interrompidas)
+                    continue
+                if isinstance(rec, dict):
+                    yield rec
+            return
+        sc = _Scanner(fh)
+        while True:
+            ch = sc.peek()
+            if ch == "[":
+                yield from (it for it in sc.iter_array() if isinstance(it, dict))
+            elif ch == "{":
+                yield from _iter_object_records(sc)
+            elif ch == "":
+                return
+            else:
+                sc.value()
+    finally:
+        # fluxo recebido do chamador continua aberto
+        if hasattr(source, "read"):
+            fh.detach()
+        else:
+            fh.close()
+
+
+def _find_key(item: Dict, keys: List[str]) -> Optional[str]:
+    lowered = {str(k).strip().lower(): k for k in item}
+    for k in keys:
+        if k in lowered:
+            return lowered[k]
+    return None
+
+
+def _rubric_pair(item) -> Optional[tuple]:
+    if not isinstance(item, dict):
+        return None
+    label, value = _find_key(item, LABEL_KEYS), _find_key(item, VALUE_KEYS)
+    if label is None or value is None or label == value:
+        return None
+    return item[label], item[value]
+
+
+def flatten_record(rec: Dict, prefix: str = "", out: Dict | None = None) -> Dict:
+    """Achata um registro aninhado em colunas.
+
+    Objetos aninhados viram "pai filho" (como os cabeçalhos de duas linhas) e listas de
+    rubricas `[{"rubrica": ..., "valor": ...}]` viram uma coluna por rubrica. Valores ficam
+    como vieram (a conversão vetorizada é feita em `_map_columns`); só rubricas repetidas
+    no mesmo registro são convertidas aqui para serem somadas.
+    """
+    out = {} if out is None else out
+    for key, val in rec.items():
+        name = f"{prefix} {key}".strip()
+        if isinstance(val, dict):
+            flatten_record(val, name, out)
+        elif isinstance(val, list):
+            pairs = [_rubric_pair(it) for it in val]
+            if pairs and all(p is not None for p in pairs):
+                for label, amount in pairs:
+                    col = f"{name} {label}".strip()
+                    out[col] = to_float(out[col]) + to_float(amount) if col in out else amount
+            else:
+                out[name] = "; ".join(str(v) for v in val if v is not None) or None
+        else:
+            out[name] = val
+    return out
+
+
+def iter_json_batches(source, batch_size: int = BATCH_ROWS, encoding: str | None = None) -> Iterator[pd.DataFrame]:
+    """Lotes de até `batch_size` registros achatados, prontos para `_map_columns`."""
+    batch: List[Dict] = []
+    for rec in iter_json_records(source, encoding):
+        batch.append(flatten_record(rec))
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
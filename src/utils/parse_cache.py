@@ -0,0 +1,282 @@
+from __future__ import annotations
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils.archives import indexed_sha256
+
+CACHE_DIR = os.path.join("data", "cache", "parsed")
+MAX_BYTES = 2 << 30
+# leitores caros e de saída única; JSON/HTML são lidos em lotes (streaming) e ficam fora
+CACHEABLE_EXTS = (".csv", ".txt", ".xlsx")
+# mudanças no formato das entradas (o código dos leitores entra em `reader_fingerprint`)
+PARSE_CACHE_VERSION = "1"
+# código que produz os frames em cache: leitores, conversão de valores e mapeamento de colunas
+READER_MODULES = (
+    "src.utils.ingest_local", "src.utils.parsing", "src.utils.json_stream", "src.utils.html_stream",
+    "src.utils.archives", "src.utils.rubrics",
+)
+
+_META_KEY = b"parse_cache"
+_lock = threading.Lock()
+_fingerprint: Optional[str] = None
+# total em bytes de cada raiz do cache neste processo (varrida só na primeira gravação e ao evictar)
+_totals: Dict[str, int] = {}
+
+# células de colunas object: cada tipo vai para uma coluna física própria
+_NONE, _STR, _FLOAT, _INT, _BOOL, _DATETIME, _NAT, _NA = range(8)
+_TAGS = {
+    str: _STR, float: _FLOAT, np.float64: _FLOAT, np.float32: _FLOAT, int: _INT, np.int64: _INT,
+    np.int32: _INT, bool: _BOOL, np.bool_: _BOOL, dt.datetime: _DATETIME, pd.Timestamp: _DATETIME,
+    type(None): _NONE, type(pd.NaT): _NAT, type(pd.NA): _NA,
+}
+_INFERRED = {"string": _STR, "floating": _FLOAT, "integer": _INT, "boolean": _BOOL, "datetime": _DATETIME}
+_NULLS = {_NONE: None, _NAT: pd.NaT, _NA: pd.NA}
+
+
+def reader_fingerprint() -> str:
+    """Versão dos leitores: código de `READER_MODULES` + versões do pandas/openpyxl.
+
+    Qualquer alteração nos leitores ou no mapeamento muda a impressão digital e invalida
+    este cache e o de arquivos compactados (`ArchiveCache`).
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        import importlib
+
+        h = hashlib.sha1(f"{PARSE_CACHE_VERSION}|{pd.__version__}".encode("utf-8"))
+        try:
+            import openpyxl
+
+            h.update(openpyxl.__version__.encode("utf-8"))
+        except ImportError:
+            pass
+        for name in READER_MODULES:
+            with open(importlib.import_module(name).__file__, "rb") as f:
+                h.update(f.read())
+        _fingerprint = h.hexdigest()[:16]
+    return _fingerprint
+
+
+def _object_tags(values: np.ndarray) -> Optional[np.ndarray]:
+    """Tipo de cada célula de uma coluna object (None se houver tipo sem representação)."""
+    tags = np.full(len(values), _NONE, dtype=np.int8)
+    nulls = pd.isna(values)
+    inferred = _INFERRED.get(pd.api.types.infer_dtype(values, skipna=True))
+    if inferred is not None:
+        tags[~nulls] = inferred
+        cells = values[nulls]
+        idx = np.flatnonzero(nulls)
+    else:
+        cells, idx = values, np.arange(len(values))
+    try:
+        tags[idx] = np.fromiter((_TAGS[type(v)] for v in cells), dtype=np.int8, count=len(cells))
+    except KeyError:
+        return None
+    return tags
+
+
+def _encode(df: pd.DataFrame):
+    """Tabela Arrow com colunas posicionais e, nos metadados, nomes, tipos e a estratégia de leitura.
+
+    Nomes repetidos ou não textuais e colunas object de tipos mistos (texto, número, data
+    e nulos na mesma coluna, comuns em planilhas) são preservados; devolve None quando
+    algo não tem representação (o arquivo segue sem cache).
+    """
+    import pyarrow as pa
+
+    names = list(df.columns)
+    try:
+        if json.loads(json.dumps(names)) != names:
+            return None
+    except (TypeError, ValueError):
+        return None
+    arrays, fields, columns = [], [], []
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if s.dtype != object:
+            try:
+                arrays.append(pa.Array.from_pandas(s))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                return None
+            fields.append(f"c{i}")
+            columns.append({"kind": "native", "dtype": str(s.dtype)})
+            continue
+        values = s.to_numpy(dtype=object)
+        tags = _object_tags(values)
+        if tags is None:
+            return None
+        present = sorted(set(np.unique(tags).tolist()) - set(_NULLS))
+        arrays.append(pa.array(tags, pa.int8()))
+        fields.append(f"c{i}.t")
+        for tag in present:
+            part = np.full(len(values), None, dtype=object)
+            mask = tags == tag
+            part[mask] = values[mask]
+            typ = {_STR: pa.string(), _FLOAT: pa.float64(), _INT: pa.int64(), _BOOL: pa.bool_(),
+                   _DATETIME: pa.timestamp("us")}[tag]
+            try:
+                # from_pandas=False: NaN continua NaN (não vira nulo) na coluna de floats
+                arrays.append(pa.array(part, typ, from_pandas=False))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                return None
+            fields.append(f"c{i}.{tag}")
+        columns.append({"kind": "object", "tags": present})
+    meta = {"names": names, "columns": columns, "rows": len(df), "attrs": {
+        k: v for k, v in df.attrs.items() if isinstance(v, (str, int, float, bool))}}
+    table = pa.Table.from_arrays(arrays, names=fields) if arrays else pa.table({})
+    return table.replace_schema_metadata({_META_KEY: json.dumps(meta, ensure_ascii=False).encode("utf-8")})
+
+
+def _decode(table) -> pd.DataFrame:
+    meta = json.loads(table.schema.metadata[_META_KEY])
+    n = meta["rows"]
+    cols = []
+    for i, col in enumerate(meta["columns"]):
+        if col["kind"] == "native":
+            s = table.column(f"c{i}").to_pandas()
+            cols.append(s if str(s.dtype) == col["dtype"] else s.astype(col["dtype"]))
+            continue
+        tags = table.column(f"c{i}.t").to_numpy()
+        out = np.full(n, None, dtype=object)
+        for tag, value in _NULLS.items():
+            if tag != _NONE:
+                out[tags == tag] = value
+        for tag in col["tags"]:
+            mask = tags == tag
+            values = table.column(f"c{i}.{tag}").filter(mask).to_pylist()
+            if tag == _DATETIME:
+                values = [pd.Timestamp(v) for v in values]
+            cells = np.empty(len(values), dtype=object)
+            cells[:] = values
+            out[mask] = cells
+        cols.append(pd.Series(out, dtype=object))
+    df = pd.DataFrame(dict(enumerate(cols)), index=pd.RangeIndex(n))
+    df.columns = meta["names"]
+    df.attrs.update(meta["attrs"])
+    return df
+
+
+class ParseCache:
+    """DataFrame normalizado de cada arquivo bruto (saída dos leitores robustos), em Parquet.
+
+    Chave: hash do conteúdo do arquivo + `reader_fingerprint()` + opções de leitura; o
+    mesmo arquivo em outra pasta (ou outro TJ/mês) é lido uma única vez. Entradas ficam em
+    `<root>/<sha[:2]>/<sha>-<chave>.parquet`; cada acerto renova o mtime e, quando o total
+    acumulado das gravações passa de `max_bytes`, as menos usadas recentemente são removidas (LRU).
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+
+    def key(self, path: str, header_strategy: str = "auto") -> str:
+        sha = indexed_sha256(path, self.index_path)
+        # XLSX não usa header_strategy: a mesma entrada serve a qualquer configuração do TJ
+        xlsx = os.path.splitext(path)[1].lower() == ".xlsx"
+        opts = json.dumps({"header_strategy": "" if xlsx else header_strategy})
+        digest = hashlib.sha1(f"{reader_fingerprint()}|{opts}".encode("utf-8")).hexdigest()[:16]
+        return f"{sha}-{digest}"
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.parquet")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        import pyarrow.parquet as pq
+
+        path = self._entry_path(key)
+        try:
+            df = _decode(pq.read_table(path))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # entrada corrompida (ex.: gravação interrompida em outro sistema de arquivos)
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def columns(self, key: str) -> Optional[List[str]]:
+        """Nomes das colunas de uma entrada, lendo só os metadados do Parquet."""
+        import pyarrow.parquet as pq
+
+        try:
+            meta = pq.read_schema(self._entry_path(key)).metadata[_META_KEY]
+        except Exception:
+            return None
+        return [str(n) for n in json.loads(meta)["names"]]
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        import pyarrow.parquet as pq
+
+        table = _encode(df)
+        if table is None:
+            return False
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            pq.write_table(table, tmp)
+            size = os.path.getsize(tmp)
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp, path)
+        finally:
+            self._remove(tmp)
+        if self._add_bytes(size) > self.max_bytes:
+            self.evict()
+        return True
+
+    def _add_bytes(self, size: int) -> int:
+        """Soma `size` ao total da raiz, varrendo o diretório só na primeira vez."""
+        root = os.path.abspath(self.root)
+        with _lock:
+            if root not in _totals:
+                _totals[root] = sum(e.stat().st_size for e in self.entries())
+            else:
+                _totals[root] += size
+            return _totals[root]
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self) -> List[os.DirEntry]:
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for sub in os.scandir(self.root):
+            if sub.is_dir():
+                out.extend(e for e in os.scandir(sub.path) if e.name.endswith(".parquet"))
+        return out
+
+    def evict(self) -> Dict[str, int]:
+        """Remove as entradas menos usadas recentemente até o total caber em `max_bytes`."""
+        with _lock:
+            entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in self.entries()]
+            total = sum(size for _, size, _ in entries)
+            removed = freed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+                freed += size
+            _totals[os.path.abspath(self.root)] = total
+        return {"removed": removed, "bytes_freed": freed, "bytes": total}
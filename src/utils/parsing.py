@@ -1,10 +1,14 @@
 from __future__ import annotations
 import hashlib
 import unicodedata
-from bs4 import BeautifulSoup
 from typing import Optional
 import re
 
+import numpy as np
+import pandas as pd
+
+_NON_NUMERIC = re.compile(r"[^0-9,\.\- ]+")
+
 
 def normalize_text(s: Optional[str]) -> str:
     if s is None:
@@ -27,7 +31,7 @@ def to_float(x) -> float:
     s = s.replace("\u00a0", " ")
     s = s.replace("R$", "").replace("BRL", "").replace("brl", "")
     # Mantém apenas dígitos, vírgula, ponto, hífen e espaços intermediários
-    s = re.sub(r"[^0-9,\.\- ]+", "", s)
+    s = _NON_NUMERIC.sub("", s)
     s = s.strip()
     # Remove espaços internos
     s = s.replace(" ", "")
@@ -39,19 +43,72 @@ def to_float(x) -> float:
         return 0.0
 
 
+def to_float_series(s: pd.Series, keep_nulls: bool = False) -> pd.Series:
+    """Versão vetorizada de `to_float`, aplicada somente aos valores distintos da série.
+
+    `keep_nulls`: nulos e textos ilegíveis ficam NaN em vez de 0.0 (para serem contados).
+    """
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    is_num = u.map(lambda x: isinstance(x, (int, float))).to_numpy(dtype=bool)
+    vals = np.full(len(u) + 1, np.nan if keep_nulls else 0.0)  # posição extra (-1) para nulos
+    if is_num.any():
+        vals[:-1][is_num] = u[is_num].astype(float).to_numpy()
+    if (~is_num).any():
+        txt = (
+            u[~is_num].astype(str)
+            .str.strip()
+            .str.normalize("NFKC")
+            .str.replace("\u00a0", " ", regex=False)
+            .str.replace("R$", "", regex=False)
+            .str.replace("BRL", "", regex=False)
+            .str.replace("brl", "", regex=False)
+            .str.replace(_NON_NUMERIC, "", regex=True)
+            .str.strip()
+            .str.replace(" ", "", regex=False)
+            .str.replace(".", "", regex=False)
+            .str.replace(",", ".", regex=False)
+        )
+        parsed = pd.to_numeric(txt, errors="coerce")
+        vals[:-1][~is_num] = (parsed if keep_nulls else parsed.fillna(0.0)).to_numpy()
+    return pd.Series(vals[codes], index=s.index)
+
+
 def make_server_id(tj_code: str, name: str, maybe_mat: str | None = None) -> str:
     base = f"{tj_code}|{normalize_text(name)}|{normalize_text(maybe_mat or '')}"
     return hashlib.sha256(base.encode("utf-8")).hexdigest()[:16]
 
 
+def make_server_ids(tj_code: str, names: pd.Series, matriculas: pd.Series | None = None) -> pd.Series:
+    """`make_server_id` vetorizado: calcula o hash uma vez por (nome, matrícula) distinto."""
+    keys = names.astype(object).map(str)
+    if matriculas is not None:
+        mats = matriculas.astype(object).fillna("").map(str)
+        frame = pd.DataFrame({"n": keys, "m": mats})
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(frame))
+        hashed = np.array([make_server_id(tj_code, n, m) for n, m in uniques], dtype=object)
+    else:
+        codes, uniques = pd.factorize(keys)
+        hashed = np.array([make_server_id(tj_code, n) for n in uniques], dtype=object)
+    return pd.Series(hashed[codes], index=names.index)
+
+
 def parse_html_table(html: str):
-    soup = BeautifulSoup(html, "lxml")
-    table = soup.find("table")
+    # lxml direto (sem árvore BeautifulSoup); importado apenas quando há HTML a processar
+    import lxml.html
+
+    try:
+        doc = lxml.html.fromstring(html)
+    except Exception:
+        return []
+    table = next(doc.iter("table"), None)
     if table is None:
         return []
     rows = []
-    for tr in table.find_all("tr"):
-        cells = [normalize_text(td.get_text(" ")) for td in tr.find_all(["td", "th"]) ]
+    for tr in table.iter("tr"):
+        cells = [normalize_text(" ".join(td.itertext())) for td in tr if td.tag in ("td", "th")]
         if cells:
             rows.append(cells)
     return rows
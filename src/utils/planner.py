@@ -0,0 +1,310 @@
+from __future__ import annotations
+import contextvars
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from src.utils.archives import archive_ext
+from src.utils.ingest_local import FORMAT_EXTENSIONS, SUPPORTED_EXTS
+
+STAGING_DIR = os.path.join("data", "processed", "units")
+TIMINGS_PATH = os.path.join("reports", "output", "timings.json")
+ORDERS = ("recent", "oldest")
+
+# sem histórico: vazão típica dos leitores (bytes/s) e custo fixo por mês
+DEFAULT_BYTES_PER_SECOND = 5e6
+UNIT_OVERHEAD_SECONDS = 0.05
+# peso do histórico acumulado a cada nova observação (execuções recentes pesam mais)
+HISTORY_DECAY = 0.7
+
+
+@dataclass
+class PlannedFile:
+    path: str
+    bytes: int
+    ext: str              # extensão lida (".csv", ".zip", ...), chave do histórico de tempos
+    mtime_ns: int = 0
+
+
+@dataclass
+class WorkUnit:
+    """Um mês de um TJ: todos os arquivos de data/raw/<TJ>/<YYYY-MM>/ (deduplicados juntos)."""
+    tj_code: str
+    year_month: str
+    files: List[PlannedFile] = field(default_factory=list)
+    url: Optional[str] = None         # month_url do extrator, quando o mês ainda não foi baixado
+    fingerprint: str = ""             # arquivos + configuração do TJ; igual ao da staging => já feito
+    est_seconds: float = 0.0
+    priority: int = 0                 # menor = antes
+    status: str = "pending"           # "pending" | "done" | "empty" | "ok" | "failed"
+    attempts: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    error: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.tj_code}/{self.year_month}"
+
+    @property
+    def bytes(self) -> int:
+        return sum(f.bytes for f in self.files)
+
+
+class TimingModel:
+    """Vazão observada por (TJ, extensão), a partir dos arquivos dos relatórios de execução.
+
+    A estimativa de um mês é `UNIT_OVERHEAD_SECONDS` + bytes / vazão de cada arquivo, com
+    recuo para a vazão da extensão (todos os TJs), a geral e `DEFAULT_BYTES_PER_SECOND`.
+    """
+
+    def __init__(self, path: Optional[str] = TIMINGS_PATH):
+        self.path = path
+        self.rates: Dict[str, Dict[str, float]] = {}   # chave -> {"bytes", "seconds"}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.rates = json.load(f).get("rates", {})
+
+    @staticmethod
+    def _keys(tj_code: str, ext: str) -> List[str]:
+        return [f"{tj_code}|{ext}", f"*|{ext}", "*|*"]
+
+    def observe(self, files: Iterable[Dict]) -> int:
+        """Acrescenta registros de arquivo (`FileRecord` como dict) sem erro; devolve quantos."""
+        batch: Dict[str, Dict[str, float]] = {}
+        n = 0
+        for rec in files:
+            if rec.get("error") or not rec.get("bytes_read") or rec.get("seconds", 0) <= 0:
+                continue
+            ext = os.path.splitext(rec["path"])[1].lower() or "?"
+            for k in self._keys(rec["tj_code"], ext):
+                acc = batch.setdefault(k, {"bytes": 0.0, "seconds": 0.0})
+                acc["bytes"] += rec["bytes_read"]
+                acc["seconds"] += rec["seconds"]
+            n += 1
+        for k, new in batch.items():
+            old = self.rates.get(k, {"bytes": 0.0, "seconds": 0.0})
+            self.rates[k] = {c: old[c] * HISTORY_DECAY + new[c] for c in ("bytes", "seconds")}
+        return n
+
+    def observe_report(self, path: str) -> int:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return self.observe(json.load(f).get("files", []))
+        except (OSError, ValueError):
+            return 0
+
+    def rate(self, tj_code: str, ext: str) -> float:
+        for k in self._keys(tj_code, ext):
+            acc = self.rates.get(k)
+            if acc and acc["seconds"] > 0 and acc["bytes"] > 0:
+                return acc["bytes"] / acc["seconds"]
+        return DEFAULT_BYTES_PER_SECOND
+
+    def estimate(self, unit: WorkUnit) -> float:
+        if not unit.files:
+            return 0.0
+        return UNIT_OVERHEAD_SECONDS + sum(f.bytes / self.rate(unit.tj_code, f.ext) for f in unit.files)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rates": self.rates}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class Staging:
+    """Resultado de cada unidade em `<root>/<TJ>/<YYYY-MM>.parquet`, com a impressão digital em `index.json`.
+
+    Um backfill interrompido recomeça só pelas unidades sem resultado ou cujos arquivos mudaram.
+    """
+
+    def __init__(self, root: str = STAGING_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def path(self, tj_code: str, year_month: str) -> str:
+        return os.path.join(self.root, tj_code, f"{year_month}.parquet")
+
+    def is_done(self, unit: WorkUnit) -> bool:
+        return (self.index.get(unit.key) == unit.fingerprint
+                and os.path.exists(self.path(unit.tj_code, unit.year_month)))
+
+    def put(self, unit: WorkUnit, df) -> None:
+        path = self.path(unit.tj_code, unit.year_month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        with self._lock:
+            self.index[unit.key] = unit.fingerprint
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, indent=0, sort_keys=True)
+            os.replace(tmp, self.index_path)
+
+    def paths(self, tj_code: str, months: Sequence[str]) -> List[str]:
+        return [p for p in (self.path(tj_code, ym) for ym in months) if os.path.exists(p)]
+
+
+def _month_files(month_dir: str, allowed: Sequence[str]) -> List[PlannedFile]:
+    # mesmos arquivos que `load_month_data` lê
+    if not os.path.isdir(month_dir):
+        return []
+    out = []
+    for name in sorted(os.listdir(month_dir)):
+        path = os.path.join(month_dir, name)
+        ext = os.path.splitext(name)[1].lower()
+        if not os.path.isfile(path) or not (archive_ext(path) or ext in allowed):
+            continue
+        st = os.stat(path)
+        out.append(PlannedFile(path=path, bytes=int(st.st_size), ext=ext, mtime_ns=int(st.st_mtime_ns)))
+    return out
+
+
+def _fingerprint(config: str, files: List[PlannedFile]) -> str:
+    h = hashlib.sha1(config.encode("utf-8"))
+    for f in files:
+        h.update(f"|{os.path.basename(f.path)}:{f.bytes}:{f.mtime_ns}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def plan_units(tj_codes: Iterable[str], months: Sequence[str], registry, raw_root: str = "data/raw",
+               timings: Optional[TimingModel] = None, staging: Optional[Staging] = None,
+               order: str = "recent", force: bool = False) -> List[WorkUnit]:
+    """Unidades (TJ, mês) do período, com custo estimado, prioridade e situação.
+
+    `order="recent"` processa primeiro os meses mais novos (num backfill longo, os dados
+    atuais ficam prontos antes); dentro do mesmo mês, as unidades mais caras saem antes.
+    Unidades já na staging com a mesma impressão digital ficam como "done" (salvo `force`).
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order inválido: {order} (use {', '.join(ORDERS)})")
+    timings = timings or TimingModel(None)
+    ranked = sorted(months, reverse=order == "recent")
+    rank = {ym: i for i, ym in enumerate(ranked)}
+    units = []
+    for tj in tj_codes:
+        extractor_cls = registry.get(tj)
+        if extractor_cls is None:
+            continue
+        extractor = extractor_cls(raw_root=raw_root)
+        spec = getattr(extractor, "spec", None)
+        source_format = getattr(spec, "source_format", "auto")
+        allowed = SUPPORTED_EXTS if source_format == "auto" else FORMAT_EXTENSIONS.get(source_format, [])
+        config = json.dumps(asdict(spec) if spec is not None else extractor_cls.__name__, sort_keys=True,
+                            ensure_ascii=False, default=str)
+        for ym in months:
+            files = _month_files(os.path.join(raw_root, tj, ym), allowed)
+            unit = WorkUnit(tj_code=tj, year_month=ym, files=files, fingerprint=_fingerprint(config, files),
+                            priority=rank[ym])
+            unit.est_seconds = round(timings.estimate(unit), 3)
+            if not files:
+                unit.status = "empty"
+                unit.url = extractor.month_url(ym)
+            elif staging is not None and not force and staging.is_done(unit):
+                unit.status = "done"
+            units.append(unit)
+    units.sort(key=lambda u: (u.priority, -u.est_seconds, u.tj_code))
+    return units
+
+
+def estimate_makespan(units: Sequence[WorkUnit], max_workers: int, max_per_tj: int) -> float:
+    """Duração prevista das unidades pendentes, simulando o `Scheduler` com os custos estimados."""
+    pending = [u for u in units if u.status == "pending"]
+    clock, running, per_tj = 0.0, [], {}
+    i = 0
+    while pending or running:
+        for u in list(pending):
+            if len(running) >= max_workers:
+                break
+            if per_tj.get(u.tj_code, 0) < max_per_tj:
+                heapq.heappush(running, (clock + u.est_seconds, i, u.tj_code))
+                per_tj[u.tj_code] = per_tj.get(u.tj_code, 0) + 1
+                pending.remove(u)
+                i += 1
+        clock, _, tj = heapq.heappop(running)
+        per_tj[tj] -= 1
+    return clock
+
+
+class Scheduler:
+    """Executa unidades por prioridade, com limite global e por TJ e novas tentativas.
+
+    O despacho é feito por uma única thread: a cada vaga, sai a unidade pendente de menor
+    prioridade cujo TJ ainda tem vaga (`max_per_tj`). Uma unidade que falha volta à fila
+    após `backoff * 2**(tentativa-1)` segundos, até `retries` vezes. Os workers herdam o
+    contexto (relatório de execução ativo) de quem chamou `run`.
+    """
+
+    def __init__(self, run_unit: Callable[[WorkUnit], int], max_workers: int = 4, max_per_tj: int = 2,
+                 retries: int = 2, backoff: float = 1.0,
+                 on_done: Optional[Callable[[WorkUnit], None]] = None):
+        self.run_unit = run_unit
+        self.max_workers = max(1, int(max_workers))
+        self.max_per_tj = max(1, int(max_per_tj))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.on_done = on_done
+
+    def _call(self, unit: WorkUnit) -> int:
+        t0 = time.perf_counter()
+        try:
+            return self.run_unit(unit)
+        finally:
+            unit.seconds = round(unit.seconds + time.perf_counter() - t0, 4)
+
+    def run(self, units: Sequence[WorkUnit]) -> List[WorkUnit]:
+        queue = sorted((u for u in units if u.status == "pending"), key=lambda u: u.priority)
+        not_before: Dict[str, float] = {}
+        per_tj: Dict[str, int] = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while queue or running:
+                now = time.monotonic()
+                for u in list(queue):
+                    if len(running) >= self.max_workers:
+                        break
+                    if per_tj.get(u.tj_code, 0) >= self.max_per_tj or not_before.get(u.key, 0) > now:
+                        continue
+                    queue.remove(u)
+                    u.attempts += 1
+                    per_tj[u.tj_code] = per_tj.get(u.tj_code, 0) + 1
+                    running[pool.submit(contextvars.copy_context().run, self._call, u)] = u
+                if not running:
+                    # só há unidades aguardando o intervalo da nova tentativa
+                    time.sleep(max(0.0, min(not_before[u.key] for u in queue) - now))
+                    continue
+                retry_at = [not_before[u.key] - now for u in queue if not_before.get(u.key, 0) > now]
+                done, _ = wait(running, timeout=min(retry_at) if retry_at else None, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    u = running.pop(fut)
+                    per_tj[u.tj_code] -= 1
+                    try:
+                        u.rows, u.status, u.error = int(fut.result()), "ok", None
+                    except Exception as e:
+                        u.error = f"{type(e).__name__}: {e}"
+                        if u.attempts <= self.retries:
+                            not_before[u.key] = time.monotonic() + self.backoff * 2 ** (u.attempts - 1)
+                            queue.append(u)
+                            queue.sort(key=lambda x: x.priority)
+                            continue
+                        u.status = "failed"
+                    if self.on_done is not None:
+                        self.on_done(u)
+        return list(units)
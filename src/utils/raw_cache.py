@@ -0,0 +1,190 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import requests
+
+from src.utils.http import TokenBucket, get
+
+
+@dataclass
+class CacheResult:
+    url: str
+    path: str
+    sha256: str
+    size: int
+    status: str              # "not_modified" | "downloaded" | "resumed"
+    transferred: int = 0     # bytes efetivamente recebidos nesta chamada
+
+
+class RawCache:
+    """Cache de downloads endereçado por conteúdo.
+
+    Layout em `root`:
+    - `objects/<sha[:2]>/<sha256>`: corpos deduplicados pelo hash do conteúdo;
+    - `partial/<hash da url>.part` (+ `.json` com os validadores): downloads interrompidos,
+      retomados com `Range`/`If-Range`;
+    - `index.json`: por URL, ETag, Last-Modified, sha256 e tamanho da última versão.
+
+    Meses sem alteração custam uma resposta 304 (`If-None-Match`/`If-Modified-Since`).
+    """
+
+    def __init__(self, root: str = "data/cache/http", chunk_size: int = 1 << 16):
+        self.root = root
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(root, "index.json")
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "partial"), exist_ok=True)
+        self._index: Dict[str, Dict] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not os.path.exists(self._index_path):
+            return {}
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_index(self) -> None:
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp, self._index_path)
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def _partial_paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.root, "partial", key)
+        return base + ".part", base + ".json"
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._index.get(url)
+        if entry and os.path.exists(self.object_path(entry["sha256"])):
+            return dict(entry)
+        return None
+
+    def _request_headers(self, url: str, entry: Optional[Dict], part: str, part_meta: str) -> Dict[str, str]:
+        # Download interrompido: retoma de onde parou, desde que o recurso não tenha mudado
+        if os.path.exists(part) and os.path.getsize(part) > 0 and os.path.exists(part_meta):
+            with open(part_meta, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            validator = meta.get("etag") or meta.get("last_modified")
+            if validator:
+                return {"Range": f"bytes={os.path.getsize(part)}-", "If-Range": validator}
+        headers: Dict[str, str] = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def _materialize(obj: str, dest: str) -> None:
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        if os.path.exists(dest):
+            if os.path.samefile(obj, dest):
+                return
+            os.remove(dest)
+        try:
+            os.link(obj, dest)
+        except OSError:
+            shutil.copyfile(obj, dest)
+
+    @staticmethod
+    def _drop_partial(part: str, part_meta: str) -> None:
+        for p in (part, part_meta):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def fetch(self, session: requests.Session, url: str, dest: str,
+              limiter: TokenBucket | None = None, timeout: int | None = None) -> CacheResult:
+        entry = self.lookup(url)
+        part, part_meta = self._partial_paths(url)
+        headers = self._request_headers(url, entry, part, part_meta)
+        try:
+            res = self._fetch_once(session, url, dest, entry, part, part_meta, headers, limiter, timeout)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 416 or "Range" not in headers:
+                raise
+            # 416: o `.part` já tem o corpo inteiro (o rename não chegou a acontecer) ou é de
+            # outra versão maior; sem tratar, toda retomada pediria o mesmo Range de novo
+            total = e.response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit() and int(total) == os.path.getsize(part):
+                with open(part_meta, "r", encoding="utf-8") as f:
+                    validators = json.load(f)
+                return self._store(url, dest, part, part_meta, validators, "resumed", 0)
+            self._drop_partial(part, part_meta)
+            headers = self._request_headers(url, entry, part, part_meta)
+            res = self._fetch_once(session, url, dest, entry, part, part_meta, headers, limiter, timeout)
+        if res is None:
+            # 304 sem versão no cache para servir: refaz sem validadores
+            res = self._fetch_once(session, url, dest, None, part, part_meta, {}, limiter, timeout)
+        if res is None:
+            raise RuntimeError(f"304 em requisição sem validadores: {url}")
+        return res
+
+    def _fetch_once(self, session: requests.Session, url: str, dest: str, entry: Optional[Dict],
+                    part: str, part_meta: str, headers: Dict[str, str],
+                    limiter: TokenBucket | None, timeout: int | None) -> Optional[CacheResult]:
+        """Uma requisição; `None` quando a resposta é 304 e não há objeto de `entry` para servir."""
+        with get(session, url, timeout=timeout, limiter=limiter, stream=True, headers=headers) as resp:
+            if resp.status_code == 304:
+                if entry and os.path.exists(self.object_path(entry["sha256"])):
+                    self._materialize(self.object_path(entry["sha256"]), dest)
+                    return CacheResult(url, dest, entry["sha256"], int(entry["size"]), "not_modified")
+                return None
+
+            resumed = resp.status_code == 206 and "Range" in headers and \
+                resp.headers.get("Content-Range", "").startswith(f"bytes {os.path.getsize(part)}-")
+            validators = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+            if not resumed:
+                with open(part_meta, "w", encoding="utf-8") as f:
+                    json.dump(validators, f)
+
+            transferred = 0
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        transferred += len(chunk)
+        return self._store(url, dest, part, part_meta, validators, "resumed" if resumed else "downloaded",
+                           transferred)
+
+    def _store(self, url: str, dest: str, part: str, part_meta: str, validators: Dict,
+               status: str, transferred: int) -> CacheResult:
+        """Move o `.part` completo para `objects/` e registra a versão no índice."""
+        digest = hashlib.sha256()
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(block)
+        sha = digest.hexdigest()
+        size = os.path.getsize(part)
+
+        obj = self.object_path(sha)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        if os.path.exists(obj):
+            os.remove(part)  # conteúdo idêntico já armazenado
+        else:
+            os.replace(part, obj)
+        if os.path.exists(part_meta):
+            os.remove(part_meta)
+
+        with self._lock:
+            self._index[url] = {**validators, "sha256": sha, "size": size}
+            self._save_index()
+        self._materialize(obj, dest)
+        return CacheResult(url, dest, sha, size, status, transferred)
@@ -0,0 +1,277 @@
+from __future__ import annotations
+import os
+import re
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.schemas import Columns
+from src.utils.canonical import RUBRIC_FIELD, Taxonomy, label_keys, load_taxonomy
+
+RUBRICS_DIR = os.path.join("data", "processed", "rubrics")
+# colunas de rubrica carregadas entre a leitura e a separação em formato longo
+RUBRIC_PREFIX = "rubric:"
+# totais do esquema unificado para onde as rubricas são consolidadas (+ as não classificadas)
+TOTALS = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+UNCLASSIFIED = "unclassified"
+FACT_KEYS = [Columns.tj_code, Columns.year_month, Columns.server_id]
+DICTIONARY_COLUMNS = ["code", "rubric", "label", "total", "taxonomy"]
+
+# valor monetário em texto (pt-BR ou com ponto decimal), com R$ e sinal opcionais
+_MONEY = re.compile(r"^\s*-?\s*(R\$)?\s*-?\s*\d[\d.\s]*(,\d+)?\s*$|^\s*-?\d+(\.\d+)?\s*$")
+
+
+def is_rubric_column(s: pd.Series, min_share: float = 0.9) -> bool:
+    """Coluna numérica (ou texto monetário em ao menos `min_share` das células preenchidas)."""
+    if pd.api.types.is_bool_dtype(s):
+        return False
+    if pd.api.types.is_numeric_dtype(s):
+        return True
+    codes, uniques = pd.factorize(s)
+    if len(uniques) == 0:
+        return False
+    u = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    text = u.map(lambda x: isinstance(x, str))
+    filled = ~text | (u.astype(str).str.strip() != "")
+    money = ~text | u.astype(str).str.match(_MONEY)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    n_filled = counts[filled.to_numpy()].sum()
+    return n_filled > 0 and counts[(filled & money).to_numpy()].sum() >= min_share * n_filled
+
+
+def split_rubrics(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Separa as colunas `rubric:*` de `df` em fatos (tj_code, year_month, server_id, rubric, value).
+
+    Só células diferentes de zero viram linhas; `rubric` é categórica com o cabeçalho de
+    origem (os códigos persistentes são atribuídos por `RubricStore.write`).
+    """
+    cols = [c for c in df.columns if isinstance(c, str) and c.startswith(RUBRIC_PREFIX)]
+    if not cols:
+        return df, empty_facts()
+    rest = df.drop(columns=cols)
+    values = df[cols].to_numpy(dtype=float, na_value=0.0)
+    rows, pos = np.nonzero(np.nan_to_num(values) != 0)
+    facts = pd.DataFrame({c: df[c].to_numpy()[rows] for c in FACT_KEYS})
+    facts["rubric"] = pd.Categorical.from_codes(pos, categories=[c[len(RUBRIC_PREFIX):] for c in cols])
+    facts["value"] = values[rows, pos]
+    return rest, facts
+
+
+def empty_facts() -> pd.DataFrame:
+    return pd.DataFrame({**{c: pd.Series(dtype=object) for c in FACT_KEYS},
+                         "rubric": pd.Categorical([]), "value": pd.Series(dtype=float)})
+
+
+def concat_facts(frames: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    # categorias diferentes por mês: une como texto e recodifica uma vez
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return empty_facts()
+    out = pd.concat([f.astype({"rubric": object}) for f in frames], ignore_index=True)
+    out["rubric"] = out["rubric"].astype("category")
+    return out
+
+
+def remap_ids(facts: pd.DataFrame, before: pd.Series, after: pd.Series) -> pd.DataFrame:
+    """Aplica aos fatos a troca de `server_id` feita na tabela principal (resolução de identidade)."""
+    if facts.empty:
+        return facts
+    pairs = pd.DataFrame({"old": before.to_numpy(), "new": after.to_numpy()})
+    pairs = pairs[pairs["old"] != pairs["new"]].drop_duplicates("old")
+    if pairs.empty:
+        return facts
+    ids = facts[Columns.server_id].astype("category")
+    cats = pd.Series(ids.cat.categories, dtype=object)
+    mapped = cats.map(pd.Series(pairs["new"].to_numpy(), index=pairs["old"].to_numpy())).fillna(cats)
+    return facts.assign(**{Columns.server_id: mapped.to_numpy(dtype=object)[ids.cat.codes.to_numpy()]})
+
+
+class RubricStore:
+    """Tabela de fatos de rubricas em formato longo, particionada como o dataset unificado.
+
+    `<root>/tj_code=<TJ>/year_month=<YYYY-MM>/part-0.parquet` guarda só as células não nulas
+    (server_id, código da rubrica, valor); `<root>/dictionary.parquet` é o dicionário
+    código -> rubrica normalizada (`label_keys`), grafia de origem mais frequente e o total
+    do esquema unificado a que ela pertence (regras `rubric` da taxonomia). Códigos nunca
+    mudam; a classificação é refeita quando a taxonomia muda.
+    """
+
+    def __init__(self, root: str = RUBRICS_DIR, taxonomy: Optional[Taxonomy] = None):
+        self.root = root
+        self.taxonomy = taxonomy or load_taxonomy()
+        self.dictionary_path = os.path.join(root, "dictionary.parquet")
+        self.dictionary = self._load()
+
+    def _load(self) -> pd.DataFrame:
+        if os.path.exists(self.dictionary_path):
+            d = pd.read_parquet(self.dictionary_path, columns=DICTIONARY_COLUMNS)
+            stale = d["taxonomy"] != self.taxonomy.version
+            if stale.any():
+                d.loc[stale, "total"] = self.classify(d.loc[stale, "rubric"]).to_numpy()
+                d.loc[stale, "taxonomy"] = self.taxonomy.version
+                self._save(d)
+            return d
+        return pd.DataFrame({"code": pd.Series(dtype=np.int32),
+                             **{c: pd.Series(dtype=object) for c in DICTIONARY_COLUMNS[1:]}})
+
+    def _save(self, d: pd.DataFrame) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.dictionary_path + ".tmp"
+        d.to_parquet(tmp, index=False)
+        os.replace(tmp, self.dictionary_path)
+
+    def classify(self, keys: pd.Series) -> pd.Series:
+        """Total de cada rubrica normalizada pela primeira regra que casar (None sem regra)."""
+        out = pd.Series(None, index=keys.index, dtype=object)
+        for total, pattern in self.taxonomy.rules.get(RUBRIC_FIELD, []):
+            rx = re.compile(pattern)
+            todo = out.isna()
+            out[todo] = [total if rx.search(k) else None for k in keys[todo]]
+        return out
+
+    def excluded(self, keys: pd.Series) -> np.ndarray:
+        if not self.taxonomy.rubric_exclude:
+            return np.zeros(len(keys), dtype=bool)
+        rx = re.compile(self.taxonomy.rubric_exclude)
+        return np.array([bool(rx.search(k)) for k in keys], dtype=bool)
+
+    def encode(self, facts: pd.DataFrame) -> pd.DataFrame:
+        """Troca os cabeçalhos de origem por códigos do dicionário (novas rubricas são acrescentadas).
+
+        Colunas que não são rubricas (`exclude` da taxonomia: matrícula, CPF, ano...) saem aqui.
+        """
+        rubric = facts["rubric"].astype("category")
+        labels = pd.Series(rubric.cat.categories, dtype=object)
+        keys = label_keys(labels, self.taxonomy)
+        counts = np.bincount(rubric.cat.codes.to_numpy(), minlength=len(labels))
+        known = dict(zip(self.dictionary["rubric"], self.dictionary["code"]))
+        new = pd.DataFrame({"rubric": keys, "label": labels, "n": counts})
+        new = new[~new["rubric"].isin(known) & (new["rubric"] != "") & ~self.excluded(new["rubric"])]
+        if not new.empty:
+            # grafia mais frequente de cada rubrica nova
+            new = new.sort_values("n", ascending=False, kind="stable").drop_duplicates("rubric")
+            start = int(self.dictionary["code"].max()) + 1 if not self.dictionary.empty else 0
+            add = pd.DataFrame({"code": np.arange(start, start + len(new), dtype=np.int32),
+                                "rubric": new["rubric"].to_numpy(), "label": new["label"].to_numpy(),
+                                "total": self.classify(new["rubric"].reset_index(drop=True)).to_numpy(),
+                                "taxonomy": self.taxonomy.version})
+            self.dictionary = pd.concat([self.dictionary, add], ignore_index=True)
+            self._save(self.dictionary)
+            known.update(zip(add["rubric"], add["code"]))
+        # código por categoria (-1 = excluída), aplicado a todas as linhas de uma vez
+        cat_codes = keys.map(known).fillna(-1).to_numpy(dtype=np.int64)[rubric.cat.codes.to_numpy()]
+        keep = cat_codes >= 0
+        out = facts.loc[keep, FACT_KEYS + ["value"]].reset_index(drop=True)
+        out.insert(3, "rubric", cat_codes[keep].astype(np.int32))
+        return out
+
+    def partition_path(self, tj_code: str, year_month: str) -> str:
+        return os.path.join(self.root, f"tj_code={tj_code}", f"year_month={year_month}", "part-0.parquet")
+
+    def write(self, facts: pd.DataFrame, partitions: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+        """Substitui as partições (TJ, mês) de `partitions` pelos fatos delas (vazias são removidas)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        encoded = self.encode(facts) if not facts.empty else None
+        groups = {} if encoded is None else dict(list(encoded.groupby([Columns.tj_code, Columns.year_month],
+                                                                       sort=False, observed=True)))
+        written = rows = 0
+        for tj, ym in partitions:
+            path = self.partition_path(tj, ym)
+            part = groups.get((tj, ym))
+            if part is None or part.empty:
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+                continue
+            part = part.sort_values([Columns.server_id, "rubric"], kind="stable")
+            table = pa.table({
+                Columns.server_id: pa.array(part[Columns.server_id].astype(str).to_numpy()).dictionary_encode(),
+                "rubric": pa.array(part["rubric"].to_numpy(), pa.int32()),
+                "value": pa.array(part["value"].to_numpy(), pa.float64()),
+            })
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+            written += 1
+            rows += len(part)
+        return {"partitions": written, "rows": rows, "rubrics": len(self.dictionary)}
+
+    def read(self, tj_code: Optional[str] = None, year_month: Optional[str] = None,
+             codes: Optional[List[int]] = None, server_id: Optional[str] = None, labels: bool = False) -> pd.DataFrame:
+        """Fatos filtrados por partição/rubrica/servidor (só as partições pedidas são abertas).
+
+        Com `labels`, acrescenta a grafia e o total de cada rubrica como categorias.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        if not os.path.isdir(self.root):
+            df = empty_facts().assign(rubric=pd.Series(dtype=np.int32))
+            return self.decode(df) if labels else df
+        partitioning = ds.partitioning(pa.schema([(Columns.tj_code, pa.string()),
+                                                  (Columns.year_month, pa.string())]), flavor="hive")
+        dataset = ds.dataset(self.root, format="parquet", partitioning=partitioning,
+                             exclude_invalid_files=True, ignore_prefixes=["dictionary", ".", "_"])
+        expr = None
+        for col, val in ((Columns.tj_code, tj_code), (Columns.year_month, year_month)):
+            if val is not None:
+                cond = ds.field(col) == val
+                expr = cond if expr is None else expr & cond
+        if codes is not None:
+            cond = ds.field("rubric").isin(list(codes))
+            expr = cond if expr is None else expr & cond
+        if server_id is not None:
+            cond = ds.field(Columns.server_id) == server_id
+            expr = cond if expr is None else expr & cond
+        df = dataset.to_table(filter=expr, columns=FACT_KEYS + ["rubric", "value"]).to_pandas()
+        return self.decode(df) if labels else df
+
+    def decode(self, facts: pd.DataFrame) -> pd.DataFrame:
+        # códigos -> categorias pelo dicionário, sem materializar texto por linha
+        d = self.dictionary.sort_values("code")
+        lookup = np.full(int(d["code"].max()) + 1 if not d.empty else 0, -1, dtype=np.int64)
+        lookup[d["code"].to_numpy()] = np.arange(len(d))
+        pos = lookup[facts["rubric"].to_numpy(dtype=np.int64)] if len(facts) else np.empty(0, dtype=np.int64)
+        totals = d["total"].fillna(UNCLASSIFIED).to_numpy(dtype=object)
+        # rubricas distintas têm grafias distintas (a chave deriva da grafia)
+        return facts.assign(
+            label=pd.Categorical.from_codes(pos, categories=d["label"].to_numpy(dtype=object)),
+            total=pd.Categorical(totals[pos], categories=TOTALS + [UNCLASSIFIED]),
+        )
+
+    def summary(self, tj_code: Optional[str] = None, year_month: Optional[str] = None) -> pd.DataFrame:
+        """Servidores, valor total e médio por rubrica (e o total em que ela se consolida)."""
+        facts = self.read(tj_code, year_month)
+        if facts.empty:
+            return pd.DataFrame(columns=["code", "label", "total", "servidores", "valor_total", "valor_medio"])
+        agg = facts.groupby("rubric", sort=False).agg(servidores=(Columns.server_id, "nunique"),
+                                                       valor_total=("value", "sum"), valor_medio=("value", "mean"))
+        out = agg.reset_index().rename(columns={"rubric": "code"}).merge(
+            self.dictionary[["code", "label", "total"]], on="code", how="left")
+        out["total"] = out["total"].fillna(UNCLASSIFIED)
+        return out[["code", "label", "total", "servidores", "valor_total", "valor_medio"]].sort_values(
+            "valor_total", ascending=False, ignore_index=True)
+
+    def rollup(self, facts: pd.DataFrame) -> pd.DataFrame:
+        """Soma das rubricas de cada servidor/mês por total do esquema unificado (formato largo).
+
+        Uma linha por (tj_code, year_month, server_id) com `gross_pay` ... `net_pay` e
+        `unclassified` (rubricas sem regra); por código, via `bincount`, sem pivot.
+        """
+        cols = TOTALS + [UNCLASSIFIED]
+        if facts.empty:
+            return pd.DataFrame({**{c: pd.Series(dtype=object) for c in FACT_KEYS},
+                                 **{c: pd.Series(dtype=float) for c in cols}})
+        d = self.dictionary
+        slot = np.full(int(d["code"].max()) + 1, len(TOTALS), dtype=np.int64)
+        slot[d["code"].to_numpy()] = d["total"].map({t: i for i, t in enumerate(TOTALS)}).fillna(
+            len(TOTALS)).to_numpy(dtype=np.int64)
+        key_codes, keys = pd.factorize(pd.MultiIndex.from_frame(facts[FACT_KEYS].astype(object)))
+        sums = np.bincount(key_codes * len(cols) + slot[facts["rubric"].to_numpy(dtype=np.int64)],
+                           weights=facts["value"].to_numpy(dtype=float), minlength=len(keys) * len(cols))
+        out = keys.to_frame(index=False, name=FACT_KEYS)
+        out[cols] = sums.reshape(len(keys), len(cols))
+        return out
@@ -0,0 +1,314 @@
+from __future__ import annotations
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from src.schemas import Columns, UNIFIED_COLUMNS
+
+SNAPSHOT_ROOT = os.path.join("data", "snapshots")
+PARTITION_COLUMNS = [Columns.tj_code, Columns.year_month]
+# Saídas de `compute_metrics.py` incluídas nas versões
+METRICS_SUFFIXES = (".parquet", ".json")
+# Objetos mais novos que isto não são removidos pelo gc (podem pertencer a uma publicação em andamento)
+GC_GRACE_SECONDS = 3600
+
+
+class SnapshotStore:
+    """Versões imutáveis do dataset unificado e das métricas, com partes compartilhadas.
+
+    Layout em `root`:
+    - `objects/<sha[:2]>/<sha256><ext>`: uma partição (tj_code, year_month) do dataset ou um
+      arquivo de métricas, endereçado pelo conteúdo; partições iguais entre versões são
+      gravadas uma vez só;
+    - `manifests/vNNNNNN.json`: lista de objetos de cada versão (nunca alterado depois de escrito);
+    - `CURRENT`: versão publicada, trocada com `os.replace` (atômico).
+
+    Leitores resolvem a versão (a atual ou uma fixada) e leem objetos imutáveis, sem travas;
+    publicar, voltar a uma versão anterior ou comparar versões só mexe nos manifestos.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_ROOT):
+        self.root = root
+        self._objects = os.path.join(root, "objects")
+        self._manifests = os.path.join(root, "manifests")
+        self._current = os.path.join(root, "CURRENT")
+
+    # ----------------------------------------------------------------- objetos
+    def object_path(self, name: str) -> str:
+        return os.path.join(self._objects, name[:2], name)
+
+    def _put(self, data: bytes, ext: str) -> str:
+        name = hashlib.sha256(data).hexdigest() + ext
+        path = self.object_path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return name
+
+    def put_table(self, table) -> str:
+        """Grava uma tabela Arrow como Parquet endereçado pelo conteúdo; devolve o nome do objeto."""
+        import pyarrow.parquet as pq
+
+        buf = io.BytesIO()
+        # sem metadados do pandas (índice/tamanho do DataFrame de origem mudariam o hash)
+        pq.write_table(table.replace_schema_metadata(None), buf)
+        return self._put(buf.getvalue(), ".parquet")
+
+    def put_file(self, path: str) -> str:
+        with open(path, "rb") as f:
+            return self._put(f.read(), os.path.splitext(path)[1])
+
+    # -------------------------------------------------------------- manifestos
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self._manifests):
+            return []
+        return sorted(f[:-5] for f in os.listdir(self._manifests) if f.startswith("v") and f.endswith(".json"))
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(self._current, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def manifest(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """Manifesto de `version` (padrão: a publicada). KeyError se não existir."""
+        version = version or self.current_version()
+        path = os.path.join(self._manifests, f"{version}.json") if version else ""
+        if not version or not os.path.exists(path):
+            raise KeyError(f"versão não encontrada: {version or '(nenhuma publicada)'}")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _set_current(self, version: str) -> None:
+        tmp = f"{self._current}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+        os.replace(tmp, self._current)
+
+    def publish(
+        self,
+        unified: Optional[List[Dict[str, Any]]] = None,
+        metrics: Optional[Dict[str, str]] = None,
+        **meta: Any,
+    ) -> Dict[str, Any]:
+        """Cria uma versão a partir da publicada, trocando as seções informadas, e a publica.
+
+        `unified`: partições de `snapshot_unified`; `metrics`: arquivo -> objeto de
+        `snapshot_metrics`. A seção omitida é herdada da versão anterior. O manifesto
+        registra a versão que introduziu o dataset (`dataset`) e a do dataset sobre o qual
+        as métricas foram calculadas (`metrics_dataset`); ver `metrics_status`.
+        """
+        parent = self.current_version()
+        base = self.manifest(parent) if parent else {"unified": [], "metrics": {}}
+        os.makedirs(self._manifests, exist_ok=True)
+        parts = base["unified"] if unified is None else sorted(
+            unified, key=lambda p: (p[Columns.tj_code], p[Columns.year_month]))
+        # número da versão reservado com O_EXCL: publicações concorrentes não se sobrescrevem
+        n = int(self.versions()[-1][1:]) + 1 if self.versions() else 1
+        while True:
+            version = f"v{n:06d}"
+            try:
+                fd = os.open(os.path.join(self._manifests, f"{version}.json"), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+                break
+            except FileExistsError:
+                n += 1
+        # mesmas partições = mesmo dataset (ex.: pipeline reexecutado sem mudança nos dados)
+        dataset = base.get("dataset", parent) if parent and parts == base["unified"] else version
+        manifest = {
+            "version": version,
+            "parent": parent,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "meta": meta,
+            "unified": parts,
+            "dataset": dataset,
+            "metrics": base["metrics"] if metrics is None else dict(sorted(metrics.items())),
+            # métricas novas são calculadas sobre o dataset publicado; herdadas mantêm a origem
+            "metrics_dataset": base.get("metrics_dataset") if metrics is None else dataset,
+        }
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        self._set_current(version)
+        return manifest
+
+    def checkout(self, version: str) -> Dict[str, Any]:
+        """Volta (ou avança) a versão publicada para `version`, sem copiar dados."""
+        manifest = self.manifest(version)
+        self._set_current(version)
+        return manifest
+
+    # ------------------------------------------------------------------ leitura
+    def unified_files(self, version: Optional[str] = None) -> List[str]:
+        return [self.object_path(p["object"]) for p in self.manifest(version)["unified"]]
+
+    def read_unified(self, version: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        files = self.unified_files(version)
+        if not files:
+            return pd.DataFrame(columns=columns or UNIFIED_COLUMNS)
+        tables = [pq.read_table(f, columns=columns) for f in files]
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+    def metrics_file(self, name: str, version: Optional[str] = None) -> Optional[str]:
+        obj = self.manifest(version)["metrics"].get(name)
+        return self.object_path(obj) if obj else None
+
+    def diff(self, old: str, new: Optional[str] = None) -> Dict[str, Any]:
+        """Partições e arquivos de métricas adicionados, removidos e alterados de `old` para `new`."""
+        a, b = self.manifest(old), self.manifest(new)
+
+        def compare(x: Dict[Any, str], y: Dict[Any, str]) -> Dict[str, Any]:
+            return {
+                "added": sorted(k for k in y if k not in x),
+                "removed": sorted(k for k in x if k not in y),
+                "changed": sorted(k for k in y if k in x and x[k] != y[k]),
+                "unchanged": sum(1 for k in y if k in x and x[k] == y[k]),
+            }
+
+        def parts(m):
+            return {f"{p[Columns.tj_code]}/{p[Columns.year_month]}": p["object"] for p in m["unified"]}
+
+        rows = {f"{p[Columns.tj_code]}/{p[Columns.year_month]}": p["rows"] for p in b["unified"]}
+        old_rows = {f"{p[Columns.tj_code]}/{p[Columns.year_month]}": p["rows"] for p in a["unified"]}
+        unified = compare(parts(a), parts(b))
+        unified["rows_delta"] = {k: rows.get(k, 0) - old_rows.get(k, 0)
+                                 for k in unified["added"] + unified["removed"] + unified["changed"]}
+        return {"from": a["version"], "to": b["version"], "unified": unified,
+                "metrics": compare(a["metrics"], b["metrics"])}
+
+    def gc(self, keep: int = 10) -> Dict[str, int]:
+        """Remove manifestos além dos `keep` mais recentes (nunca o publicado) e objetos órfãos."""
+        current = self.current_version()
+        versions = self.versions()
+        drop = [v for v in versions[:max(len(versions) - keep, 0)] if v != current]
+        for v in drop:
+            os.remove(os.path.join(self._manifests, f"{v}.json"))
+        live = set()
+        for v in self.versions():
+            m = self.manifest(v)
+            live.update(p["object"] for p in m["unified"])
+            live.update(m["metrics"].values())
+        removed = freed = 0
+        cutoff = time.time() - GC_GRACE_SECONDS
+        if os.path.isdir(self._objects):
+            for sub in os.listdir(self._objects):
+                for name in os.listdir(os.path.join(self._objects, sub)):
+                    path = os.path.join(self._objects, sub, name)
+                    if name not in live and os.path.getmtime(path) < cutoff:
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+        return {"manifests_removed": len(drop), "objects_removed": removed, "bytes_freed": freed}
+
+
+def metrics_status(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """De qual dataset são as métricas de uma versão e se estão defasadas em relação ao dela.
+
+    `metrics_stale` é None quando não há métricas ou a origem é desconhecida (versões
+    publicadas antes do registro da origem).
+    """
+    dataset, source = manifest.get("dataset"), manifest.get("metrics_dataset")
+    stale = None if not manifest["metrics"] or source is None or dataset is None else source != dataset
+    return {"dataset": dataset, "metrics_dataset": source, "metrics_stale": stale}
+
+
+def snapshot_unified(store: SnapshotStore, parquet_path: str) -> List[Dict[str, Any]]:
+    """Divide o Parquet unificado em partições (tj_code, year_month) e grava as que ainda não existem."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    from src.utils.arrow_ingest import UNIFIED_ARROW_SCHEMA
+
+    table = pq.read_table(parquet_path)
+    if table.num_rows == 0:
+        return []
+    if set(table.column_names) == set(UNIFIED_COLUMNS):
+        # tipos canônicos: a mesma partição gravada pelo caminho pandas ou Arrow tem o mesmo hash
+        table = table.select(UNIFIED_COLUMNS).cast(UNIFIED_ARROW_SCHEMA)
+    # ordenação estável: linhas de cada partição mantêm a ordem do pipeline
+    table = table.take(pc.sort_indices(table, [(c, "ascending") for c in PARTITION_COLUMNS]))
+    keys = table.select(PARTITION_COLUMNS).to_pandas()
+    starts = (keys.ne(keys.shift())).any(axis=1).to_numpy().nonzero()[0].tolist() + [table.num_rows]
+    parts = []
+    for lo, hi in zip(starts[:-1], starts[1:]):
+        part = table.slice(lo, hi - lo)
+        name = store.put_table(part)
+        parts.append({
+            Columns.tj_code: str(keys.iat[lo, 0]),
+            Columns.year_month: str(keys.iat[lo, 1]),
+            "object": name,
+            "rows": hi - lo,
+            "bytes": os.path.getsize(store.object_path(name)),
+        })
+    return parts
+
+
+def publish_unified(store: SnapshotStore, parquet_path: str, **meta: Any) -> Dict[str, Any]:
+    """Publica o Parquet unificado como nova versão; devolve o manifesto e quantas partições são novas."""
+    parent = store.current_version()
+    before = {p["object"] for p in store.manifest(parent)["unified"]} if parent else set()
+    parts = snapshot_unified(store, parquet_path)
+    manifest = store.publish(unified=parts, **meta)
+    new = sum(1 for p in parts if p["object"] not in before)
+    return {"version": manifest["version"], "parent": parent, "partitions": len(parts),
+            "new_partitions": new, "reused_partitions": len(parts) - new, **metrics_status(manifest)}
+
+
+def snapshot_metrics(store: SnapshotStore, outdir: str) -> Dict[str, str]:
+    """Arquivos de métricas de `outdir` (Parquet/JSON) -> objetos da versão."""
+    out = {}
+    for name in sorted(os.listdir(outdir)):
+        path = os.path.join(outdir, name)
+        if os.path.isfile(path) and name.endswith(METRICS_SUFFIXES) and not name.startswith("."):
+            out[name] = store.put_file(path)
+    return out
+
+
+def materialize_unified(store: SnapshotStore, output_path: str, version: Optional[str] = None) -> int:
+    """Regrava `output_path` (leitores do arquivo único) com a versão indicada; troca atômica."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    files = store.unified_files(version)
+    tmp = output_path + ".tmp"
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    rows = 0
+    try:
+        if files:
+            # partições podem divergir em tipo (ex.: coluna toda nula num mês)
+            schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+            with pq.ParquetWriter(tmp, schema) as writer:
+                for f in files:
+                    table = pq.read_table(f)
+                    writer.write_table(table.select(schema.names).cast(schema))
+                    rows += table.num_rows
+        else:
+            pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=UNIFIED_COLUMNS), preserve_index=False), tmp)
+        os.replace(tmp, output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
+
+
+def copy_metrics(store: SnapshotStore, outdir: str, version: Optional[str] = None) -> int:
+    """Restaura em `outdir` os arquivos de métricas da versão indicada."""
+    metrics = store.manifest(version)["metrics"]
+    os.makedirs(outdir, exist_ok=True)
+    for name, obj in metrics.items():
+        tmp = os.path.join(outdir, f".{name}.tmp")
+        shutil.copyfile(store.object_path(obj), tmp)
+        os.replace(tmp, os.path.join(outdir, name))
+    return len(metrics)
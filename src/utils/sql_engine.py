@@ -0,0 +1,145 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# Nome da tabela (view) do dataset unificado nas consultas
+TABLE = "remuneracao"
+DEFAULT_ROW_LIMIT = 1_000
+MAX_ROW_LIMIT = 50_000
+DEFAULT_TIMEOUT = 10.0
+MAX_TIMEOUT = 60.0
+# Motores mantidos abertos (um por conjunto de arquivos, ex.: versões fixadas)
+MAX_ENGINES = 8
+
+
+class QueryError(ValueError):
+    """Consulta recusada (não é um único SELECT) ou inválida."""
+
+
+class QueryTimeout(RuntimeError):
+    pass
+
+
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+class SqlEngine:
+    """Consultas SQL somente leitura (DuckDB, em processo) sobre o Parquet unificado.
+
+    O Parquet (ou as partições de uma versão, ver `src.utils.snapshots`) é exposto como a
+    view `remuneracao`; o DuckDB lê só as colunas e row groups que a consulta usa (projeção
+    e filtros empurrados para o Parquet) e executa em várias threads. A conexão é recriada
+    quando algum arquivo muda; fora deles não há acesso a disco.
+    """
+
+    def __init__(self, parquet_path: Union[str, Sequence[str]], threads: int | None = None):
+        paths = [parquet_path] if isinstance(parquet_path, str) else list(parquet_path)
+        self.parquet_paths: List[str] = [os.path.abspath(p) for p in paths]
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._con = None
+        self._stamp: Optional[Tuple[Tuple[int, int], ...]] = None
+
+    @property
+    def parquet_path(self) -> str:
+        return self.parquet_paths[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def _connection(self):
+        import duckdb  # dependência pesada: só carregada na primeira consulta
+
+        if not self.parquet_paths:
+            raise QueryError("dataset vazio")
+        stamp = tuple((int(st.st_size), int(st.st_mtime_ns)) for st in map(os.stat, self.parquet_paths))
+        with self._lock:
+            if self._con is None or self._stamp != stamp:
+                if self._con is not None:
+                    self._con.close()
+                files = "[" + ", ".join(_quote(p) for p in self.parquet_paths) + "]"
+                con = duckdb.connect(":memory:")
+                con.execute(f"CREATE VIEW {TABLE} AS SELECT * FROM read_parquet({files}, union_by_name = true)")
+                if self.threads:
+                    con.execute(f"SET threads = {int(self.threads)}")
+                # somente o(s) Parquet(s) do dataset podem ser lidos; configuração travada para as consultas
+                con.execute(f"SET allowed_paths = {files}")
+                con.execute("SET enable_external_access = false")
+                con.execute("SET lock_configuration = true")
+                self._con, self._stamp = con, stamp
+            return self._con
+
+    @staticmethod
+    def _check_read_only(sql: str) -> str:
+        import duckdb
+
+        sql = sql.strip().rstrip(";").strip()
+        if not sql:
+            raise QueryError("consulta vazia")
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            raise QueryError(str(e)) from e
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise QueryError("apenas uma instrução SELECT (ou WITH ... SELECT) é permitida")
+        return sql
+
+    def query(
+        self,
+        sql: str,
+        params: Dict[str, Any] | None = None,
+        limit: int = DEFAULT_ROW_LIMIT,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Dict[str, Any]:
+        """Executa `sql` com parâmetros nomeados (`$nome`), até `limit` linhas e `timeout` segundos."""
+        import duckdb
+
+        sql = self._check_read_only(sql)
+        limit = max(1, min(int(limit), MAX_ROW_LIMIT))
+        timeout = max(0.1, min(float(timeout), MAX_TIMEOUT))
+        cur = self._connection().cursor()
+        timer = threading.Timer(timeout, cur.interrupt)
+        t0 = time.perf_counter()
+        timer.start()
+        try:
+            # uma linha a mais indica que o resultado foi truncado
+            rel = cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT {limit + 1}", params or {})
+            table = rel.fetch_arrow_table()
+        except duckdb.InterruptException as e:
+            raise QueryTimeout(f"consulta excedeu {timeout:g} s") from e
+        except duckdb.Error as e:
+            raise QueryError(str(e)) from e
+        finally:
+            timer.cancel()
+            cur.close()
+        truncated = table.num_rows > limit
+        table = table.slice(0, limit)
+        return {
+            "columns": table.column_names,
+            "rows": table.to_pylist(),
+            "row_count": table.num_rows,
+            "truncated": truncated,
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+
+
+_ENGINES: Dict[Tuple[str, ...], SqlEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(parquet_path: Union[str, Sequence[str]]) -> SqlEngine:
+    """Motor compartilhado por arquivo(s) (a conexão é reaproveitada entre requisições)."""
+    paths = [parquet_path] if isinstance(parquet_path, str) else list(parquet_path)
+    key = tuple(os.path.abspath(p) for p in paths)
+    with _ENGINES_LOCK:
+        engine = _ENGINES.pop(key, None) or SqlEngine(key)
+        _ENGINES[key] = engine  # reinserido no fim: os menos usados saem primeiro
+        while len(_ENGINES) > MAX_ENGINES:
+            _ENGINES.pop(next(iter(_ENGINES))).close()
+        return engine
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.schemas import Columns
+
+TOPK_FILE = "topk.parquet"
+TOPK_LIMIT = 100
+TOPK_MEASURES = [Columns.gross_pay, Columns.net_pay, Columns.benefits]
+GROUP_COLUMNS = [Columns.tj_code, Columns.year_month, Columns.role]
+PARTITION_COLUMNS = [Columns.tj_code, Columns.year_month]
+TOPK_COLUMNS = GROUP_COLUMNS + ["measure", "rank", "value", Columns.server_id, Columns.server_name]
+
+_META_KEY = b"topk"
+
+
+def partition_fingerprints(df: pd.DataFrame) -> Dict[str, str]:
+    """Impressão digital de cada partição (TJ, mês), independente da ordem das linhas."""
+    if df.empty:
+        return {}
+    cols = [c for c in [Columns.server_id, Columns.server_name, Columns.role] + TOPK_MEASURES if c in df.columns]
+    h = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    keys = df[Columns.tj_code].astype(str) + "|" + df[Columns.year_month].astype(str)
+    codes, uniques = pd.factorize(keys)
+    # soma com overflow (mod 2^64) por partição + contagem de linhas
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(uniques))
+    sums = np.add.reduceat(h[order], np.r_[0, np.cumsum(counts)[:-1]])
+    return {k: f"{s:016x}{n:x}" for k, s, n in zip(uniques, sums.tolist(), counts.tolist())}
+
+
+def build_topk(df: pd.DataFrame, limit: int = TOPK_LIMIT, measures: Sequence[str] = TOPK_MEASURES) -> pd.DataFrame:
+    """Os `limit` maiores valores de cada medida por (TJ, mês, cargo), em formato longo.
+
+    Uma ordenação vetorizada por medida (grupo, valor decrescente, server_id) e o posto
+    dentro do grupo pela posição relativa ao início dele; sem laço por grupo. Só entram
+    valores positivos; empates ficam na ordem do `server_id`.
+    """
+    if df.empty:
+        return _empty()
+    group_codes = df.groupby(GROUP_COLUMNS, dropna=False, sort=False).ngroup().to_numpy()
+    id_codes = pd.factorize(df[Columns.server_id], use_na_sentinel=False)[0]
+    parts = []
+    for m in measures:
+        if m not in df.columns:
+            continue
+        values = df[m].to_numpy(dtype=float)
+        rows = np.flatnonzero(values > 0)
+        if len(rows) == 0:
+            continue
+        g, v = group_codes[rows], values[rows]
+        order = rows[np.lexsort((id_codes[rows], -v, g))]
+        g_sorted = group_codes[order]
+        starts = np.flatnonzero(np.r_[True, g_sorted[1:] != g_sorted[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        keep = order[rank < limit]
+        part = df.iloc[keep][GROUP_COLUMNS + [Columns.server_id, Columns.server_name]].reset_index(drop=True)
+        part["measure"] = m
+        part["rank"] = rank[rank < limit].astype(np.int16)
+        part["value"] = values[keep]
+        parts.append(part)
+    if not parts:
+        return _empty()
+    out = pd.concat(parts, ignore_index=True)[TOPK_COLUMNS]
+    return _compact(out)
+
+
+def _empty() -> pd.DataFrame:
+    return _compact(pd.DataFrame({c: pd.Series(dtype=object) for c in TOPK_COLUMNS}).astype(
+        {"rank": np.int16, "value": float}))
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    # colunas repetitivas como categorias: viram colunas dicionário no Parquet
+    for c in GROUP_COLUMNS + ["measure"]:
+        df[c] = df[c].astype("category")
+    return df.sort_values(GROUP_COLUMNS + ["measure", "rank"], kind="stable", ignore_index=True)
+
+
+def merge_topk(old: pd.DataFrame, new: pd.DataFrame, partitions: Sequence[str]) -> pd.DataFrame:
+    """Substitui em `old` as partições "TJ|mês" de `partitions` pelas linhas de `new`.
+
+    O top-K de um (TJ, mês, cargo) só depende da própria partição, então a união é exata.
+    """
+    if old.empty:
+        return new
+    key = old[Columns.tj_code].astype(str) + "|" + old[Columns.year_month].astype(str)
+    kept = old[~key.isin(set(partitions))]
+    frames = [f.astype({c: object for c in GROUP_COLUMNS + ["measure"]}) for f in (kept, new) if not f.empty]
+    if not frames:
+        return _empty()
+    return _compact(pd.concat(frames, ignore_index=True))
+
+
+def read_topk_meta(path: str) -> Optional[Dict]:
+    import pyarrow.parquet as pq
+
+    try:
+        return json.loads(pq.read_schema(path).metadata[_META_KEY])
+    except Exception:
+        return None
+
+
+def write_topk(df: pd.DataFrame, path: str, meta: Dict) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           _META_KEY: json.dumps(meta).encode("utf-8")})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def update_topk(df: pd.DataFrame, path: str, limit: int = TOPK_LIMIT, keep_missing: bool = False) -> Dict:
+    """Atualiza `path` recalculando só as partições (TJ, mês) novas ou alteradas.
+
+    As demais vêm do arquivo anterior (mesmo `limit`); com `keep_missing`, partições que
+    não estão em `df` são mantidas (ex.: `df` só com os meses recém-chegados).
+    """
+    fingerprints = partition_fingerprints(df)
+    meta = read_topk_meta(path) if os.path.exists(path) else None
+    if meta is None or meta.get("limit") != limit:
+        old, old_fp = _empty(), {}
+    else:
+        old, old_fp = pd.read_parquet(path), meta.get("partitions", {})
+    changed = sorted(k for k, fp in fingerprints.items() if old_fp.get(k) != fp)
+    removed = [] if keep_missing else sorted(k for k in old_fp if k not in fingerprints)
+    if not changed and not removed and meta is not None:
+        return {"changed": 0, "removed": 0, "reused": len(fingerprints), "rows": int(meta.get("rows", 0))}
+    keys = df[Columns.tj_code].astype(str) + "|" + df[Columns.year_month].astype(str)
+    fresh = build_topk(df[keys.isin(set(changed))], limit)
+    out = merge_topk(old, fresh, changed + removed)
+    partitions = {k: v for k, v in old_fp.items() if k not in removed} | {k: fingerprints[k] for k in changed}
+    write_topk(out, path, {"limit": limit, "rows": len(out), "partitions": partitions})
+    return {"changed": len(changed), "removed": len(removed), "reused": len(fingerprints) - len(changed),
+            "rows": len(out)}
+
+
+def query_topk(path: str, k: int = 10, measure: str = Columns.gross_pay, tj_code: Optional[str] = None,
+               year_month: Optional[str] = None, role: Optional[str] = None) -> pd.DataFrame:
+    """Top `k` (até o limite pré-calculado) lendo do Parquet só os grupos filtrados."""
+    filters: List = [("measure", "=", measure), ("rank", "<", k)]
+    for col, val in ((Columns.tj_code, tj_code), (Columns.year_month, year_month), (Columns.role, role)):
+        if val is not None:
+            filters.append((col, "=", val))
+    df = pd.read_parquet(path, filters=filters)
+    for c in GROUP_COLUMNS + ["measure"]:
+        df[c] = df[c].astype(object)
+    return df.sort_values(GROUP_COLUMNS + ["rank"], kind="stable", ignore_index=True)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.schemas import Columns, UNIFIED_COLUMNS
+from src.utils.instrumentation import record_quality
+from src.utils.parsing import to_float_series
+
+PAY_COLUMNS = [Columns.gross_pay, Columns.base_pay, Columns.benefits, Columns.deductions, Columns.net_pay]
+PARTITION_COLUMNS = [Columns.tj_code, Columns.year_month]
+
+# Acima disto (por mês, por rubrica) é mais provável erro de leitura/escala do que pagamento real
+PAY_UPPER_BOUND = 1_000_000.0
+# Tolerância de arredondamento para líquido > bruto
+NET_GROSS_TOLERANCE = 0.01
+
+# hash de `make_server_id` ou "<TJ>:<matrícula>" (id_strategy=matricula)
+_ID_PATTERN = r"[0-9a-f]{16}|[A-Z0-9]+:.+"
+_YEAR_MONTH_PATTERN = r"\d{4}-(0[1-9]|1[0-2])"
+
+
+def _bad_pattern(s: pd.Series, pattern: str) -> pd.Series:
+    # avaliado nos valores distintos: ids e meses se repetem muito
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    ok = pd.Series(uniques, dtype="str").str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+    ok = np.append(ok, False)  # posição -1: nulo
+    return pd.Series(~ok[codes], index=s.index)
+
+
+def validate_unified(df: pd.DataFrame, source: str = "") -> pd.DataFrame:
+    """Confere e normaliza um DataFrame no esquema unificado, sem cópias desnecessárias.
+
+    Exige as colunas de `UNIFIED_COLUMNS` (ValueError se faltar alguma), converte para
+    float apenas as colunas de valores que ainda não são numéricas e, numa passada
+    vetorizada, conta por partição (tj_code, year_month): valores vazios ou ilegíveis
+    (depois zerados), negativos ou fora da faixa, líquido maior que o bruto, ids e meses
+    mal formados e nomes ausentes.
+    As contagens vão para o relatório de execução ativo (`record_quality`).
+    """
+    missing = [c for c in UNIFIED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas faltando no extrator {source}: {missing}")
+    if list(df.columns) != UNIFIED_COLUMNS:
+        df = df[UNIFIED_COLUMNS]
+    if df.empty:
+        return df
+
+    # células vazias/ilegíveis chegam como NaN (`load_month_data`): contadas e então zeradas;
+    # colunas já float sem nulos não são tocadas
+    null_pay = np.zeros(len(df), dtype=bool)
+    fixed: Dict[str, pd.Series] = {}
+    coerced = []
+    for c in PAY_COLUMNS:
+        s = df[c]
+        if s.dtype != np.float64:
+            coerced.append(c)
+            s = fixed[c] = to_float_series(s, keep_nulls=True)
+        if s.hasnans:
+            null_pay |= s.isna().to_numpy()
+            fixed[c] = s.fillna(0.0)
+    if fixed:
+        df = df.assign(**fixed)
+
+    pays = df[PAY_COLUMNS].to_numpy(dtype=float)
+    gross = df[Columns.gross_pay].to_numpy()
+    net = df[Columns.net_pay].to_numpy()
+    names = df[Columns.server_name]
+    flags = pd.DataFrame({
+        "null_pay": null_pay,
+        "negative_pay": (pays < 0).any(axis=1),
+        "out_of_range": (pays > PAY_UPPER_BOUND).any(axis=1),
+        "net_gt_gross": (gross > 0) & (net > gross + NET_GROSS_TOLERANCE),
+        "zero_pay": ~(pays != 0).any(axis=1),
+        "missing_name": (names.isna() | (names.astype("str").str.strip() == "")).to_numpy(),
+        "bad_server_id": _bad_pattern(df[Columns.server_id], _ID_PATTERN).to_numpy(),
+        "bad_year_month": _bad_pattern(df[Columns.year_month], _YEAR_MONTH_PATTERN).to_numpy(),
+    }, index=df.index)
+    flags[PARTITION_COLUMNS] = df[PARTITION_COLUMNS]
+    stats = flags.groupby(PARTITION_COLUMNS, dropna=False, sort=False).agg(
+        rows=("negative_pay", "size"), **{k: (k, "sum") for k in flags.columns if k not in PARTITION_COLUMNS})
+    for (tj, ym), row in stats.iterrows():
+        record_quality(tj_code=str(tj), year_month=str(ym), source=source, coerced_columns=coerced,
+                       **{k: int(v) for k, v in row.items()})
+    return df
+
+
+def validate_arrow(table, source: str = ""):
+    """`validate_unified` para tabelas Arrow (caminho `--engine arrow`), com kernels `pyarrow.compute`.
+
+    Espera os valores já em float64 (ver `src.utils.arrow_ingest.map_table`); nulos viram 0.0.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    missing = [c for c in UNIFIED_COLUMNS if c not in table.column_names]
+    if missing:
+        raise ValueError(f"Colunas faltando no extrator {source}: {missing}")
+    if table.num_rows == 0:
+        return table
+
+    null_pay = None
+    for c in PAY_COLUMNS:
+        col = table.column(c)
+        is_null = pc.is_null(col)
+        null_pay = is_null if null_pay is None else pc.or_(null_pay, is_null)
+        if col.null_count:
+            table = table.set_column(table.schema.get_field_index(c), c, pc.fill_null(col, 0.0))
+
+    def any_pay(fn):
+        out = None
+        for c in PAY_COLUMNS:
+            m = fn(table.column(c))
+            out = m if out is None else pc.or_(out, m)
+        return out
+
+    gross, net = table.column(Columns.gross_pay), table.column(Columns.net_pay)
+    names = table.column(Columns.server_name)
+    flags = {
+        "null_pay": null_pay,
+        "negative_pay": any_pay(lambda s: pc.less(s, 0.0)),
+        "out_of_range": any_pay(lambda s: pc.greater(s, PAY_UPPER_BOUND)),
+        "net_gt_gross": pc.and_(pc.greater(gross, 0.0), pc.greater(net, pc.add(gross, NET_GROSS_TOLERANCE))),
+        "zero_pay": pc.invert(any_pay(lambda s: pc.not_equal(s, 0.0))),
+        "missing_name": pc.fill_null(pc.equal(pc.utf8_trim_whitespace(names), ""), True),
+        "bad_server_id": pc.invert(pc.fill_null(
+            pc.match_substring_regex(table.column(Columns.server_id), f"^(?:{_ID_PATTERN})$"), False)),
+        "bad_year_month": pc.invert(pc.fill_null(
+            pc.match_substring_regex(table.column(Columns.year_month), f"^(?:{_YEAR_MONTH_PATTERN})$"), False)),
+    }
+    counts = pa.table({**{k: pc.cast(v, pa.int64()) for k, v in flags.items()},
+                       **{c: table.column(c) for c in PARTITION_COLUMNS}})
+    stats = counts.group_by(PARTITION_COLUMNS).aggregate(
+        [("null_pay", "count")] + [(k, "sum") for k in flags]).to_pylist()
+    for row in stats:
+        record_quality(tj_code=str(row[Columns.tj_code]), year_month=str(row[Columns.year_month]), source=source,
+                       rows=int(row["null_pay_count"]), **{k: int(row[f"{k}_sum"]) for k in flags})
+    return table